@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.const import token_decimals
+
+
+# All amounts are stored as exact integers in the token's smallest unit (wei)
+AMOUNT_TYPE = pa.decimal128(38, 0)
+DECIMALS_TYPE = pa.int8()
+# Block pool prices are fixed-point integers, `precision` in metadata.json gives the scale
+PRICE_PRECISION = 15
+
+
+@dataclass
+class AmountSpec:
+    # amount column -> token address column
+    amounts: Dict[str, str]
+    # "wei" for raw integer amounts (strings or floats), "token" for decimal-adjusted amounts
+    unit: str
+    # fixed-point price columns stored as integer strings
+    prices: Dict[str, int] = field(default_factory=dict)
+
+
+SOURCES = {
+    "trades": AmountSpec(
+        amounts={"token_sold_amount": "token_sold_address", "token_bought_amount": "token_bought_address"},
+        unit="token",
+    ),
+    "cowswap_fills": AmountSpec(
+        amounts={"amount_sold": "token_sold", "amount_bought": "token_bought"},
+        unit="wei",
+    ),
+    "cowswap_orders": AmountSpec(
+        amounts={"sell_amount": "sell_token", "buy_amount": "buy_token"},
+        unit="wei",
+    ),
+    "fusion_fills": AmountSpec(
+        amounts={"token_sold_amount": "token_sold_address", "token_bought_amount": "token_bought_address"},
+        unit="wei",
+    ),
+    "unix_fills": AmountSpec(
+        amounts={"token_sold_amount": "token_sold_address", "token_bought_amount": "token_bought_address"},
+        unit="token",
+    ),
+    "block_prices": AmountSpec(
+        amounts={},
+        unit="wei",
+        prices={"price": PRICE_PRECISION},
+    ),
+}
+
+
+def decimals_for(tokens: pa.Array, decimals_map: Dict[str, int]) -> pa.Array:
+    tokens = pc.utf8_lower(pc.cast(tokens, pa.string()))
+    keys = pa.array(list(decimals_map.keys()), pa.string())
+    values = pa.array(list(decimals_map.values()), DECIMALS_TYPE)
+    return pc.take(values, pc.index_in(tokens, value_set=keys))
+
+def wei_from_strings(arr: pa.Array) -> pa.Array:
+    return pc.cast(arr, AMOUNT_TYPE)
+
+def wei_from_floats(arr: pa.Array, decimals: Optional[pa.Array] = None) -> pa.Array:
+    arr = pc.cast(arr, pa.float64())
+    if decimals is not None:
+        arr = pc.multiply(arr, pc.power(pa.scalar(10.0), pc.cast(decimals, pa.float64())))
+    return pc.cast(pc.round(arr), AMOUNT_TYPE)
+
+def fixed_point_from_strings(arr: pa.Array, precision: int) -> pa.Array:
+    # Parse the raw integers, then reinterpret the same 128-bit values with the given scale (exact, no division)
+    raw = pc.cast(arr, AMOUNT_TYPE)
+    if isinstance(raw, pa.ChunkedArray):
+        raw = raw.combine_chunks()
+    return pa.Array.from_buffers(pa.decimal128(38, precision), len(raw), raw.buffers(), raw.null_count, raw.offset)
+
+def to_token_units(wei: pa.Array, decimals: pa.Array) -> np.ndarray:
+    # Single rounding step from the exact integer, instead of parsing strings and chaining float ops
+    scale = pc.power(pa.scalar(10.0), pc.cast(decimals, pa.float64()))
+    return pc.divide(pc.cast(wei, pa.float64()), scale).to_numpy(zero_copy_only=False)
+
+def fixed_point_to_floats(arr: pa.Array) -> np.ndarray:
+    return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+def normalize_table(table: pa.Table, spec: AmountSpec, decimals_map: Dict[str, int]) -> pa.Table:
+    for amount_col, token_col in spec.amounts.items():
+        decimals = decimals_for(table[token_col], decimals_map)
+        if spec.unit == "token":
+            wei = wei_from_floats(table[amount_col], decimals)
+        elif pa.types.is_string(table.schema.field(amount_col).type) or pa.types.is_large_string(table.schema.field(amount_col).type):
+            wei = wei_from_strings(table[amount_col])
+        else:
+            wei = wei_from_floats(table[amount_col])
+
+        missing = pc.sum(pc.is_null(decimals)).as_py()
+        if missing:
+            print(f"No decimals for {missing} rows of {token_col}")
+
+        table = table.set_column(table.schema.get_field_index(amount_col), amount_col, wei)
+        table = table.append_column(f"{amount_col}_decimals", decimals)
+
+    for price_col, precision in spec.prices.items():
+        price = fixed_point_from_strings(table[price_col], precision)
+        table = table.set_column(table.schema.get_field_index(price_col), price_col, price)
+
+    return table
+
+def normalize_dataset(
+        dataset_dir: str,
+        source: str,
+        chain: str = "ethereum",
+        out_path: str = None,
+        extra_decimals: Dict[str, int] = None
+    ) -> str:
+    spec = SOURCES[source]
+    decimals_map = {**token_decimals[chain], **(extra_decimals or {})}
+    if spec.prices:
+        precision = _read_metadata(dataset_dir).get("precision")
+        if precision is not None:
+            spec = AmountSpec(spec.amounts, spec.unit, {col: int(precision) for col in spec.prices})
+
+    table = pq.read_table(f"{dataset_dir}/data.parquet")
+    table = normalize_table(table, spec, decimals_map)
+
+    out_path = out_path or f"{dataset_dir}/normalized.parquet"
+    pq.write_table(table, out_path)
+    print(f"Normalized {source} data saved to {out_path}")
+    return out_path
+
+def decimals_from_daily_prices(prices_df: pd.DataFrame) -> Dict[str, int]:
+    tokens = prices_df[["token", "decimals"]].dropna().drop_duplicates("token")
+    return dict(zip(tokens["token"].str.lower(), tokens["decimals"].astype(int)))
+
+def _read_metadata(dataset_dir: str) -> dict:
+    path = f"{dataset_dir}/metadata.json"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Normalize amount and price columns into fixed-point integers")
+    parser.add_argument("--dataset-dirs", nargs="+", required=True, help="Dataset directories containing data.parquet")
+    parser.add_argument("--source", required=True, choices=list(SOURCES.keys()), help="Dataset kind")
+    parser.add_argument("--chain", default="ethereum", help="Blockchain network")
+    parser.add_argument("--daily-prices", default=None, help="Daily prices parquet used as an extra token decimals source")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    extra_decimals = decimals_from_daily_prices(pd.read_parquet(args.daily_prices)) if args.daily_prices else None
+    for dataset_dir in args.dataset_dirs:
+        normalize_dataset(dataset_dir, args.source, args.chain, extra_decimals=extra_decimals)
@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+MATCH_COLUMNS = ["bid_id", "ask_id", "amount", "price", "timestamp", "ext_ref_price"]
+EXPIRED_COLUMNS = ["id", "timestamp", "ext_ref_price"]
+
+
+# Same shape as the orderbook_rs simulation result, but with data frames instead of lists of records
+@dataclass
+class BatchAuctionResult:
+    matches: pd.DataFrame
+    expired_orders: pd.DataFrame
+
+
+# Uniform-price batch auctions of one pair, cleared one after another at the end of every batch that has arrivals.
+# Trades are bucketed by `block_time // batch_duration`. Each auction runs over the new orders plus the unfilled
+# rests of earlier batches that haven't expired by its clearing time (`time_limit` after arrival or `max_match_time`).
+# The clearing volume maximises min(supply, demand), the price is the middle of the clearing range and fills follow
+# price-then-time priority. Rests expire at their expiry, orders without one are still open after the last batch.
+def run_batch_auction(
+        trades_df: pd.DataFrame,
+        base_asset: str,
+        quote_asset: str,
+        batch_duration: int,
+        time_limit: int = None,
+        ref_prices_df: pd.DataFrame = None
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if not batch_duration or batch_duration <= 0:
+        raise ValueError("Batch auctions need batch_duration > 0")
+
+    ids = trades_df["id"].to_numpy(dtype=object)
+    is_ask = (trades_df["token_sold_address"] == base_asset).to_numpy()
+    sold = trades_df["token_sold_amount"].to_numpy(dtype=float)
+    bought = trades_df["token_bought_amount"].to_numpy(dtype=float)
+    block_time = trades_df["block_time"].to_numpy(dtype=np.int64)
+
+    # Quantities in base, limit prices in quote per base
+    qty = np.where(is_ask, sold, bought)
+    # Zero amounts give inf / nan prices, those orders are dropped as unfillable below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        limit_price = np.where(is_ask, bought / sold, sold / bought)
+    expiry = expiry_times(trades_df, block_time, time_limit)
+    valid = (qty > 0) & np.isfinite(limit_price)
+    left = np.where(valid, qty, 0.0)
+    done = np.finfo(float).eps * np.maximum(qty, 1)
+
+    arriving = np.flatnonzero(valid)
+    arriving = arriving[np.argsort(block_time[arriving] // batch_duration, kind="stable")]
+    batch_ids, starts = np.unique(block_time[arriving] // batch_duration, return_index=True)
+    ends = np.append(starts[1:], len(arriving))
+
+    book = np.empty(0, dtype=np.int64)
+    expired, pieces = [], []
+    for batch_id, start, end in zip(batch_ids, starts, ends):
+        clearing_time = (batch_id + 1) * batch_duration
+        book = np.concatenate([book, arriving[start:end]])
+        # Rests that ran out since the last auction and new orders that run out before their first one
+        out = expiry[book] < clearing_time
+        expired.append(book[out])
+        book = book[~out]
+        cleared = _clear(book, is_ask, limit_price, block_time, left)
+        if cleared is not None:
+            pieces.append(cleared + (np.full(len(cleared[0]), clearing_time),))
+            book = book[left[book] > done[book]]
+    # Unfillable orders expire when they would have been auctioned first, open orders with an expiry at it
+    invalid = np.flatnonzero(~valid & (qty > 0))
+    expired_time = expiry.copy()
+    expired_time[invalid] = np.minimum(expiry[invalid], (block_time[invalid] // batch_duration + 1) * batch_duration)
+    still_open = np.isinf(expiry[book])
+    expired = np.sort(np.concatenate(expired + [book[~still_open], invalid]).astype(np.int64))
+
+    piece_ask, piece_bid, amount, price, match_time = (
+        np.concatenate(column) for column in zip(*pieces)
+    ) if pieces else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64))
+    matches_df = pd.DataFrame({
+        "bid_id": ids[piece_bid],
+        "ask_id": ids[piece_ask],
+        "amount": amount,
+        "price": price,
+        "timestamp": match_time,
+        "ext_ref_price": _ref_price_at(ref_prices_df, match_time),
+    }, columns=MATCH_COLUMNS)
+
+    expired_time = expired_time[expired]
+    expired_df = pd.DataFrame({
+        "id": ids[expired],
+        "timestamp": expired_time.astype(np.int64),
+        "ext_ref_price": _ref_price_at(ref_prices_df, expired_time),
+    }, columns=EXPIRED_COLUMNS)
+
+    return matches_df, expired_df
+
+
+# Clears one auction over the `book` positions, takes the fills off `left` and returns the (ask, bid, amount, price)
+# pieces, or None if the book doesn't cross
+def _clear(book: np.ndarray, is_ask: np.ndarray, limit_price: np.ndarray, block_time: np.ndarray, left: np.ndarray) -> Optional[Tuple[np.ndarray, ...]]:
+    asks, bids = book[is_ask[book]], book[~is_ask[book]]
+    if len(asks) == 0 or len(bids) == 0 or limit_price[bids].max() < limit_price[asks].min():
+        return None
+    # Price priority, then time; bid prices are negated so the best (highest) bid comes first as well
+    asks = asks[np.lexsort((block_time[asks], limit_price[asks]))]
+    bids = bids[np.lexsort((block_time[bids], -limit_price[bids]))]
+    ask_qty, bid_qty = left[asks], left[bids]
+    ask_cum, bid_cum = np.cumsum(ask_qty), np.cumsum(bid_qty)
+
+    # Cumulative supply and demand at every limit price in the book
+    candidates = np.unique(limit_price[book])
+    supply = _cum_at(ask_cum, np.searchsorted(limit_price[asks], candidates, side="right"))
+    demand = _cum_at(bid_cum, np.searchsorted(-limit_price[bids], -candidates, side="right"))
+    volume = np.minimum(supply, demand)
+    clearing_volume = volume.max()
+    at_max = candidates[volume == clearing_volume]
+    clearing_price = (at_max.min() + at_max.max()) / 2
+
+    # Fill in priority order up to the clearing volume; orders before the marginal one are filled completely,
+    # exactly by their own size
+    ask_end, bid_end = np.minimum(ask_cum, clearing_volume), np.minimum(bid_cum, clearing_volume)
+    ask_start, bid_start = np.concatenate([[0.0], ask_end[:-1]]), np.concatenate([[0.0], bid_end[:-1]])
+    ask_filled = np.where(ask_end == ask_cum, ask_qty, ask_end - ask_start)
+    bid_filled = np.where(bid_end == bid_cum, bid_qty, bid_end - bid_start)
+
+    # Pair fills: every piece between consecutive fill boundaries belongs to exactly one ask and one bid
+    ask_pos, bid_pos = np.flatnonzero(ask_end > ask_start), np.flatnonzero(bid_end > bid_start)
+    bounds = np.union1d(ask_end[ask_pos], bid_end[bid_pos])
+    starts = np.concatenate([[0.0], bounds])[:-1]
+    piece_ask = ask_pos[np.minimum(np.searchsorted(ask_end[ask_pos], starts, side="right"), len(ask_pos) - 1)]
+    piece_bid = bid_pos[np.minimum(np.searchsorted(bid_end[bid_pos], starts, side="right"), len(bid_pos) - 1)]
+    amount = np.minimum(ask_end[piece_ask], bid_end[piece_bid]) - np.maximum(ask_start[piece_ask], bid_start[piece_bid])
+    keep = amount > 0
+    piece_ask, piece_bid, amount = piece_ask[keep], piece_bid[keep], amount[keep]
+    # Rounding must never fill an order above its size; trimming one side only lowers the other side's sums
+    _trim_excess(amount, piece_ask, ask_filled)
+    _trim_excess(amount, piece_bid, bid_filled)
+
+    left[asks] -= ask_filled
+    left[bids] -= bid_filled
+    return asks[piece_ask], bids[piece_bid], amount, np.full(len(amount), clearing_price)
+
+def _cum_at(cum: np.ndarray, n: np.ndarray) -> np.ndarray:
+    # Sum of the first `n` quantities
+    return np.where(n > 0, cum[np.maximum(n - 1, 0)], 0.0)
+
+def _trim_excess(amount: np.ndarray, owners: np.ndarray, filled: np.ndarray):
+    if len(amount) == 0:
+        return
+    excess = np.bincount(owners, weights=amount, minlength=len(filled)) - filled
+    # Largest piece per owner takes the excess
+    order = np.lexsort((amount, owners))
+    is_largest = np.concatenate([owners[order][1:] != owners[order][:-1], [True]])
+    largest = order[is_largest]
+    over = excess[owners[largest]] > 0
+    amount[largest[over]] -= excess[owners[largest[over]]]
+
+# Time after which an order can't trade any more: `time_limit` after arrival, or its own `max_match_time`
+def expiry_times(trades_df: pd.DataFrame, block_time: np.ndarray, time_limit: int = None) -> np.ndarray:
+    expiry = block_time + time_limit if time_limit is not None else np.full(len(block_time), np.inf)
+    if "max_match_time" in trades_df.columns:
+        max_match_time = pd.to_numeric(trades_df["max_match_time"], errors="coerce").to_numpy(dtype=float)
+        expiry = np.where(np.isnan(max_match_time), expiry, max_match_time)
+    return np.asarray(expiry, dtype=float)
+
+def _ref_price_at(ref_prices_df: pd.DataFrame, times: np.ndarray) -> np.ndarray:
+    # Last known reference price at or before each time, expects prices in the base-quote direction
+    if ref_prices_df is None or len(ref_prices_df) == 0:
+        return np.full(len(times), np.nan)
+    ref_times = ref_prices_df["block_time"].to_numpy(dtype=np.int64)
+    ref_prices = ref_prices_df["price"].to_numpy(dtype=float)
+    pos = np.searchsorted(ref_times, times, side="right") - 1
+    return np.where(pos >= 0, ref_prices[np.maximum(pos, 0)], np.nan)
@@ -0,0 +1,102 @@
+from typing import Dict, Hashable
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils.stats_accumulators import STAT_FIELDS
+
+
+REPLICATES = 1000
+SEED = 0
+ALPHA = 0.05
+CHUNK_ROWS = 8192
+METHODS = ["poisson", "multinomial"]
+
+
+def bootstrap_cis(
+        frames: Dict[Hashable, pd.DataFrame],
+        replicates: int = REPLICATES,
+        seed: int = SEED,
+        method: str = METHODS[0],
+        alpha: float = ALPHA,
+        chunk_rows: int = CHUNK_ROWS
+    ) -> pd.DataFrame:
+    # Bootstrap CIs of the mean and weighted mean of every `Stat` metric of every enriched frame.
+    # Frames over the same set of trades (eg. one pair swept over options) share one resample weight matrix,
+    # so their CIs use common random numbers and all of their metrics come out of one matmul per row chunk.
+    if method not in METHODS:
+        raise ValueError(f"Unknown bootstrap method: {method!r}")
+
+    groups = {}
+    for key, df in frames.items():
+        hashes = pd.util.hash_array(df["id"].to_numpy(dtype=object))
+        order = np.argsort(hashes, kind="stable")
+        group = hashlib.sha1(hashes[order].tobytes()).digest()
+        groups.setdefault(group, []).append((key, df.iloc[order]))
+
+    rows = {}
+    for group, members in groups.items():
+        num, den = _resampled_sums([_metric_columns(df) for _, df in members], group, replicates, seed, method, chunk_rows)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = num / den
+        lo, hi = np.nanquantile(means, [alpha / 2, 1 - alpha / 2], axis=0)
+        n_cols = len(lo) // len(members)
+        for i, (key, _) in enumerate(members):
+            rows[key] = _ci_row(lo[i * n_cols:(i + 1) * n_cols], hi[i * n_cols:(i + 1) * n_cols])
+
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+def _resampled_sums(columns, group: bytes, replicates, seed, method, chunk_rows):
+    # Numerators and denominators per replicate for all metrics of all frames in the group
+    num_cols = np.hstack([c[0] for c in columns])
+    den_cols = np.hstack([c[1] for c in columns])
+    n = len(num_cols)
+    rng = np.random.default_rng([seed, int.from_bytes(group[:8], "little")])
+    num = np.zeros((replicates, num_cols.shape[1]))
+    den = np.zeros((replicates, den_cols.shape[1]))
+    remaining = np.full(replicates, n)
+    for start in range(0, n, chunk_rows):
+        end = min(start + chunk_rows, n)
+        weights, remaining = _draw_weights(rng, replicates, start, end, n, method, remaining)
+        num += weights @ num_cols[start:end]
+        den += weights @ den_cols[start:end]
+    return num, den
+
+def _draw_weights(rng: np.random.Generator, replicates: int, start: int, end: int, n: int, method: str, remaining: np.ndarray):
+    if method == "poisson":
+        # Independent Poisson(1) counts per row
+        return rng.poisson(1.0, size=(replicates, end - start)).astype(float), remaining
+    # Multinomial counts drawn chunk by chunk: the chunk's rows plus one bucket for all rows after it,
+    # conditional on the draws left per replicate, so every replicate still sums to n
+    p = np.append(np.full(end - start, 1 / (n - start)), (n - end) / (n - start))
+    draws = rng.multinomial(remaining, p)
+    return draws[:, :-1].astype(float), draws[:, -1]
+
+def _metric_columns(df: pd.DataFrame):
+    # Per metric two ratio-of-sums columns: unweighted (value / count) and weighted (weight * value / weight),
+    # with the same NaN handling as `Stat`: missing values are skipped, their weights stay in the denominator
+    amount_usd = df["amount_usd"].to_numpy(dtype=float)
+    prop_matched = df["prop_matched"].to_numpy(dtype=float)
+    weights = {
+        "amount_usd": amount_usd,
+        "matched_amount_usd": amount_usd * prop_matched,
+        "unmatched_amount_usd": amount_usd * (1 - prop_matched),
+    }
+    masks = {None: np.ones(len(df), dtype=bool), "matched": prop_matched > 0, "unmatched": prop_matched < 1}
+    num, den = [], []
+    for col, weight_col, mask in STAT_FIELDS.values():
+        values = df[col].to_numpy(dtype=float)
+        rows = masks[mask]
+        has_value = rows & ~np.isnan(values)
+        weight = np.where(rows & ~np.isnan(weights[weight_col]), weights[weight_col], 0)
+        num += [np.where(has_value, values, 0), np.where(has_value, weight * values, 0)]
+        den += [has_value.astype(float), weight]
+    return np.column_stack(num), np.column_stack(den)
+
+def _ci_row(lo: np.ndarray, hi: np.ndarray) -> dict:
+    row = {}
+    for i, name in enumerate(STAT_FIELDS):
+        row[f"{name}_mean_lo"], row[f"{name}_mean_hi"] = lo[2 * i], hi[2 * i]
+        row[f"{name}_wmean_lo"], row[f"{name}_wmean_hi"] = lo[2 * i + 1], hi[2 * i + 1]
+    return row
@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+import argparse
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+ROWS_PER_FILE = 1_000_000
+
+
+@dataclass
+class DatasetKeys:
+    # Natural key columns; the first candidate set fully present in the data is used
+    keys: Tuple[Tuple[str, ...], ...]
+    time_col: str
+
+
+DATASET_KEYS = {
+    "trades": DatasetKeys(keys=(("id",),), time_col="block_time"),
+    "cowswap_fills": DatasetKeys(keys=(("tx_hash", "order_id"), ("tx_hash", "orderUid")), time_col="block_time"),
+    "fusion_fills": DatasetKeys(keys=(("tx_hash", "order_hash"),), time_col="block_time"),
+    "unix_fills": DatasetKeys(keys=(("id",),), time_col="block_time"),
+    "daily_prices": DatasetKeys(keys=(("day", "token"),), time_col="day"),
+    "block_prices": DatasetKeys(keys=(("block_num", "source", "base_token", "quote_token"),), time_col="block_num"),
+}
+
+
+# Partitions to read: leftovers of an interrupted compaction (`*.tmp`) and partitions listed in
+# another partition's `compacted_from` are skipped, so sources kept next to their compaction aren't read twice
+def partition_dirs(dataset_root: str) -> List[str]:
+    dirs = sorted(set(os.path.dirname(p) for p in glob.glob(f"{dataset_root}/*/data*.parquet")))
+    dirs = [d for d in dirs if not d.endswith(".tmp")]
+    compacted = superseded(dirs)
+    return [d for d in dirs if os.path.basename(d) not in compacted]
+
+def superseded(dirs: List[str]) -> set:
+    return {label for d in dirs for label in _read_metadata(d).get("compacted_from", []) if label != os.path.basename(d)}
+
+def data_files(partition_dir: str) -> List[str]:
+    return sorted(glob.glob(f"{partition_dir}/data*.parquet"))
+
+def compact(
+        dataset_root: str,
+        kind: str,
+        out_dir: str = None,
+        rows_per_file: int = ROWS_PER_FILE,
+        remove_sources: bool = False
+    ) -> dict:
+    spec = DATASET_KEYS[kind]
+    sources = list(dict.fromkeys(partition_dirs(dataset_root)))
+    if len(sources) == 0:
+        raise ValueError(f"No partitions found in {dataset_root}")
+
+    tables = [pq.read_table(f) for d in sources for f in data_files(d)]
+    df = pa.concat_tables(tables, promote_options="default").to_pandas()
+    rows_in = len(df)
+
+    keys = next((list(k) for k in spec.keys if all(c in df.columns for c in k)), None)
+    if keys is None:
+        raise ValueError(f"None of the natural keys {spec.keys} found in {dataset_root}")
+
+    # Stable sort first so the copy from the earliest partition wins
+    df = df.sort_values(spec.time_col, kind="stable", ignore_index=True)
+    df = df[~df.duplicated(subset=keys, keep="first")].reset_index(drop=True)
+    duplicates = rows_in - len(df)
+    print(f"Removed {duplicates} duplicated rows out of {rows_in} on keys {keys}")
+
+    source_metadata = [_read_metadata(d) for d in sources]
+    metadata = merge_metadata(source_metadata)
+    out_dir = out_dir or f"{dataset_root}/compacted_{_label_part(metadata.get('date_from'))}_{_label_part(metadata.get('date_to'))}"
+
+    # Write into a temporary dir and swap it in, so a failed run never leaves a half-written dataset
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    files = []
+    n_files = max(1, int(np.ceil(len(df) / rows_per_file)))
+    bounds = np.linspace(0, len(df), n_files + 1).astype(int)
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        name = "data.parquet" if n_files == 1 else f"data-{i:05d}.parquet"
+        part = df.iloc[start:end]
+        part.to_parquet(f"{tmp_dir}/{name}", index=False)
+        files.append({
+            "path": name,
+            "rows": int(end - start),
+            f"{spec.time_col}_from": _json_value(part[spec.time_col].iloc[0]) if len(part) else None,
+            f"{spec.time_col}_to": _json_value(part[spec.time_col].iloc[-1]) if len(part) else None,
+        })
+
+    metadata["compacted_from"] = [os.path.basename(d) for d in sources]
+    metadata["natural_keys"] = keys
+    metadata["duplicates_removed"] = int(duplicates)
+    metadata["files"] = files
+    with open(f"{tmp_dir}/metadata.json", "w") as f:
+        json.dump(metadata, f, indent=4)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    print(f"Compacted {len(sources)} partitions into {len(files)} files in {out_dir}")
+
+    if remove_sources:
+        # A previous compaction with the same label is itself a source, but has just been replaced
+        removed = [d for d in sources if os.path.abspath(d) != os.path.abspath(out_dir)]
+        for d in removed:
+            shutil.rmtree(d)
+        print(f"Removed {len(removed)} source partitions")
+    return metadata
+
+def merge_metadata(metadata: List[dict]) -> dict:
+    merged = {}
+    for key in dict.fromkeys(k for m in metadata for k in m):
+        values = [m[key] for m in metadata if key in m]
+        if key == "date_from":
+            merged[key] = min(values)
+        elif key == "date_to":
+            merged[key] = max(values)
+        elif key in ("start_block",):
+            merged[key] = min(values)
+        elif key in ("end_block",):
+            merged[key] = max(values)
+        elif key in ("tokens", "pairs", "sources"):
+            merged[key] = union_tokens(values)
+        elif all(v == values[0] for v in values):
+            merged[key] = values[0]
+        else:
+            merged[key] = values
+    return merged
+
+def union_tokens(values) -> list:
+    # Token lists are stored either as lists or comma separated strings ("all" disables filtering)
+    items = []
+    for v in values:
+        items.extend(v.split(",") if isinstance(v, str) else v)
+    if "all" in items:
+        return "all"
+    return list(dict.fromkeys(items))
+
+def _read_metadata(partition_dir: str) -> dict:
+    path = f"{partition_dir}/metadata.json"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _label_part(value) -> str:
+    return str(value).split(" ")[0].replace("-", "") if value is not None else "na"
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compact dataset partitions into time-sorted, deduplicated files")
+    parser.add_argument("--dataset-root", required=True, help="Directory containing the labelled partitions, eg. data/intents/cowswap/fills")
+    parser.add_argument("--kind", required=True, choices=list(DATASET_KEYS.keys()), help="Dataset kind, determines the natural keys")
+    parser.add_argument("--out-dir", default=None, help="Output directory (default: <dataset-root>/compacted_<date_from>_<date_to>)")
+    parser.add_argument("--rows-per-file", type=int, default=ROWS_PER_FILE, help="Maximum rows per output file")
+    parser.add_argument("--remove-sources", action="store_true", help="Delete the source partitions after compaction")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    compact(args.dataset_root, args.kind, args.out_dir, args.rows_per_file, args.remove_sources)
@@ -5,6 +5,10 @@ token_map = {
     "ethereum": eth_tokens._map,
     "arbitrum": arb_tokens._map,
 }
+token_decimals = {
+    "ethereum": eth_tokens.decimals,
+    "arbitrum": arb_tokens.decimals,
+}
 default_pairs = {
     "ethereum": eth_tokens.default_pairs,
 }
\ No newline at end of file
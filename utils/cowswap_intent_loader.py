@@ -1,37 +1,60 @@
-from time import sleep
+from time import sleep, perf_counter
 import pandas as pd
 import requests
 
 
+MAX_POLL_MS = 30_000
+
+
+# Raised in live mode for a batch id the endpoint doesn't know yet (404)
+class BatchNotPublished(Exception):
+    pass
+
+
 class CowSwapIntentsLoader:
 
-    def __init__(self, _solver_endpoint, _write_path, _pause_ms=1000, _write_freq=1000):
+    def __init__(self, _solver_endpoint, _write_path, _pause_ms=1000, _write_freq=1000, _on_orders=None, _live=False):
         self.solver_endpoint = _solver_endpoint
         self.write_path = _write_path
         self.pause_ms = _pause_ms
         self.write_freq = _write_freq
+        # Called with (batch_id, parsed_orders, received_at) for every parsed batch, eg. by `utils.live_matching`
+        self.on_orders = _on_orders
+        # At the chain head a missing batch is polled again (with back-off) instead of skipped
+        self.live = _live
 
         self.last_batch_order_ids = set()
         self.sink = []
 
-    def fetch(self, initial_batch_id=None):
+    def fetch(self, initial_batch_id=None, max_batches=None):
         batch_id = initial_batch_id if initial_batch_id else self._get_next_batch_id()
-        while True:
+        last_batch_id = batch_id + max_batches if max_batches is not None else None
+        poll_ms = self.pause_ms
+        while last_batch_id is None or batch_id < last_batch_id:
             print(f"Processing batch {batch_id}")
             try:
                 orders = self._fetch_raw_orders(batch_id)
-                if not orders:
-                    print(f"Batch {batch_id} is empty, skipping")
-                    batch_id += 1 
-                    continue
-
-                self._parse_orders(batch_id, orders)
-
-                batch_id += 1
-                sleep(self.pause_ms / 1000)
+            except BatchNotPublished:
+                print(f"Batch {batch_id} is not published yet, polling again in {poll_ms}ms")
+                sleep(poll_ms / 1000)
+                poll_ms = min(max(2 * poll_ms, 100), MAX_POLL_MS)
+                continue
             except Exception as e:
                 print(f"Error fetching batch {batch_id}: {e}")
-                sleep(5000)
+                sleep(5)
+                continue
+            received_at = perf_counter()
+            poll_ms = self.pause_ms
+            if not orders:
+                print(f"Batch {batch_id} is empty, skipping")
+                batch_id += 1 
+                continue
+
+            # Only fetching is retried, errors while parsing or in `on_orders` propagate
+            self._parse_orders(batch_id, orders, received_at)
+
+            batch_id += 1
+            sleep(self.pause_ms / 1000)
 
     def _get_next_batch_id(self):
         last_id = 0
@@ -45,20 +68,25 @@ class CowSwapIntentsLoader:
     def _fetch_raw_orders(self, batch_id):
         endpoint = self._get_solver_endpoint(batch_id)
         res = requests.get(endpoint)
+        if res.status_code == 404 and self.live:
+            raise BatchNotPublished(batch_id)
         if not res.ok:
             print(f"Error fetching orders for batch {batch_id}: {res.text}")
             return None
         res_json = res.json()
         return res_json.get("orders")
 
-    def _parse_orders(self, batch_id, orders):
+    def _parse_orders(self, batch_id, orders, received_at=None):
         parsed_orders = [
             self._parse_order(order, batch_id) 
             for order in orders 
             if not self._order_in_last_batch(order)
         ]
         print(f"Parsed {len(parsed_orders)} orders")
-        self._write_orders(batch_id, parsed_orders)
+        if self.on_orders is not None:
+            self.on_orders(batch_id, list(parsed_orders), received_at)
+        if self.write_path is not None:
+            self._write_orders(batch_id, parsed_orders)
         self.last_batch_order_ids = {order["uid"] for order in orders}
 
     def _write_orders(self, batch_id, orders):
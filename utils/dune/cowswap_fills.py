@@ -5,18 +5,17 @@ import uuid
 
 
 from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 QUERY_ID = os.getenv('DUNE_COWSWAP_FILLS_QUERY_ID')
-
-dune = DuneClient.from_env()
+QUERY_FILE = dune_engine.query_path("cowswap_fills.dune.sql")
 
 DATE_FROM = "2024-12-18"
 DATE_TO = dune_utils.date_now()
@@ -30,7 +29,8 @@ def get_cowswap_fills(
 		date_from: str = DATE_FROM,
 		date_to: str = DATE_TO,
 		chain: str = CHAIN,
-        performance: str = PERFORMANCE
+        performance: str = PERFORMANCE,
+        backend: str = dune_engine.BACKEND
 	):
     print(f"Fetching cowswap fills for {chain} tokens: '{tokens}' from {date_from} to {date_to}")
     query = QueryBase(
@@ -42,7 +42,7 @@ def get_cowswap_fills(
 			QueryParameter.text_type(name="chain", value=chain)
 		]
     )
-    return dune.run_query(query=query, performance=performance)
+    return dune_engine.get_client(backend, QUERY_FILE).run_query(query=query, performance=performance)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch CowSwap fills from Dune Analytics")
@@ -54,6 +54,7 @@ def parse_args():
     parser.add_argument("--performance", default=PERFORMANCE, choices=["free", "medium", "large"], help="Query performance")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -69,7 +70,8 @@ if __name__ == "__main__":
         date_from=args.date_from,
         date_to=args.date_to,
         chain=args.chain,
-        performance=args.performance
+        performance=args.performance,
+        backend=args.backend
     )
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+import datetime
+import glob
+import os
+import re
+import uuid
+
+
+BACKENDS = ["dune", "local"]
+BACKEND = os.getenv("DUNE_BACKEND", "dune")
+LOCAL_TABLES_DIR = os.getenv("DUNE_LOCAL_TABLES_DIR", "data/dune_tables")
+QUERIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "queries")
+
+# Trino functions used in `queries/*.dune.sql` that DuckDB names differently.
+# Local stand-in tables store addresses and hashes as lowercase `0x...` strings, so `from_hex` is a no-op.
+TRINO_MACROS = [
+    "create or replace macro to_unixtime(ts) as epoch(ts)",
+    "create or replace macro from_hex(s) as lower(s)",
+    "create or replace macro try_sum(x) as sum(x)",
+]
+# Dune SQL syntax DuckDB doesn't parse, rewritten before the parameters are rendered: varbinary literals
+# (`0x...`) become lowercase strings like the stored addresses, `uint256 '<n>'` an unsigned 128-bit cast
+# and type names used as bare aliases (`"hour" timestamp`) are quoted
+TRINO_REWRITES = [
+    (re.compile(r"(?<![\w'])0x([0-9a-fA-F]+)\b(?!')"), lambda m: f"'0x{m.group(1).lower()}'"),
+    (re.compile(r"\buint256\s+'(\d+)'", re.IGNORECASE), r"cast('\1' as uhugeint)"),
+    (re.compile(r'("[^"]+"|\b(?!as\b)\w+)[ \t]+(timestamp|date|time)\b(?=[ \t]*(,|$))', re.IGNORECASE | re.MULTILINE), r'\1 as "\2"'),
+]
+
+
+def get_client(backend: str = BACKEND, query_file: str = None, tables_dir: str = LOCAL_TABLES_DIR):
+    if backend == "dune":
+        from dune_client.client import DuneClient
+        return DuneClient.from_env()
+    elif backend == "local":
+        return LocalDuneClient(query_file, tables_dir)
+    else:
+        raise ValueError(f"Unknown backend: {backend!r}")
+
+def query_path(name: str) -> str:
+    return os.path.normpath(os.path.join(QUERIES_DIR, name))
+
+def render_query(sql: str, params: Dict[str, str]) -> str:
+    def replace(match):
+        name = match.group(1)
+        if name not in params:
+            raise KeyError(f"Missing query parameter: {name!r}")
+        return str(params[name]).replace("'", "''")
+    return re.sub(r"\{\{\s*([A-Za-z0-9_]+)\s*\}\}", replace, sql)
+
+def translate_query(sql: str) -> str:
+    for pattern, replacement in TRINO_REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+@dataclass
+class LocalExecutionResult:
+    rows: List[dict]
+    metadata: dict = field(default_factory=dict)
+
+@dataclass
+class LocalResultsResponse:
+    execution_id: str
+    query_id: int
+    result: LocalExecutionResult
+
+
+# Runs Dune SQL files against local parquet copies of the source tables with an embedded DuckDB.
+# Tables are discovered as `<tables_dir>/<schema>/<table>/**/*.parquet` or `<tables_dir>/<schema>/<table>.parquet`.
+# Parquet files directly in `tables_dir` are unqualified tables, eg. `query_3004150.parquet` for the router labels query.
+class LocalDuneClient:
+
+    def __init__(self, query_file: str, tables_dir: str = LOCAL_TABLES_DIR):
+        import duckdb
+
+        self.query_file = query_file
+        self.tables_dir = tables_dir
+        self.con = duckdb.connect()
+        for macro in TRINO_MACROS:
+            self.con.execute(macro)
+        self.tables = self._register_tables()
+
+    def run_query(self, query, performance: str = None, **kwargs) -> LocalResultsResponse:
+        params = {p.key: LocalDuneClient._param_value(p.value) for p in (query.params or [])}
+        return self.run_sql(self._read_query(), params, getattr(query, "query_id", None))
+
+    def get_latest_result(self, query_id, max_age_hours: int = None, **kwargs) -> LocalResultsResponse:
+        # No stored executions locally, the query file is rerun instead
+        return self.run_sql(self._read_query(), {}, query_id)
+
+    def run_sql(self, sql: str, params: Dict[str, str], query_id=None) -> LocalResultsResponse:
+        rendered = self.prepare(sql, params)
+        started_at = datetime.datetime.now()
+        cursor = self.con.execute(rendered)
+        columns = [d[0] for d in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        elapsed = (datetime.datetime.now() - started_at).total_seconds()
+        print(f"Local query {self.query_file} returned {len(rows)} rows in {elapsed:.2f}s")
+        return LocalResultsResponse(
+            execution_id=f"local-{uuid.uuid4()}",
+            query_id=query_id,
+            result=LocalExecutionResult(rows, {"row_count": len(rows), "execution_time_sec": elapsed}),
+        )
+
+    def prepare(self, sql: str, params: Dict[str, str]) -> str:
+        # Rewritten before rendering, so parameter values (eg. address lists) are never touched
+        return render_query(translate_query(sql), params)
+
+    def _read_query(self) -> str:
+        if self.query_file is None:
+            raise ValueError("Query file is required for the local backend")
+        with open(self.query_file) as f:
+            return f.read()
+
+    def _register_tables(self) -> List[str]:
+        tables = []
+        for path in sorted(glob.glob(f"{self.tables_dir}/*.parquet")):
+            table = os.path.basename(path)[:-len(".parquet")]
+            self.con.execute(f"""create or replace view "{table}" as select * from read_parquet('{path}')""")
+            tables.append(table)
+        for schema_dir in sorted(glob.glob(f"{self.tables_dir}/*/")):
+            schema = os.path.basename(os.path.normpath(schema_dir))
+            self.con.execute(f'create schema if not exists "{schema}"')
+            for entry in sorted(os.listdir(schema_dir)):
+                path = os.path.join(schema_dir, entry)
+                if os.path.isdir(path):
+                    table, source = entry, f"{path}/**/*.parquet"
+                elif entry.endswith(".parquet"):
+                    table, source = entry[:-len(".parquet")], path
+                else:
+                    continue
+                self.con.execute(f"""create or replace view "{schema}"."{table}" as select * from read_parquet('{source}', union_by_name = true)""")
+                tables.append(f"{schema}.{table}")
+        return tables
+
+    @staticmethod
+    def _param_value(value) -> str:
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value)
@@ -1,24 +1,23 @@
-from dune_client.client import DuneClient
 from dotenv import load_dotenv
 import argparse
 import uuid
 import os
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 MAX_AGE_HOURS = 1
-DUNE = DuneClient.from_env()
 
 
-def fetch_latest_results(query_id, max_age_hours=MAX_AGE_HOURS):
+def fetch_latest_results(query_id, max_age_hours=MAX_AGE_HOURS, backend=dune_engine.BACKEND, query_file=None):
     if not query_id:
         raise ValueError("Query ID is required")
     print(f"Fetching latest results for query ID {query_id} with max age {max_age_hours} hours")
-    return DUNE.get_latest_result(query_id, max_age_hours=max_age_hours)
+    return dune_engine.get_client(backend, query_file).get_latest_result(query_id, max_age_hours=max_age_hours)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch latest execution result from Dune Analytics")
@@ -26,12 +25,14 @@ def parse_args():
     parser.add_argument("--max-age-hours", type=int, default=MAX_AGE_HOURS, help="Max age of the result in hours")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
+    parser.add_argument("--query-file", default=None, help="Query file to run with the local backend")
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    result = fetch_latest_results(args.query_id, args.max_age_hours)
+    result = fetch_latest_results(args.query_id, args.max_age_hours, args.backend, args.query_file)
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
     dune_utils.write_to_parquet(result.result.rows, out_dir)
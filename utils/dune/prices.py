@@ -4,18 +4,17 @@ import argparse
 import uuid
 
 from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 QUERY_ID = os.getenv('DUNE_PRICES_QUERY_ID')
-
-dune = DuneClient.from_env()
+QUERY_FILE = dune_engine.query_path("prices.dune.sql")
 
 DATE_FROM = "2025-02-25"
 DATE_TO = "2025-03-23"
@@ -27,7 +26,8 @@ def get_token_prices(
 		date_from: str = DATE_FROM,
 		date_to: str = DATE_TO,
 		chain: str = CHAIN,
-        performance: str = PERFORMANCE
+        performance: str = PERFORMANCE,
+        backend: str = dune_engine.BACKEND
 	):
     date_from = dune_utils.parse_date_str(date_from)
     date_to = dune_utils.parse_date_str(date_to)
@@ -41,7 +41,7 @@ def get_token_prices(
 			QueryParameter.text_type(name="chain", value=chain)
 		]
     )
-    return dune.run_query(query=query, performance=performance)
+    return dune_engine.get_client(backend, QUERY_FILE).run_query(query=query, performance=performance)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch token daily price candles from Dune Analytics")
@@ -52,6 +52,7 @@ def parse_args():
     parser.add_argument("--performance", default=PERFORMANCE, choices=["low", "medium", "high"], help="Query performance")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -62,7 +63,8 @@ if __name__ == "__main__":
         date_from=args.date_from,
         date_to=args.date_to,
         chain=args.chain,
-        performance=args.performance
+        performance=args.performance,
+        backend=args.backend
     )
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
@@ -0,0 +1,244 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import argparse
+import datetime
+import glob
+import json
+import os
+import shutil
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import utils.compaction as compaction
+import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
+from utils.dune.trades import get_dex_trades
+from utils.dune.cowswap_fills import get_cowswap_fills
+from utils.dune.fusion_fills import get_fusion_fills
+from utils.dune.unix_eth_fills import get_unix_fills
+from utils.dune.prices import get_token_prices
+
+
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class RefreshSpec:
+    root: str
+    # fetch(tokens, date_from, date_to, chain, backend) with YYYY-MM-DD dates
+    fetch: Callable
+    # Whether the query includes the `date_to` day; exclusive queries continue at the last `date_to`,
+    # inclusive ones the day after
+    inclusive_end: bool
+
+
+DATASETS: Dict[str, RefreshSpec] = {
+    "trades": RefreshSpec(
+        "trades",
+        lambda tokens, date_from, date_to, chain, backend: get_dex_trades(tokens, date_from, date_to, chain, backend=backend),
+        inclusive_end=False,
+    ),
+    "cowswap_fills": RefreshSpec(
+        "intents/cowswap/fills",
+        lambda tokens, date_from, date_to, chain, backend: get_cowswap_fills(tokens, date_from, date_to, chain, backend=backend),
+        inclusive_end=True,
+    ),
+    "fusion_fills": RefreshSpec(
+        "intents/fusion/fills",
+        lambda tokens, date_from, date_to, chain, backend: get_fusion_fills(tokens, date_from, date_to, chain, backend=backend),
+        inclusive_end=True,
+    ),
+    "unix_fills": RefreshSpec(
+        "intents/unix/fills",
+        lambda tokens, date_from, date_to, chain, backend: get_unix_fills(tokens, date_from, date_to, backend=backend),
+        inclusive_end=True,
+    ),
+    "daily_prices": RefreshSpec(
+        "prices/daily_dune_prices",
+        lambda tokens, date_from, date_to, chain, backend: get_token_prices(tokens, date_from, date_to, chain, backend=backend),
+        inclusive_end=True,
+    ),
+}
+
+
+@dataclass
+class RefreshPlan:
+    dataset: str
+    dataset_dir: str
+    high_water_mark: str
+    # Query parameters of the delta, in the dataset's own `date_to` convention
+    date_from: str
+    date_to: str
+    chain: str
+    tokens: Union[List[str], str]
+
+    @property
+    def label(self) -> str:
+        return f"{self.chain}_{self.date_from.replace('-', '')}_{self.date_to.replace('-', '')}"
+
+
+# The high-water mark is the latest `date_to` in the partitions' `metadata.json`, once every partition's rows are
+# checked to lie within its stated range (a stale `date_to` would re-pull and duplicate data). The delta reuses the
+# latest partition's tokens (or pairs) and chain. Only complete days are fetched, `until` (default: today) is the
+# first day left out. Returns None when the dataset is up to date.
+def plan_refresh(dataset: str, data_dir: str = "data", until: str = None) -> RefreshPlan:
+    spec = DATASETS[dataset]
+    dataset_dir = os.path.join(data_dir, spec.root)
+    partitions = read_partitions(dataset_dir)
+    if len(partitions) == 0:
+        raise ValueError(f"No partitions with metadata.json in {dataset_dir}, fetch an initial range first")
+    check_partitions(dataset, dataset_dir, partitions)
+    latest = max(partitions.values(), key=lambda m: _day(m["date_to"]))
+
+    one_day = datetime.timedelta(days=1)
+    until = _day(until) if until is not None else datetime.date.today()
+    start = _day(latest["date_to"]) + (one_day if spec.inclusive_end else datetime.timedelta(0))
+    if start >= until:
+        return None
+    end = until - one_day if spec.inclusive_end else until
+    return RefreshPlan(
+        dataset=dataset,
+        dataset_dir=dataset_dir,
+        high_water_mark=latest["date_to"],
+        date_from=f"{start:%Y-%m-%d}",
+        date_to=f"{end:%Y-%m-%d}",
+        chain=latest.get("chain", "ethereum"),
+        tokens=compaction.union_tokens([latest.get("pairs", latest.get("tokens", "all"))]),
+    )
+
+# Fetches the delta into `<dataset_dir>/<label>`. The partition is written next to it and renamed into place,
+# then the manifest is rewritten, so an interrupted refresh leaves either no partition or a complete one.
+def refresh(dataset: str, data_dir: str = "data", until: str = None, backend: str = dune_engine.BACKEND, dry_run: bool = False) -> dict:
+    plan = plan_refresh(dataset, data_dir, until)
+    if plan is None:
+        print(f"{dataset} is up to date")
+        return update_manifest(dataset, os.path.join(data_dir, DATASETS[dataset].root)) if not dry_run else None
+    print(f"Refreshing {dataset} after {plan.high_water_mark}: {plan.date_from} to {plan.date_to} into {plan.dataset_dir}/{plan.label}")
+    if dry_run:
+        return None
+
+    tokens = plan.tokens if isinstance(plan.tokens, str) else ",".join(plan.tokens)
+    result = DATASETS[dataset].fetch(tokens, plan.date_from, plan.date_to, plan.chain, backend)
+
+    out_dir = os.path.join(plan.dataset_dir, plan.label)
+    tmp_dir = f"{out_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    dune_utils.write_to_parquet(result.result.rows, tmp_dir)
+    dune_utils.store_metadata(tmp_dir, plan.tokens, plan.date_from, plan.date_to, plan.chain)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return update_manifest(dataset, plan.dataset_dir)
+
+# Raises when a partition's rows fall outside the days its metadata states, or can't be read to tell
+def check_partitions(dataset: str, dataset_dir: str, partitions: Dict[str, dict]):
+    one_day = datetime.timedelta(days=1)
+    time_col = compaction.DATASET_KEYS[dataset].time_col
+    mismatches = []
+    for label, metadata in partitions.items():
+        days = data_days(os.path.join(dataset_dir, label), metadata, time_col)
+        if days is None:
+            continue
+        first, last = _day(metadata["date_from"]), _day(metadata["date_to"]) - (datetime.timedelta(0) if DATASETS[dataset].inclusive_end else one_day)
+        if days[0] < first or days[1] > last:
+            mismatches.append(f"{label}: metadata {metadata['date_from']} to {metadata['date_to']}, rows {days[0]} to {days[1]}")
+    if len(mismatches) > 0:
+        raise ValueError(f"metadata.json disagrees with the partition data in {dataset_dir}, fix date_from/date_to first:\n" + "\n".join(mismatches))
+
+# First and last day of a partition's rows (None if empty), from the per-file ranges `utils.compaction` records
+# or else from the time column
+def data_days(partition_dir: str, metadata: dict, time_col: str) -> Optional[Tuple[datetime.date, datetime.date]]:
+    files = metadata.get("files")
+    if files and all(f.get(f"{time_col}_from") is not None for f in files):
+        return min(_as_day(f[f"{time_col}_from"]) for f in files), max(_as_day(f[f"{time_col}_to"]) for f in files)
+    ranges = []
+    for path in compaction.data_files(partition_dir):
+        try:
+            # An empty delta is written without columns
+            if pq.ParquetFile(path).metadata.num_rows == 0:
+                continue
+            column = pq.read_table(path, columns=[time_col])[time_col]
+        except Exception as e:
+            raise ValueError(f"Can't read {time_col} from {path} to check its metadata.json: {e}")
+        if len(column) > 0:
+            min_max = pc.min_max(column)
+            ranges.append((_as_day(min_max["min"].as_py()), _as_day(min_max["max"].as_py())))
+    if len(ranges) == 0:
+        return None
+    return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+def read_partitions(dataset_dir: str) -> Dict[str, dict]:
+    # Partitions compacted into another one are covered by it
+    labels = {os.path.basename(d) for d in compaction.partition_dirs(dataset_dir)}
+    partitions = {}
+    for path in sorted(glob.glob(f"{dataset_dir}/*/metadata.json")):
+        label = os.path.basename(os.path.dirname(path))
+        if label not in labels:
+            continue
+        with open(path) as f:
+            metadata = json.load(f)
+        if "date_to" in metadata:
+            partitions[label] = metadata
+    return partitions
+
+# `<dataset_dir>/manifest.json`: high-water mark plus the range and row count of every partition
+def update_manifest(dataset: str, dataset_dir: str) -> dict:
+    partitions = read_partitions(dataset_dir)
+    manifest = {
+        "dataset": dataset,
+        "high_water_mark": max((m["date_to"] for m in partitions.values()), key=_day, default=None),
+        "updated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "partitions": {
+            label: {
+                "date_from": m.get("date_from"),
+                "date_to": m["date_to"],
+                "chain": m.get("chain"),
+                "rows": sum(pq.ParquetFile(f).metadata.num_rows for f in glob.glob(f"{dataset_dir}/{label}/data*.parquet")),
+            }
+            for label, m in sorted(partitions.items(), key=lambda item: _day(item[1]["date_to"]))
+        },
+    }
+    tmp_path = os.path.join(dataset_dir, f".{MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, os.path.join(dataset_dir, MANIFEST))
+    print(f"Manifest saved to {dataset_dir}/{MANIFEST} (high-water mark {manifest['high_water_mark']})")
+    return manifest
+
+
+def _day(value: str) -> datetime.date:
+    # Metadata dates are stored as YYYY-MM-DD or YYYY-MM-DD HH:MM:SS
+    return datetime.datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+def _as_day(value) -> datetime.date:
+    # Time columns are unix seconds, timestamps, dates or ISO strings
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).date()
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return _day(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch only the days after each dataset's latest partition")
+    parser.add_argument("--datasets", nargs="+", default=list(DATASETS.keys()), choices=list(DATASETS.keys()), help="Datasets to refresh (default: all)")
+    parser.add_argument("--data-dir", default="data", help="Data directory")
+    parser.add_argument("--until", default=None, help="First day not to fetch, YYYY-MM-DD (default: today)")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the ranges that would be fetched")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    failed = []
+    for dataset in args.datasets:
+        try:
+            refresh(dataset, args.data_dir, args.until, args.backend, args.dry_run)
+        except ValueError as e:
+            print(f"Skipping {dataset}: {e}")
+            failed.append(dataset)
+    if len(failed) > 0:
+        raise SystemExit(f"Not refreshed: {', '.join(failed)}")
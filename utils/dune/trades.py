@@ -4,18 +4,17 @@ import argparse
 import uuid
 
 from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 QUERY_ID = os.getenv('DUNE_TRADES_QUERY_ID')
-
-dune = DuneClient.from_env()
+QUERY_FILE = dune_engine.query_path("trades.dune.sql")
 
 DATE_FROM = "2024-10-01"
 DATE_TO = "2024-11-01"
@@ -29,6 +28,7 @@ def get_dex_trades(
 		chain: str = CHAIN,
         performance: str = PERFORMANCE,
         allowed_rel_diff: float = 0.03,
+        backend: str = dune_engine.BACKEND
 	):
     date_from = dune_utils.parse_date_str(date_from)
     date_to = dune_utils.parse_date_str(date_to)
@@ -43,7 +43,7 @@ def get_dex_trades(
             QueryParameter.text_type(name="allowed_rel_diff", value=allowed_rel_diff),
 		]
     )
-    return dune.run_query(query=query, performance=performance)
+    return dune_engine.get_client(backend, QUERY_FILE).run_query(query=query, performance=performance)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch DEX trades data from Dune Analytics")
@@ -54,6 +54,7 @@ def parse_args():
     parser.add_argument("--performance", default=PERFORMANCE, choices=["free", "medium", "large"], help="Query performance")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -64,7 +65,8 @@ if __name__ == "__main__":
         date_from=args.date_from,
         date_to=args.date_to,
         chain=args.chain,
-        performance=args.performance
+        performance=args.performance,
+        backend=args.backend
     )
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
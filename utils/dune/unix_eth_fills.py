@@ -4,18 +4,17 @@ import argparse
 import uuid
 
 from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 QUERY_ID = os.getenv('DUNE_UNIX_FILLS_QUERY_ID')
-
-dune = DuneClient.from_env()
+QUERY_FILE = dune_engine.query_path("unix_fills.dune.sql")
 
 DATE_FROM = "2024-10-01"
 DATE_TO = "2024-12-15"
@@ -28,7 +27,8 @@ def get_unix_fills(
 		date_from: str = DATE_FROM,
 		date_to: str = DATE_TO,
         performance: str = PERFORMANCE,
-        rel_diff_limit: float = REL_DIFF_LIMIT
+        rel_diff_limit: float = REL_DIFF_LIMIT,
+        backend: str = dune_engine.BACKEND
 	):
     date_from = dune_utils.parse_date_str(date_from)
     date_to = dune_utils.parse_date_str(date_to)
@@ -42,7 +42,7 @@ def get_unix_fills(
 			QueryParameter.number_type(name="rel_diff_limit", value=rel_diff_limit)
 		]
     )
-    return dune.run_query(query=query, performance=performance)
+    return dune_engine.get_client(backend, QUERY_FILE).run_query(query=query, performance=performance)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch Fusion fills from Dune Analytics")
@@ -53,6 +53,7 @@ def parse_args():
     parser.add_argument("--performance", default=PERFORMANCE, choices=["free", "medium", "large"], help="Query performance")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -63,7 +64,8 @@ if __name__ == "__main__":
         date_from=args.date_from,
         date_to=args.date_to,
         performance=args.performance,
-        rel_diff_limit=args.rel_diff_limit
+        rel_diff_limit=args.rel_diff_limit,
+        backend=args.backend
     )
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
@@ -4,18 +4,17 @@ import argparse
 import uuid
 
 from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
 from dune_client.query import QueryBase
 
 import utils.dune.helpers as dune_utils
+import utils.dune.engine as dune_engine
 
 
 load_dotenv()
 
 DUNE_API_KEY = os.getenv('DUNE_API_KEY')
 QUERY_ID = os.getenv('DUNE_VARIENCE_QUERY_ID')
-
-dune = DuneClient.from_env()
+QUERY_FILE = dune_engine.query_path("intraday_varience.dune.sql")
 
 DATE_FROM = "2024-09-01 00:00:00"
 DATE_TO = "2025-05-01 00:00:00"
@@ -27,7 +26,8 @@ def get_volatility(
 		date_from: str = DATE_FROM,
 		date_to: str = DATE_TO,
 		chain: str = CHAIN,
-        performance: str = PERFORMANCE
+        performance: str = PERFORMANCE,
+        backend: str = dune_engine.BACKEND
 	):
     print(f"Fetching token price data for {chain} {tokens} from {date_from} to {date_to} with query ID {QUERY_ID}")
     query = QueryBase(
@@ -39,7 +39,7 @@ def get_volatility(
 			QueryParameter.text_type(name="chain", value=chain)
 		]
     )
-    return dune.run_query(query=query, performance=performance)
+    return dune_engine.get_client(backend, QUERY_FILE).run_query(query=query, performance=performance)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch token volatility data from Dune Analytics")
@@ -50,6 +50,7 @@ def parse_args():
     parser.add_argument("--performance", default=PERFORMANCE, choices=["low", "medium", "high"], help="Query performance")
     parser.add_argument("--label", default=str(uuid.uuid4()), help="Data label")
     parser.add_argument("--out-dir", default="data", help="Output directory")
+    parser.add_argument("--backend", default=dune_engine.BACKEND, choices=dune_engine.BACKENDS, help="Query backend: Dune API or local DuckDB over parquet tables")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -60,7 +61,8 @@ if __name__ == "__main__":
         date_from=args.date_from,
         date_to=args.date_to,
         chain=args.chain,
-        performance=args.performance
+        performance=args.performance,
+        backend=args.backend
     )
 
     out_dir = dune_utils.parse_dir(args.out_dir, args.label)
@@ -0,0 +1,296 @@
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import threading
+import time
+
+import pyarrow as pa
+import requests
+
+
+FIXTURES_DIR = "data/fixtures"
+BODIES = "bodies.zst"
+INDEX = "index.json"
+COMPRESSION = "zstd"
+# Not replayed: set by the server itself or only valid for the original connection
+SKIP_HEADERS = {"connection", "content-encoding", "content-length", "date", "keep-alive", "server", "transfer-encoding"}
+# Not forwarded to or stored from the client's request
+SKIP_REQUEST_HEADERS = {"host", "connection", "content-length", "accept-encoding"}
+
+
+@dataclass
+class FixtureResponse:
+    status: int
+    headers: Dict[str, str]
+    # Compressed body at `offset` of the bodies file
+    offset: int
+    size: int
+    raw_size: int
+
+
+# Recorded responses of one upstream. Bodies are compressed one by one and appended to a single file,
+# `index.json` maps every request key to its responses in recording order (eg. the PENDING -> COMPLETED
+# polls of a Dune execution) and is replaced atomically after each write, so recording can be resumed.
+class FixtureStore:
+
+    def __init__(self, root: str = FIXTURES_DIR, upstream: str = None):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        index = self._read_index()
+        self.upstream = upstream or index.get("upstream")
+        self.entries: Dict[str, List[FixtureResponse]] = {
+            key: [FixtureResponse(**r) for r in responses] for key, responses in index.get("entries", {}).items()
+        }
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self.entries.values())
+
+    def add(self, key: str, status: int, headers: Dict[str, str], body: bytes):
+        compressed = pa.compress(body, codec=COMPRESSION, asbytes=True) if body else b""
+        with self.lock:
+            with open(os.path.join(self.root, BODIES), "ab") as f:
+                offset = f.tell()
+                f.write(compressed)
+            headers = {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS}
+            self.entries.setdefault(key, []).append(FixtureResponse(status, headers, offset, len(compressed), len(body)))
+            self._write_index()
+
+    def get(self, key: str, i: int) -> Optional[FixtureResponse]:
+        # Past the last recorded response the last one is repeated
+        responses = self.entries.get(key)
+        if not responses:
+            return None
+        return responses[min(i, len(responses) - 1)]
+
+    def body(self, response: FixtureResponse) -> bytes:
+        if response.size == 0:
+            return b""
+        with open(os.path.join(self.root, BODIES), "rb") as f:
+            f.seek(response.offset)
+            compressed = f.read(response.size)
+        return pa.decompress(compressed, decompressed_size=response.raw_size, codec=COMPRESSION, asbytes=True)
+
+    def _read_index(self) -> dict:
+        path = os.path.join(self.root, INDEX)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_index(self):
+        index = {
+            "upstream": self.upstream,
+            "entries": {key: [asdict(r) for r in responses] for key, responses in self.entries.items()},
+        }
+        tmp_path = os.path.join(self.root, f".{INDEX}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.root, INDEX))
+
+
+def request_key(method: str, path: str, body: bytes = b"") -> str:
+    # Requests with a body (eg. Dune's execute with query parameters) are told apart by its hash
+    key = f"{method.upper()} {path}"
+    if body:
+        key += f" {hashlib.sha1(body).hexdigest()[:16]}"
+    return key
+
+
+@dataclass
+class ReplayConfig:
+    # Added to every response: `latency_ms` +- uniform `jitter_ms`
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Share of requests answered with `error_status` instead of the recorded response
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Token bucket over all clients, requests above it get a 429 with `Retry-After`
+    rate_limit: Optional[float] = None
+    burst: int = 1
+    seed: Optional[int] = None
+
+
+@dataclass
+class ReplayStats:
+    requests: int = 0
+    served: int = 0
+    errors: int = 0
+    throttled: int = 0
+    misses: int = 0
+    by_key: Dict[str, int] = field(default_factory=dict)
+
+
+class _TokenBucket:
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        # 0 if a request may pass, otherwise seconds until the next token
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class _FixtureHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.handle_fixture(self)
+
+    def do_POST(self):
+        self.server.handle_fixture(self)
+
+    def do_PATCH(self):
+        self.server.handle_fixture(self)
+
+    def do_DELETE(self):
+        self.server.handle_fixture(self)
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def respond(self, status: int, headers: Dict[str, str], body: bytes):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Forwards every request to `store.upstream` and records the response, eg. for the Dune API
+# (`DUNE_API_BASE_URL=http://127.0.0.1:<port>`) or a solver endpoint (`<solver_endpoint>` -> `http://127.0.0.1:<port>/`)
+class RecordingServer(http.server.ThreadingHTTPServer):
+
+    def __init__(self, store: FixtureStore, port: int = 0, timeout: float = 60):
+        if store.upstream is None:
+            raise ValueError("Recording needs an upstream URL")
+        super().__init__(("127.0.0.1", port), _FixtureHandler)
+        self.store = store
+        self.timeout_sec = timeout
+        self.http = requests.Session()
+
+    def handle_fixture(self, handler: _FixtureHandler):
+        body = handler.read_body()
+        headers = {k: v for k, v in handler.headers.items() if k.lower() not in SKIP_REQUEST_HEADERS}
+        try:
+            res = self.http.request(handler.command, self.store.upstream.rstrip("/") + handler.path, headers=headers, data=body or None, timeout=self.timeout_sec)
+        except requests.RequestException as e:
+            handler.respond(502, {"Content-Type": "text/plain"}, str(e).encode())
+            return
+        self.store.add(request_key(handler.command, handler.path, body), res.status_code, dict(res.headers), res.content)
+        handler.respond(res.status_code, {k: v for k, v in res.headers.items() if k.lower() not in SKIP_HEADERS}, res.content)
+
+
+# Serves recorded responses with injected latency, errors and rate limiting. Repeated requests of one key get the
+# recorded responses in order. Absolute upstream URLs in bodies (eg. Dune's `next_uri`) are rewritten to this server.
+# Unknown requests get a 404.
+class ReplayServer(http.server.ThreadingHTTPServer):
+
+    def __init__(self, store: FixtureStore, config: ReplayConfig = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), _FixtureHandler)
+        self.store = store
+        self.config = config or ReplayConfig()
+        self.stats = ReplayStats()
+        self.bucket = _TokenBucket(self.config.rate_limit, self.config.burst) if self.config.rate_limit else None
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_fixture(self, handler: _FixtureHandler):
+        key = request_key(handler.command, handler.path, handler.read_body())
+        with self.lock:
+            self.stats.requests += 1
+            draw = self.random.random()
+            delay = self.config.latency_ms + self.config.jitter_ms * (2 * self.random.random() - 1)
+
+        wait = self.bucket.take() if self.bucket is not None else 0.0
+        if wait > 0:
+            self._count("throttled")
+            handler.respond(429, {"Retry-After": str(max(1, round(wait))), "Content-Type": "text/plain"}, b"Rate limit exceeded")
+            return
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if draw < self.config.error_rate:
+            self._count("errors")
+            handler.respond(self.config.error_status, {"Content-Type": "text/plain"}, b"Injected error")
+            return
+
+        # Errors and throttled requests don't advance the sequence, so retries see what a real retry would
+        with self.lock:
+            i = self.stats.by_key.get(key, 0)
+            self.stats.by_key[key] = i + 1
+        response = self.store.get(key, i)
+        if response is None:
+            self._count("misses")
+            handler.respond(404, {"Content-Type": "text/plain"}, f"No fixture for {key}".encode())
+            return
+        body = self.store.body(response)
+        if self.store.upstream:
+            body = body.replace(self.store.upstream.rstrip("/").encode(), self.base_url.encode())
+        self._count("served")
+        handler.respond(response.status, response.headers, body)
+
+    def _count(self, name: str):
+        with self.lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+
+def start(server: http.server.ThreadingHTTPServer) -> http.server.ThreadingHTTPServer:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"{type(server).__name__} listening at http://127.0.0.1:{server.server_address[1]}/")
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record and replay HTTP responses of the solver endpoint and Dune API")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixtures directory")
+    parser.add_argument("--upstream", default=None, help="Upstream URL to record, eg. https://api.dune.com")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second over all clients")
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = FixtureStore(args.fixtures, args.upstream)
+    if args.mode == "record":
+        server = RecordingServer(store, args.port)
+    else:
+        config = ReplayConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.rate_limit, args.burst, args.seed)
+        server = ReplayServer(store, config, args.port)
+        print(f"Replaying {len(store)} responses of {len(store.entries)} requests")
+    print(f"{args.mode.capitalize()}ing at http://127.0.0.1:{server.server_address[1]}/ ({store.upstream})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.mode == "replay":
+            print(asdict(server.stats))
@@ -0,0 +1,222 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.const import token_decimals
+import utils.amounts as amounts
+import utils.compaction as compaction
+
+
+CHUNK_SIZE = 250_000
+
+# Columns `_extract_trade_vals` in `utils.matchings` expects, plus provenance
+TRADE_COLUMNS = [
+    "id",
+    "token_bought_address",
+    "token_sold_address",
+    "token_bought_amount",
+    "token_sold_amount",
+    "block_time",
+    "amount_usd",
+    "exact_out",
+    "max_match_time",
+    "order_id",
+    "source",
+]
+
+
+@dataclass
+class FillSource:
+    name: str
+    # Candidate column names; the first one present in the file is used
+    order_id: Tuple[str, ...]
+    token_sold: str
+    token_bought: str
+    amount_sold: str
+    amount_bought: str
+    # "wei" or "token" (decimal-adjusted)
+    amount_unit: str
+    amount_usd: Optional[str] = None
+    fill_suffix: Optional[str] = "tx_hash"
+
+
+FILL_SOURCES = {
+    "cowswap": FillSource(
+        name="cowswap",
+        order_id=("order_id", "orderUid"),
+        token_sold="token_sold",
+        token_bought="token_bought",
+        amount_sold="amount_sold",
+        amount_bought="amount_bought",
+        amount_unit="wei",
+    ),
+    "fusion": FillSource(
+        name="fusion",
+        order_id=("order_hash",),
+        token_sold="token_sold_address",
+        token_bought="token_bought_address",
+        amount_sold="token_sold_amount",
+        amount_bought="token_bought_amount",
+        amount_unit="wei",
+        amount_usd="amount_usd",
+    ),
+    "unix": FillSource(
+        name="unix",
+        order_id=("id",),
+        token_sold="token_sold_address",
+        token_bought="token_bought_address",
+        amount_sold="token_sold_amount",
+        amount_bought="token_bought_amount",
+        amount_unit="token",
+        amount_usd="amount_usd",
+        # UniswapX fill ids are already `<tx_hash>_<event_index>`
+        fill_suffix=None,
+    ),
+}
+
+
+class UsdPricer:
+    # Daily USD prices (`data/prices/daily_dune_prices`) used for sources without `amount_usd`
+
+    def __init__(self, daily_prices_df: pd.DataFrame):
+        df = daily_prices_df[["day", "token", "price"]].dropna()
+        self.index = pd.Series(
+            df["price"].to_numpy(dtype=float),
+            index=pd.MultiIndex.from_arrays([
+                _to_unix_seconds(df["day"]) // 86_400,
+                df["token"].str.lower().to_numpy(),
+            ])
+        )
+        self.index = self.index[~self.index.index.duplicated()]
+
+    def usd_value(self, block_time: np.ndarray, tokens: np.ndarray, token_amounts: np.ndarray) -> np.ndarray:
+        keys = pd.MultiIndex.from_arrays([block_time // 86_400, np.char.lower(tokens.astype(str))])
+        return self.index.reindex(keys).to_numpy() * token_amounts
+
+
+def iter_fill_trades(
+        paths: Iterable[str],
+        source: str,
+        chain: str = "ethereum",
+        tokens: Optional[List[str]] = None,
+        pricer: Optional[UsdPricer] = None,
+        chunk_size: int = CHUNK_SIZE,
+        extra_decimals: Dict[str, int] = None
+    ) -> Iterator[pd.DataFrame]:
+    spec = FILL_SOURCES[source]
+    decimals_map = {**token_decimals[chain], **(extra_decimals or {})}
+    token_set = pa.array([t.lower() for t in tokens], pa.string()) if tokens is not None else None
+
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            table = pa.Table.from_batches([batch])
+            if token_set is not None:
+                table = table.filter(pc.and_(
+                    pc.is_in(pc.utf8_lower(pc.cast(table[spec.token_sold], pa.string())), value_set=token_set),
+                    pc.is_in(pc.utf8_lower(pc.cast(table[spec.token_bought], pa.string())), value_set=token_set),
+                ))
+            if table.num_rows == 0:
+                continue
+            df = convert_fills(table, spec, decimals_map, pricer)
+            # Amounts of tokens with unknown decimals can't be expressed in token units
+            invalid = df["token_sold_amount"].isna() | df["token_bought_amount"].isna()
+            if invalid.any():
+                print(f"Dropping {invalid.sum()} {source} fills with unknown token decimals")
+                df = df[~invalid].reset_index(drop=True)
+            yield df
+
+def load_fill_trades(
+        sources: Dict[str, List[str]],
+        chain: str = "ethereum",
+        tokens: Optional[List[str]] = None,
+        daily_prices_df: Optional[pd.DataFrame] = None,
+        chunk_size: int = CHUNK_SIZE
+    ) -> pd.DataFrame:
+    pricer = UsdPricer(daily_prices_df) if daily_prices_df is not None else None
+    chunks = [
+        chunk
+        for source, paths in sources.items()
+        for chunk in iter_fill_trades(paths, source, chain, tokens, pricer, chunk_size)
+    ]
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=TRADE_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
+
+def dataset_paths(dataset_root: str) -> List[str]:
+    # `data-*.parquet` are the size-balanced files written by `utils.compaction`, compacted sources are skipped
+    return [f for d in compaction.partition_dirs(dataset_root) for f in compaction.data_files(d)]
+
+def convert_fills(
+        table: pa.Table,
+        spec: FillSource,
+        decimals_map: Dict[str, int],
+        pricer: Optional[UsdPricer] = None
+    ) -> pd.DataFrame:
+    order_id_col = next(c for c in spec.order_id if c in table.column_names)
+    order_id = pc.cast(table[order_id_col], pa.string())
+    trade_id = order_id
+    if spec.fill_suffix is not None:
+        # Orders can be filled in multiple transactions, make ids unique per fill
+        trade_id = pc.binary_join_element_wise(order_id, pc.cast(table[spec.fill_suffix], pa.string()), "_")
+
+    token_sold = pc.utf8_lower(pc.cast(table[spec.token_sold], pa.string()))
+    token_bought = pc.utf8_lower(pc.cast(table[spec.token_bought], pa.string()))
+    sold_amount = _token_units(table[spec.amount_sold], token_sold, spec.amount_unit, decimals_map)
+    bought_amount = _token_units(table[spec.amount_bought], token_bought, spec.amount_unit, decimals_map)
+    block_time = _unix_seconds(table["block_time"])
+
+    if spec.amount_usd is not None and spec.amount_usd in table.column_names:
+        amount_usd = pc.cast(table[spec.amount_usd], pa.float64()).to_numpy(zero_copy_only=False)
+    elif pricer is not None:
+        token_sold_np = token_sold.to_numpy(zero_copy_only=False)
+        token_bought_np = token_bought.to_numpy(zero_copy_only=False)
+        amount_usd = pricer.usd_value(block_time, token_sold_np, sold_amount)
+        amount_usd = np.where(np.isnan(amount_usd), pricer.usd_value(block_time, token_bought_np, bought_amount), amount_usd)
+    else:
+        amount_usd = np.full(table.num_rows, np.nan)
+
+    if "kind" in table.column_names:
+        exact_out = pc.equal(table["kind"], "buy").to_numpy(zero_copy_only=False)
+    else:
+        exact_out = np.zeros(table.num_rows, dtype=bool)
+
+    return pd.DataFrame({
+        "id": trade_id.to_numpy(zero_copy_only=False),
+        "token_bought_address": token_bought.to_numpy(zero_copy_only=False),
+        "token_sold_address": token_sold.to_numpy(zero_copy_only=False),
+        "token_bought_amount": bought_amount,
+        "token_sold_amount": sold_amount,
+        "block_time": block_time,
+        "amount_usd": amount_usd,
+        "exact_out": exact_out,
+        "max_match_time": pd.array([pd.NA] * table.num_rows, dtype="Int64"),
+        "order_id": order_id.to_numpy(zero_copy_only=False),
+        "source": spec.name,
+    })
+
+def _token_units(values: pa.Array, tokens: pa.Array, unit: str, decimals_map: Dict[str, int]) -> np.ndarray:
+    if unit == "token":
+        return pc.cast(values, pa.float64()).to_numpy(zero_copy_only=False)
+    decimals = amounts.decimals_for(tokens, decimals_map)
+    if pa.types.is_decimal(values.type):
+        wei = values
+    elif pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        wei = amounts.wei_from_strings(values)
+    else:
+        wei = amounts.wei_from_floats(values)
+    return amounts.to_token_units(wei, decimals)
+
+def _unix_seconds(values: pa.Array) -> np.ndarray:
+    if pa.types.is_integer(values.type):
+        return pc.cast(values, pa.int64()).to_numpy(zero_copy_only=False)
+    return _to_unix_seconds(values.to_pandas())
+
+def _to_unix_seconds(values: pd.Series) -> np.ndarray:
+    ts = pd.to_datetime(values, utc=True)
+    return ((ts - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
@@ -0,0 +1,236 @@
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional
+import argparse
+import functools
+import http.server
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from utils.batch_auction import run_batch_auction, MATCH_COLUMNS, EXPIRED_COLUMNS
+from utils.const import token_decimals, eth_tokens
+from utils.stats_accumulators import MatchesStatsAccumulator
+import utils.intent_trades as intent_trades
+
+
+# Orders as `CowSwapIntentsLoader._parse_order` emits them
+ORDER_SOURCE = intent_trades.FillSource(
+    name="cowswap_live",
+    order_id=("uid",),
+    token_sold="sell_token",
+    token_bought="buy_token",
+    amount_sold="sell_amount",
+    amount_bought="buy_amount",
+    amount_unit="wei",
+    fill_suffix=None,
+)
+STABLE_TOKENS = set(eth_tokens.tkn_class_to_tkn["stable"])
+
+
+@dataclass
+class BatchLatency:
+    batch_id: int
+    orders: int
+    open_orders: int
+    matches: int
+    expired: int
+    # Received -> converted, converted -> matched, received -> results emitted
+    ingest_ms: float
+    match_ms: float
+    total_ms: float
+
+
+@dataclass
+class LiveBatchResult:
+    batch_id: int
+    matches: pd.DataFrame
+    expired_orders: pd.DataFrame
+    latency: BatchLatency
+
+
+# Persistent book of one pair fed batch by batch: new orders join the open ones, every batch is cleared as a
+# uniform-price auction over all open orders (`utils.batch_auction`), filled amounts are taken off the book and
+# orders leave it when filled or past `valid_to`. Finished orders are enriched and folded into rolling stats.
+# Time is the data's time (latest order creation seen), so recorded batches replay the same way as live ones.
+class LiveMatcher:
+
+    def __init__(
+            self,
+            base_asset: str,
+            quote_asset: str,
+            chain: str = "ethereum",
+            on_batch: Optional[Callable[[LiveBatchResult], None]] = None
+        ):
+        self.base_asset = base_asset.lower()
+        self.quote_asset = quote_asset.lower()
+        self.decimals_map = token_decimals[chain]
+        self.on_batch = on_batch
+        self.open_df = pd.DataFrame(columns=intent_trades.TRADE_COLUMNS + ["sold_total", "bought_total"])
+        self.match_history = pd.DataFrame(columns=MATCH_COLUMNS)
+        self.accumulator = MatchesStatsAccumulator()
+        self.latencies: List[BatchLatency] = []
+        self.now = 0
+
+    def ingest(self, batch_id: int, orders: List[dict], received_at: float = None) -> LiveBatchResult:
+        received_at = received_at if received_at is not None else time.perf_counter()
+        new_df = self._convert(orders)
+        self.open_df = pd.concat([self.open_df, new_df[~new_df["id"].isin(self.open_df["id"])]], ignore_index=True)
+        if len(new_df) > 0:
+            self.now = max(self.now, int(new_df["block_time"].max()))
+        converted_at = time.perf_counter()
+
+        # Orders past their validity leave before the auction
+        is_expired = self.open_df["max_match_time"].astype(float).to_numpy() < self.now
+        expired_df = pd.DataFrame({
+            "id": self.open_df["id"][is_expired].to_numpy(),
+            "timestamp": self.open_df["max_match_time"][is_expired].astype("int64").to_numpy(),
+            "ext_ref_price": np.nan,
+        }, columns=EXPIRED_COLUMNS)
+        finished_df = self.open_df[is_expired]
+        self.open_df = self.open_df[~is_expired].reset_index(drop=True)
+
+        matches_df = pd.DataFrame(columns=MATCH_COLUMNS)
+        if len(self.open_df) > 1:
+            # One second batches clear at the end of the batch, so the book sits in the previous second to clear at `now`,
+            # where orders valid until `now` can still trade
+            book_df = self.open_df.assign(block_time=self.now - 1)
+            matches_df, _ = run_batch_auction(book_df, self.base_asset, self.quote_asset, 1)
+            finished_df = pd.concat([finished_df, self._take_fills(matches_df)], ignore_index=True)
+            self.match_history = pd.concat([self.match_history, matches_df], ignore_index=True)
+        matched_at = time.perf_counter()
+
+        self._finish(finished_df, expired_df)
+        latency = BatchLatency(
+            batch_id=batch_id,
+            orders=len(new_df),
+            open_orders=len(self.open_df),
+            matches=len(matches_df),
+            expired=len(expired_df),
+            ingest_ms=(converted_at - received_at) * 1000,
+            match_ms=(matched_at - converted_at) * 1000,
+            total_ms=(time.perf_counter() - received_at) * 1000,
+        )
+        self.latencies.append(latency)
+        result = LiveBatchResult(batch_id, matches_df, expired_df, latency)
+        if self.on_batch is not None:
+            self.on_batch(result)
+        return result
+
+    def stats(self):
+        # Rolling `MatchesStats` of all orders that left the book so far.
+        # Imported here as `utils.matchings` loads the orderbook engine, which live matching doesn't need
+        from utils.matchings import MatchesStats
+        return MatchesStats.from_accumulator(self.accumulator)
+
+    def latency_stats(self) -> pd.DataFrame:
+        df = pd.DataFrame([asdict(latency) for latency in self.latencies])
+        if len(df) == 0:
+            return df
+        return df[["ingest_ms", "match_ms", "total_ms"]].describe(percentiles=[0.5, 0.9, 0.99]).T
+
+    def _convert(self, orders: List[dict]) -> pd.DataFrame:
+        pair = {self.base_asset, self.quote_asset}
+        orders = [o for o in orders if {o["sell_token"].lower(), o["buy_token"].lower()} == pair]
+        if len(orders) == 0:
+            return self.open_df.iloc[:0]
+        table = pa.Table.from_pylist([{**o, "block_time": _unix_seconds(o["created_at"])} for o in orders])
+        df = intent_trades.convert_fills(table, ORDER_SOURCE, self.decimals_map)
+        df["max_match_time"] = pd.array([int(o["valid_to"]) for o in orders], dtype="Int64")
+        # USD volume is only known when the pair is quoted in a stablecoin
+        if self.quote_asset in STABLE_TOKENS:
+            df["amount_usd"] = np.where(df["token_sold_address"] == self.quote_asset, df["token_sold_amount"], df["token_bought_amount"])
+        df["sold_total"], df["bought_total"] = df["token_sold_amount"], df["token_bought_amount"]
+        return df.dropna(subset=["token_sold_amount", "token_bought_amount"])
+
+    def _take_fills(self, matches_df: pd.DataFrame) -> pd.DataFrame:
+        # Filled base comes off the base side, the other side shrinks in proportion (same limit price)
+        filled = pd.concat([
+            matches_df.groupby("ask_id")["amount"].sum(),
+            matches_df.groupby("bid_id")["amount"].sum(),
+        ]).groupby(level=0).sum()
+        fill = self.open_df["id"].map(filled).fillna(0).to_numpy(dtype=float)
+        is_ask = (self.open_df["token_sold_address"] == self.base_asset).to_numpy()
+        sold = self.open_df["token_sold_amount"].to_numpy(dtype=float)
+        bought = self.open_df["token_bought_amount"].to_numpy(dtype=float)
+        base = np.where(is_ask, sold, bought)
+        left = np.clip(1 - fill / base, 0, 1)
+        self.open_df["token_sold_amount"] = sold * left
+        self.open_df["token_bought_amount"] = bought * left
+        done = left < 1e-12
+        finished_df = self.open_df[done]
+        self.open_df = self.open_df[~done].reset_index(drop=True)
+        return finished_df
+
+    def _finish(self, finished_df: pd.DataFrame, expired_df: pd.DataFrame):
+        if len(finished_df) > 0:
+            from utils.matchings import enrich_matches, MatchingOptions
+            trades_df = finished_df.assign(
+                token_sold_amount=finished_df["sold_total"],
+                token_bought_amount=finished_df["bought_total"],
+            ).drop(columns=["sold_total", "bought_total"])
+            is_finished = self.match_history["bid_id"].isin(trades_df["id"]) | self.match_history["ask_id"].isin(trades_df["id"])
+            enriched_df = enrich_matches(
+                trades_df,
+                self.match_history[is_finished],
+                expired_df[expired_df["id"].isin(trades_df["id"])],
+                MatchingOptions(self.base_asset, self.quote_asset, None, None, 0)
+            )
+            self.accumulator.update(enriched_df)
+        # Fills are kept while one of their orders is still on the book
+        open_ids = self.open_df["id"]
+        self.match_history = self.match_history[self.match_history["bid_id"].isin(open_ids) | self.match_history["ask_id"].isin(open_ids)]
+
+
+# Feeds every batch the loader parses into `matcher`, without writing parquet
+def attach(loader, matcher: LiveMatcher):
+    loader.on_orders = lambda batch_id, orders, received_at: matcher.ingest(batch_id, orders, received_at)
+    return loader
+
+# Local stand-in for the solver endpoint: serves `<batch_id>.json` files from `directory`
+def serve_batches(directory: str, port: int = 0) -> http.server.ThreadingHTTPServer:
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving batches from {directory} at http://127.0.0.1:{server.server_address[1]}/")
+    return server
+
+
+def _unix_seconds(value) -> int:
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Match CowSwap solver batches live")
+    parser.add_argument("--solver-endpoint", default=None, help="Batch endpoint prefix, `<batch_id>.json` is appended")
+    parser.add_argument("--serve-dir", default=None, help="Serve recorded `<batch_id>.json` files locally instead")
+    parser.add_argument("--base", required=True, help="Base token address")
+    parser.add_argument("--quote", required=True, help="Quote token address")
+    parser.add_argument("--chain", default="ethereum")
+    parser.add_argument("--batch-id", type=int, required=True, help="First batch to process, eg. the current head batch")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches")
+    parser.add_argument("--pause-ms", type=int, default=1000)
+    parser.add_argument("--write-path", default=None, help="Also write parsed orders to this parquet file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    from utils.cowswap_intent_loader import CowSwapIntentsLoader
+
+    args = parse_args()
+    endpoint = args.solver_endpoint
+    if args.serve_dir is not None:
+        server = serve_batches(args.serve_dir)
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    def report(result: LiveBatchResult):
+        print(f"Batch {result.batch_id}: {result.latency.matches} matches, {result.latency.expired} expired, {result.latency.open_orders} open, {result.latency.total_ms:.1f} ms")
+
+    matcher = LiveMatcher(args.base, args.quote, args.chain, on_batch=report)
+    loader = attach(CowSwapIntentsLoader(endpoint, args.write_path, _pause_ms=args.pause_ms, _live=True), matcher)
+    loader.fetch(args.batch_id, max_batches=args.max_batches)
+    print(matcher.stats())
+    print(matcher.latency_stats())
@@ -1,20 +1,39 @@
-from multiprocess import Pool
 from functools import partial
 from typing import List, Dict
+import os
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
 import importlib
 import orderbook_rs
-importlib.reload(orderbook_rs)
 from orderbook_rs import Trade, MatchAnalysisPool, JobOptions, ExtRefPriceUpdate
 
 from collections import defaultdict
 from dataclasses import dataclass
 
+import utils.trade_partitions as trade_partitions
+import utils.batch_auction as batch_auction
+import utils.worker_pool as worker_pool
+from utils.stats_accumulators import StatAccumulator, MatchesStatsAccumulator, STAT_FIELDS
+import utils.bootstrap as bootstrap
+import utils.price_path as price_path
+import utils.realized_vol as realized_vol
+import utils.order_stream as order_stream
+import utils.ring_matching as ring_matching
+import utils.sim_checkpoint as sim_checkpoint
+from utils.sweep_store import SweepStore
+
 BPS = 10_000
+# Trade columns the engine sees (the last two are optional), see `_extract_trade_vals`
+ENGINE_TRADE_COLUMNS = ["id", "token_bought_address", "token_sold_address", "token_bought_amount", "token_sold_amount", "block_time", "amount_usd", "exact_out", "max_match_time"]
+
+
+# Opt-in replacement of the old import-time reload, picks up a rebuilt orderbook_rs in a running notebook
+def reload_engine():
+	global orderbook_rs, Trade, MatchAnalysisPool, JobOptions, ExtRefPriceUpdate
+	orderbook_rs = importlib.reload(orderbook_rs)
+	from orderbook_rs import Trade, MatchAnalysisPool, JobOptions, ExtRefPriceUpdate
 
 
 class Stat:
@@ -25,6 +44,16 @@ class Stat:
 		self.stddev = Stat.calc_stddev(df, col)
 		self.weighted_stddev = Stat.calc_stddev_w(df, col, weight_col)
 
+	@classmethod
+	def from_accumulator(cls, acc: StatAccumulator, str_in_bps: bool = True) -> "Stat":
+		stat = cls.__new__(cls)
+		stat.str_in_bps = str_in_bps
+		stat.mean = acc.mean
+		stat.weighted_mean = acc.weighted_mean
+		stat.stddev = acc.stddev
+		stat.weighted_stddev = acc.weighted_stddev
+		return stat
+
 	@staticmethod
 	def calc_mean(df: pd.DataFrame, col: str) -> float:
 		return df[col].mean()
@@ -43,6 +72,14 @@ class Stat:
 		weighted_diff = df[weight_col] * (df[col] - df[col].mean())**2
 		return np.sqrt(weighted_diff.sum() / df[weight_col].sum())
 
+	def to_dict(self, prefix: str) -> dict:
+		return {
+			f"{prefix}_mean": self.mean,
+			f"{prefix}_wmean": self.weighted_mean,
+			f"{prefix}_std": self.stddev,
+			f"{prefix}_wstd": self.weighted_stddev,
+		}
+
 	def __str__(self):
 		m, u = (BPS, "[BPS]") if self.str_in_bps else (1, "")
 		return f"{m*self.mean:.2f} ± {m*self.stddev:.2f} (W = {m*self.weighted_mean:.2f} ± {m*self.weighted_stddev:.2f}) {u}"
@@ -90,6 +127,19 @@ class MatchesStats:
 		self.total_volume_traded = df["amount_usd"].sum()
 		self.outliers = MatchesStats.get_outliers(df)
 
+	# Stats from streamed chunks or merged worker partials; individual outlier rows are not kept
+	@classmethod
+	def from_accumulator(cls, acc: MatchesStatsAccumulator) -> "MatchesStats":
+		stats = cls.__new__(cls)
+		for name, stat in acc.stats.items():
+			setattr(stats, name, Stat.from_accumulator(stat))
+		stats.rel_matched_vol = acc.rel_matched_vol
+		stats.rel_matches = acc.rel_matches
+		stats.total_trades = acc.total_trades
+		stats.total_volume_traded = acc.total_volume_traded
+		stats.outliers = None
+		return stats
+
 	def __str__(self):
 		out = ""
 		out += f"Price Improvement (No fail cost): {str(self.pi_no_fail_cost)}\n"
@@ -173,23 +223,32 @@ class DynamicMatchesResult:
 		self.expired_orders = expired_orders
 		self.trades_df = trades_df
 		self.inversed_prices = inversed_prices
+		self._span_index = None
 
-	def make_enrich_matches(self, prices_df: pd.DataFrame=None):
+	def make_enrich_matches(self, prices_df: pd.DataFrame=None, backend: str = "pandas", vol_df: pd.DataFrame = None):
 		return enrich_matches(
 			self.trades_df, 
 			self.matches_df,
 			self.expired_orders,
 			self.options,
 			prices_df=prices_df,
-			inversed_prices=self.inversed_prices
+			inversed_prices=self.inversed_prices,
+			backend=backend,
+			vol_df=vol_df
 		)
 		
-	def calc_stats(self, prices_df: pd.DataFrame=None, trim_outliers=False) -> MatchesStats:
+	def calc_stats(self, prices_df: pd.DataFrame=None, trim_outliers=False, backend: str = "pandas") -> MatchesStats:
 		# Todo: no need to hold trades in memory if empty
 		if self.matches_df.empty:
 			return None 
-		df = self.make_enrich_matches(prices_df)
+		df = self.make_enrich_matches(prices_df, backend)
 		return MatchesStats(df, trim_outliers)
+
+	def venue_stats(self) -> pd.DataFrame:
+		# Matches and matched volume per (bid venue, ask venue), for trades loaded with `MatchAnalysis.from_sources`
+		if "bid_source" not in self.matches_df.columns:
+			raise ValueError("Matches have no venue tags, load trades with a source column")
+		return order_stream.venue_stats(self.matches_df)
 	
 	def get_matched_for_trade(self, trade_id: str):
 		enriched_matches_df = self.make_enrich_matches()
@@ -202,72 +261,175 @@ class DynamicMatchesResult:
 			matched = self.matches_df.loc[self.matches_df["bid_id"] == trade_id]
 			return enriched_matches_df.loc[enriched_matches_df["id"].isin(matched["ask_id"])]
 		
-	def plot_order(self, order_id: str):
-		enriched_matches_df = self.make_enrich_matches()
+	def span_index(self) -> "SpanIndex":
+		if self._span_index is None:
+			self._span_index = SpanIndex(self.make_enrich_matches(), self.matches_df)
+		return self._span_index
+
+	def plot_order(self, order_id: str, annotate: bool = True):
+		index = self.span_index()
 
 		side_labels = ["Ask", "Bid"]
 
 		batch_duration = self.options.batch_duration if self.options.batch_duration is not None else 0
 		time_limit = self.options.time_limit if self.options.time_limit is not None else float('inf')
-		em_df = enriched_matches_df
-		matches_df = self.matches_df
 
-		order = em_df[lambda x: x["id"] == order_id]
-		if len(order) == 0:
+		order = index.get_order(order_id)
+		if order is None:
 			raise ValueError(f"Order {order_id} not found")
-		order = order.iloc[0]
-
-		timestamp_mask = lambda t: (t >= order["block_time"]-batch_duration) & (t <= order["block_time"] + time_limit)
-		same_side_mask = lambda s: (s != order["side"])
-
-		span_orders = em_df[lambda df: timestamp_mask(df["block_time"])]
-		counter_orders = span_orders[lambda df: ~same_side_mask(df["side"])]
-		same_side_orders = span_orders[lambda df: same_side_mask(df["side"])]
 
-		_orders = em_df[["id", "block_time", "price_org"]]
-		span_matches = matches_df.loc[lambda df: (df["bid_id"].isin(span_orders["id"])) | (df["ask_id"].isin(span_orders["id"]))]
-		span_matches = span_matches.merge(_orders, left_on="bid_id", right_on="id", suffixes=("_match", "_bid"), how="left")
-		span_matches = span_matches.merge(_orders, left_on="ask_id", right_on="id", suffixes=("_bid", "_ask"), how="left")
+		span_orders, span_matches = index.query(order["block_time"]-batch_duration, order["block_time"] + time_limit)
+		counter_side = (span_orders["side"] == order["side"]).to_numpy()
+		counter_orders = span_orders[counter_side]
+		same_side_orders = span_orders[~counter_side]
 
+		# Plotting is only needed interactively, keep matplotlib out of the module import
+		import matplotlib.pyplot as plt
+		from matplotlib.collections import LineCollection
 
-		for _, row in span_orders.iterrows():
-			plt.annotate(f"${row['amount_usd']:.0f}", (row["block_time"], row["price_org"]), textcoords="offset points", xytext=(0, 5), ha='center')
+		ax = plt.gca()
+		if annotate:
+			# Text artists can't be batched, but iterating over arrays avoids `iterrows` overhead
+			for x, y, usd in zip(span_orders["block_time"].to_numpy(), span_orders["price_org"].to_numpy(), span_orders["amount_usd"].to_numpy()):
+				ax.annotate(f"${usd:.0f}", (x, y), textcoords="offset points", xytext=(0, 5), ha='center')
 
 		# Plot orders
 		order_is_ask = order["side"] == "ask"
-		plt.scatter(counter_orders["block_time"], counter_orders["price_org"], label=side_labels[not order_is_ask], color="#4e79a7")
-		plt.scatter(same_side_orders["block_time"], same_side_orders["price_org"], label=side_labels[order_is_ask], color="#f28e2b")
-		plt.axvline(order["block_time"], color="#e15759", label="Order start time", alpha=0.5, linestyle="--")
-		plt.axvline(order["block_time"] + time_limit, color="#f28e2b", label="Order end time", alpha=0.5, linestyle="--")
-		plt.axhline(order["price_org"], color="#76b7b2", label="Order price", alpha=0.5, linestyle="--")
+		ax.scatter(counter_orders["block_time"], counter_orders["price_org"], label=side_labels[not order_is_ask], color="#4e79a7")
+		ax.scatter(same_side_orders["block_time"], same_side_orders["price_org"], label=side_labels[order_is_ask], color="#f28e2b")
+		ax.axvline(order["block_time"], color="#e15759", label="Order start time", alpha=0.5, linestyle="--")
+		ax.axvline(order["block_time"] + time_limit, color="#f28e2b", label="Order end time", alpha=0.5, linestyle="--")
+		ax.axhline(order["price_org"], color="#76b7b2", label="Order price", alpha=0.5, linestyle="--")
 
 		# Plot vertical lines indicating batches
 		if batch_duration > 0:
-			batch_offset = (order["block_time"] - em_df["block_time"].min()) % batch_duration
+			batch_offset = (order["block_time"] - index.min_time) % batch_duration
 			x_ticks = np.arange(order["block_time"]-batch_offset, order["block_time"]+time_limit+1, batch_duration)
-			for x in x_ticks:
-				plt.axvline(x, color="black", alpha=0.5, linestyle="--", linewidth=0.7)
+			ax.vlines(x_ticks, 0, 1, transform=ax.get_xaxis_transform(), color="black", alpha=0.5, linestyle="--", linewidth=0.7)
 
 		# Plot matches between span orders
-		ax = plt.gca()
 		x_view_min, x_view_max = ax.get_xlim()
 		y_view_min, y_view_max = ax.get_ylim()
 
-		for _, row in span_matches.iterrows():
-			is_input_order = row["bid_id"] == order_id or row["ask_id"] == order_id
-			hex_color = "#3E2723" if is_input_order else "#9c755f"
-			line = plt.plot([row["block_time_bid"], row["block_time_ask"]], 
-							[row["price_org_bid"], row["price_org_ask"]], 
-							color=hex_color, linewidth=0.5, linestyle="--")[0]
-			line.set_clip_on(True)
-
-		plt.xlim(x_view_min, x_view_max)
-		plt.ylim(y_view_min, y_view_max)
+		if len(span_matches) > 0:
+			segments = np.stack([
+				span_matches[["block_time_bid", "price_org_bid"]].to_numpy(dtype=float),
+				span_matches[["block_time_ask", "price_org_ask"]].to_numpy(dtype=float),
+			], axis=1)
+			is_input_order = ((span_matches["bid_id"] == order_id) | (span_matches["ask_id"] == order_id)).to_numpy()
+			colors = np.where(is_input_order, "#3E2723", "#9c755f")
+			lines = LineCollection(segments, colors=colors, linewidths=0.5, linestyles="--")
+			lines.set_clip_on(True)
+			ax.add_collection(lines, autolim=False)
+
+		ax.set_xlim(x_view_min, x_view_max)
+		ax.set_ylim(y_view_min, y_view_max)
+
+		ax.set_ylabel("Price")
+		ax.set_xlabel("Block Timestamp [sec]")
+		ax.set_title(f"Order {order_id[:6]}... | Batch Duration: {batch_duration} | Time Limit: {time_limit}")
+		ax.legend()
+
+
+# Time-sorted index over enriched orders and their matches, answering
+# "all orders and matches within [t_from, t_to]" with binary search
+class SpanIndex:
+	orders: pd.DataFrame
+	matches: pd.DataFrame
+
+	def __init__(self, enriched_df: pd.DataFrame, matches_df: pd.DataFrame):
+		self.orders = enriched_df.sort_values("block_time", kind="stable").reset_index(drop=True)
+		self.order_times = self.orders["block_time"].to_numpy()
+		self.min_time = self.order_times[0] if len(self.order_times) > 0 else 0
+		self._id_pos = pd.Series(np.arange(len(self.orders)), index=self.orders["id"].to_numpy())
+		self._id_pos = self._id_pos[~self._id_pos.index.duplicated()]
+		self.matches = self._resolve_matches(matches_df)
+
+		# Matches are indexed twice - by bid and by ask time - so a match is found if either side is in the span
+		self._by_bid = np.argsort(self.matches["block_time_bid"].to_numpy(), kind="stable")
+		self._by_ask = np.argsort(self.matches["block_time_ask"].to_numpy(), kind="stable")
+		self._bid_times = self.matches["block_time_bid"].to_numpy()[self._by_bid]
+		self._ask_times = self.matches["block_time_ask"].to_numpy()[self._by_ask]
+
+	def get_order(self, order_id: str):
+		pos = self._id_pos.get(order_id)
+		return None if pos is None else self.orders.iloc[pos]
+
+	def query(self, t_from, t_to):
+		lo, hi = SpanIndex._span(self.order_times, t_from, t_to)
+		blo, bhi = SpanIndex._span(self._bid_times, t_from, t_to)
+		alo, ahi = SpanIndex._span(self._ask_times, t_from, t_to)
+		match_idx = np.union1d(self._by_bid[blo:bhi], self._by_ask[alo:ahi])
+		return self.orders.iloc[lo:hi], self.matches.iloc[match_idx]
+
+	def _resolve_matches(self, matches_df: pd.DataFrame) -> pd.DataFrame:
+		bid_pos = self._id_pos.reindex(matches_df["bid_id"].to_numpy()).to_numpy()
+		ask_pos = self._id_pos.reindex(matches_df["ask_id"].to_numpy()).to_numpy()
+		known = ~np.isnan(bid_pos) & ~np.isnan(ask_pos)
+		bid_pos = bid_pos[known].astype(np.int64)
+		ask_pos = ask_pos[known].astype(np.int64)
+		price_org = self.orders["price_org"].to_numpy()
+		return pd.DataFrame({
+			"bid_id": matches_df["bid_id"].to_numpy()[known],
+			"ask_id": matches_df["ask_id"].to_numpy()[known],
+			"block_time_bid": self.order_times[bid_pos],
+			"price_org_bid": price_org[bid_pos],
+			"block_time_ask": self.order_times[ask_pos],
+			"price_org_ask": price_org[ask_pos],
+		})
 
-		plt.ylabel("Price")
-		plt.xlabel("Block Timestamp [sec]")
-		plt.title(f"Order {order_id[:6]}... | Batch Duration: {batch_duration} | Time Limit: {time_limit}")
-		plt.legend()
+	@staticmethod
+	def _span(sorted_times: np.ndarray, t_from, t_to):
+		lo = np.searchsorted(sorted_times, t_from, side="left")
+		hi = np.searchsorted(sorted_times, t_to, side="right")
+		return lo, hi
+
+# Per trade aggregation of fills: each match counts towards both its bid and its ask.
+# Ids are integer coded and reduced with bincount / ufunc.at, so one linear pass without melt or sort.
+def aggregate_matches(matches_df: pd.DataFrame) -> pd.DataFrame:
+	n = len(matches_df)
+	codes, ids = pd.factorize(np.concatenate([
+		matches_df["bid_id"].to_numpy(dtype=object),
+		matches_df["ask_id"].to_numpy(dtype=object)
+	]))
+	n_ids = len(ids)
+
+	amount = np.tile(matches_df["amount"].to_numpy(dtype=float), 2)
+	price = np.tile(matches_df["price"].to_numpy(dtype=float), 2)
+	timestamp = np.tile(matches_df["timestamp"].to_numpy(dtype=np.int64), 2)
+	ext_ref_price = np.tile(matches_df["ext_ref_price"].to_numpy(dtype=float), 2)
+	has_ref_price = ~np.isnan(ext_ref_price)
+
+	matched_amount_base = np.bincount(codes, weights=amount, minlength=n_ids)
+	matched_amount_quote = np.bincount(codes, weights=amount * price, minlength=n_ids)
+	price_x_amount = np.bincount(codes, weights=np.where(has_ref_price, ext_ref_price * amount, 0), minlength=n_ids)
+	timestamp_x_amount = np.bincount(codes, weights=timestamp * amount, minlength=n_ids)
+	match_fills = np.bincount(codes, minlength=n_ids)
+
+	match_time_max = np.full(n_ids, np.iinfo(np.int64).min)
+	np.maximum.at(match_time_max, codes, timestamp)
+
+	# Last known ref price in time: latest timestamp with a price, ties go to the later match
+	ref_time_max = np.full(n_ids, np.iinfo(np.int64).min)
+	np.maximum.at(ref_time_max, codes[has_ref_price], timestamp[has_ref_price])
+	is_last = has_ref_price & (timestamp == ref_time_max[codes])
+	last_pos = np.full(n_ids, -1)
+	np.maximum.at(last_pos, codes[is_last], np.arange(2 * n)[is_last])
+	match_ex_ref_price_last = np.where(last_pos >= 0, ext_ref_price[last_pos], np.nan)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return pd.DataFrame({
+			"id": ids,
+			"matched_amount_base": matched_amount_base,
+			"matched_amount_quote": matched_amount_quote,
+			"match_time_max": match_time_max,
+			"price_x_amount": price_x_amount,
+			"timestamp_x_amount": timestamp_x_amount,
+			"match_ex_ref_price_last": match_ex_ref_price_last,
+			"match_fills": match_fills,
+			"match_ext_ref_price_wmean": price_x_amount / matched_amount_base,
+			"match_time_wmean": timestamp_x_amount / matched_amount_base,
+		})
 
 def enrich_matches(
 		trades_df: pd.DataFrame, 
@@ -275,8 +437,16 @@ def enrich_matches(
 		expired_df: pd.DataFrame,
 		options: MatchingOptions,
 		prices_df: pd.DataFrame = None,
-		inversed_prices: bool = None
+		inversed_prices: bool = None,
+		backend: str = "pandas",
+		vol_df: pd.DataFrame = None
 	) -> pd.DataFrame:
+	if backend == "polars":
+		# Optional dependency, only needed for the lazy Polars plan
+		import utils.matchings_polars as matchings_polars
+		return matchings_polars.enrich_matches(trades_df, matches_df, expired_df, options, prices_df, inversed_prices, vol_df)
+	elif backend != "pandas":
+		raise ValueError(f"Unknown backend: {backend!r}")
 	# todo: assume: prices and trades have the same market direction; there is "invert" column in trades_df 
 
 	ROUND_DEC = np.finfo(float).precision-1
@@ -284,43 +454,8 @@ def enrich_matches(
 	quote_asset = options.quote_asset
 	time_limit = options.time_limit
 
-	# Melt matches
-	matches_melted_df = matches_df.melt(
-		id_vars=["amount", "price", "timestamp", "ext_ref_price"], 
-		value_vars=["bid_id", "ask_id"], 
-		var_name="side", 
-		value_name="id"
-	).replace({"bid_id": "bid", "ask_id": "ask"}, inplace=False)
-	matches_melted_df["matched_amount_base"] = matches_melted_df["amount"]
-	matches_melted_df["matched_amount_quote"] = matches_melted_df["amount"] * matches_melted_df["price"]
-
-	# Group by trade id
-	matches_melted_df["price_x_amount"] = matches_melted_df["ext_ref_price"] * matches_melted_df["amount"]
-	matches_melted_df["timestamp_x_amount"] = matches_melted_df["timestamp"] * matches_melted_df["amount"]
-	matches_grouped_df = matches_melted_df \
-		.sort_values("timestamp") \
-		.groupby("id") \
-		.agg(
-			matched_amount_base=("matched_amount_base", "sum"), 
-			matched_amount_quote=("matched_amount_quote", "sum"),
-			match_time_max=("timestamp", "max"),
-			price_x_amount=("price_x_amount", "sum"),
-			timestamp_x_amount=("timestamp_x_amount", "sum"),
-			# match_time_wmean=("timestamp", lambda x: np.average(x, weights=matches_melted_df.loc[x.index, "amount"])),
-			# match_ext_ref_price_wmean=(
-			# 	"ext_ref_price",
-			# 	lambda s: (
-			# 		np.average(s, weights=matches_melted_df.loc[s.index, "amount"])
-			# 		if s.notna().any()
-			# 		else np.nan
-			# 	),
-			# ),
-			match_ex_ref_price_last=("ext_ref_price", "last"),
-			match_fills=("side", "count"),
-			# side=("side", "first")
-		).reset_index()
-	matches_grouped_df["match_ext_ref_price_wmean"] = matches_grouped_df["price_x_amount"] / matches_grouped_df["matched_amount_base"]
-	matches_grouped_df["match_time_wmean"] = matches_grouped_df["timestamp_x_amount"] / matches_grouped_df["matched_amount_base"]
+	# Aggregate fills per trade id
+	matches_grouped_df = aggregate_matches(matches_df)
 
 	# Merge trades with matches and expired orders
 	trades_w_matches_df = trades_df.merge(matches_grouped_df.assign(is_matched = True), on="id", how="left")
@@ -343,17 +478,7 @@ def enrich_matches(
 	trades_w_matches_df["wait_time_max"] = trades_w_matches_df["match_time_max"] - trades_w_matches_df["block_time"]
 
 	# Masks for ask and bid trades (if exact out the side is reversed)
-	ask_mask = trades_w_matches_df["token_sold_address"] == base_asset
-	trades_w_matches_df["is_ask"] = ask_mask
-
-	# Calculate matched proportion
-
-	trades_w_matches_df.loc[ask_mask, "prop_matched"] = trades_w_matches_df["matched_amount_base"] / trades_w_matches_df["token_sold_amount"]
-	trades_w_matches_df.loc[~ask_mask, "prop_matched"] = trades_w_matches_df["matched_amount_quote"] / trades_w_matches_df["token_sold_amount"]
-	trades_w_matches_df["prop_matched"] = trades_w_matches_df["prop_matched"].round(ROUND_DEC).fillna(0)
-
-	
-	# expect nan vals for trades that are not matched nor expired
+	trades_w_matches_df["is_ask"] = trades_w_matches_df["token_sold_address"] == base_asset
 
 	# todo
 	# exact_out_mask = trades_w_matches_df.get("exact_out", pd.Series(False, index=trades_w_matches_df.index)).fillna(False)
@@ -362,24 +487,19 @@ def enrich_matches(
 	# trades_w_matches_df.loc[~ask_mask & ~exact_out_mask, "prop_matched"] = trades_w_matches_df["matched_amount_quote"] / trades_w_matches_df["token_sold_amount"]
 	# trades_w_matches_df.loc[~ask_mask & exact_out_mask, "prop_matched"] = trades_w_matches_df["matched_amount_base"] / trades_w_matches_df["token_bought_amount"]
 
-
 	# todo: check proportions are correct by summing up the amounts
 
-	# Calculate original price
-	trades_w_matches_df.loc[ask_mask, "price_org"] = trades_w_matches_df["token_bought_amount"] / trades_w_matches_df["token_sold_amount"]
-	trades_w_matches_df.loc[~ask_mask, "price_org"] = trades_w_matches_df["token_sold_amount"] / trades_w_matches_df["token_bought_amount"]
-
-	# Calculate matched price (weighted average of fills)
-	trades_w_matches_df["price_matched"] = (trades_w_matches_df["matched_amount_quote"] / trades_w_matches_df["matched_amount_base"]).fillna(0)
-	# Calculate realized price: (matched_quote + remaining_quote) / (matched_base + remaining_base)
-	trades_w_matches_df["price_realized"] = trades_w_matches_df["prop_matched"] * (trades_w_matches_df["price_matched"] - trades_w_matches_df["price_org"]) + trades_w_matches_df["price_org"]
-	# Calculate relative price improvement
-	trades_w_matches_df.loc[ask_mask, "price_improvement"] = (trades_w_matches_df["price_realized"] - trades_w_matches_df["price_org"]) / trades_w_matches_df["price_org"]
-	trades_w_matches_df.loc[~ask_mask, "price_improvement"] = (trades_w_matches_df["price_org"] - trades_w_matches_df["price_realized"]) / trades_w_matches_df["price_org"]
-	trades_w_matches_df["price_improvement"] = trades_w_matches_df["price_improvement"].round(ROUND_DEC)
-
-	trades_w_matches_df.loc[ask_mask, "gross_pi"] = (trades_w_matches_df["price_matched"] - trades_w_matches_df["price_org"]) / trades_w_matches_df["price_org"]
-	trades_w_matches_df.loc[~ask_mask, "gross_pi"] = (trades_w_matches_df["price_org"] - trades_w_matches_df["price_matched"]) / trades_w_matches_df["price_org"]
+	# Matched proportion, original / matched / realized price and price improvement
+	price_metrics = calc_price_metrics(
+		trades_w_matches_df["is_ask"].to_numpy(dtype=bool),
+		trades_w_matches_df["token_sold_amount"].to_numpy(dtype=float),
+		trades_w_matches_df["token_bought_amount"].to_numpy(dtype=float),
+		trades_w_matches_df["matched_amount_base"].to_numpy(dtype=float),
+		trades_w_matches_df["matched_amount_quote"].to_numpy(dtype=float),
+		ROUND_DEC
+	)
+	for col, values in price_metrics.items():
+		trades_w_matches_df[col] = values
 
 	if prices_df is not None or trades_w_matches_df["match_ext_ref_price_wmean"].sum() != 0:
 		def rev_market_direction(base_s, quote_s):
@@ -417,10 +537,11 @@ def enrich_matches(
 			)
 
 			na_market_price = trades_w_matches_df["end_mkt_price"].isna()
-			assert not na_market_price.any(), f"end_mkt_price is null for {sum(na_market_price)/len(trades_w_matches_df):.%} rows"
+			assert not na_market_price.any(), f"end_mkt_price is null for {sum(na_market_price)/len(trades_w_matches_df):.2%} rows"
 
 			# Turn all market prices in the direction of the base-quote pair
-			if rev_market_direction(prices_df["base_token"], prices_df["quote_token"]):
+			inversed_market = rev_market_direction(prices_df["base_token"], prices_df["quote_token"])
+			if inversed_market:
 				# todo: we should not assume `creation_price` and `market_price_rel_offset` are turned the same way as `end_mkt_price`
 				trades_w_matches_df = inverse_prices(trades_w_matches_df, ["end_mkt_price", "creation_price", "market_price_rel_offset"])
 		else:
@@ -436,59 +557,157 @@ def enrich_matches(
 				trades_w_matches_df = inverse_prices(trades_w_matches_df, ["creation_price", "market_price_rel_offset"])
 
 
-		trades_w_matches_df["effective_expiry_market_price"] = trades_w_matches_df["end_mkt_price"] * trades_w_matches_df["market_price_rel_offset"]
-		ask_mask = trades_w_matches_df["is_ask"]
-
-		# Calculate realized price: (matched_quote + remaining_quote) / (matched_base + remaining_base)
-		trades_w_matches_df["price_realized_with_cost"] = (
-			(trades_w_matches_df["price_matched"] - trades_w_matches_df["effective_expiry_market_price"])
-			* trades_w_matches_df["prop_matched"]
-			+ trades_w_matches_df["effective_expiry_market_price"]
-		)
-		
-		# Calculate relative price improvement
-		trades_w_matches_df.loc[:, "price_improvement_with_cost"] = np.where(
-			ask_mask,
-			trades_w_matches_df["price_realized_with_cost"] / trades_w_matches_df["price_org"] -1,
-			1 - trades_w_matches_df["price_realized_with_cost"] / trades_w_matches_df["price_org"]
-		).round(ROUND_DEC)
-
-		# Effective price improvement 
-		trades_w_matches_df.loc[:, "effective_price_improvement"] = np.where(
-			ask_mask,
-			trades_w_matches_df["price_realized_with_cost"] / trades_w_matches_df["effective_expiry_market_price"] -1,
-			1 - trades_w_matches_df["price_realized_with_cost"] / trades_w_matches_df["effective_expiry_market_price"]
-		).round(ROUND_DEC)
-
-		trades_w_matches_df["wait_cost"] = np.where(
-			trades_w_matches_df["is_ask"],
-			1 - trades_w_matches_df["end_mkt_price"] / trades_w_matches_df["creation_price"],
-			trades_w_matches_df["end_mkt_price"] / trades_w_matches_df["creation_price"] - 1
+		cost_metrics = calc_cost_metrics(
+			trades_w_matches_df["is_ask"].to_numpy(dtype=bool),
+			trades_w_matches_df["prop_matched"].to_numpy(dtype=float),
+			trades_w_matches_df["price_org"].to_numpy(dtype=float),
+			trades_w_matches_df["price_matched"].to_numpy(dtype=float),
+			trades_w_matches_df["end_mkt_price"].to_numpy(dtype=float),
+			trades_w_matches_df["creation_price"].to_numpy(dtype=float),
+			trades_w_matches_df["market_price_rel_offset"].to_numpy(dtype=float),
+			ROUND_DEC
 		)
+		for col, values in cost_metrics.items():
+			trades_w_matches_df[col] = values
 	else:
 		trades_w_matches_df["price_improvement_with_cost"] = np.nan
 		trades_w_matches_df["effective_price_improvement"] = np.nan
 		trades_w_matches_df["wait_cost"] = np.nan
 
-	if trades_w_matches_df["prop_matched"].max() > 1:
-		misfits = trades_w_matches_df[trades_w_matches_df["prop_matched"] > 1]
-		raise ValueError(f"prop_matched > 1 for {len(misfits)} rows")
-	if trades_w_matches_df["price_improvement"].min() < 0:
-		misfits = trades_w_matches_df[trades_w_matches_df["price_improvement"] < 0]
-		trades_w_matches_df = trades_w_matches_df[trades_w_matches_df["price_improvement"] >= 0]
-		raise ValueError(f"price_improvement < 0 for {len(misfits)} rows")
+	if prices_df is not None:
+		# Market path over each trade's waiting window
+		path_index = price_path.PricePathIndex(prices_df, inverse=inversed_market)
+		wait_metrics = price_path.wait_window_metrics(
+			path_index,
+			trades_w_matches_df["pair"].to_numpy(),
+			trades_w_matches_df["is_ask"].to_numpy(dtype=bool),
+			trades_w_matches_df["block_time"].to_numpy(dtype=np.int64),
+			trades_w_matches_df["match_time_max"].to_numpy(dtype=np.int64)
+		)
+		for col, values in wait_metrics.items():
+			trades_w_matches_df[col] = values
+
+	if vol_df is not None:
+		# Realized variance as of each trade's creation (see utils/realized_vol.py)
+		trades_w_matches_df = realized_vol.join_volatility(trades_w_matches_df, vol_df, base_asset)
 
 	return trades_w_matches_df
 
+# Fused kernels for the per trade metrics of `enrich_matches`.
+# Bid formulas are the ask ones with the sign flipped, so every column is written once into a preallocated array
+# and negated in place for bids instead of computing both sides and masking.
+def calc_price_metrics(
+		is_ask: np.ndarray,
+		sold: np.ndarray,
+		bought: np.ndarray,
+		matched_base: np.ndarray,
+		matched_quote: np.ndarray,
+		round_dec: int
+	) -> Dict[str, np.ndarray]:
+	n = len(is_ask)
+	is_bid = ~is_ask
+	prop_matched, price_org, price_matched = np.empty(n), np.empty(n), np.empty(n)
+	price_realized, price_improvement, gross_pi = np.empty(n), np.empty(n), np.empty(n)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		np.divide(np.where(is_ask, matched_base, matched_quote), sold, out=prop_matched)
+		np.round(prop_matched, round_dec, out=prop_matched)
+		prop_matched[np.isnan(prop_matched)] = 0
+
+		np.divide(bought, sold, out=price_org, where=is_ask)
+		np.divide(sold, bought, out=price_org, where=is_bid)
+
+		np.divide(matched_quote, matched_base, out=price_matched)
+		price_matched[np.isnan(price_matched)] = 0
+
+		# (matched_quote + remaining_quote) / (matched_base + remaining_base)
+		np.subtract(price_matched, price_org, out=price_realized)
+		np.multiply(price_realized, prop_matched, out=price_realized)
+		np.add(price_realized, price_org, out=price_realized)
+
+		np.subtract(price_realized, price_org, out=price_improvement)
+		np.divide(price_improvement, price_org, out=price_improvement)
+		np.negative(price_improvement, out=price_improvement, where=is_bid)
+		np.round(price_improvement, round_dec, out=price_improvement)
+
+		np.subtract(price_matched, price_org, out=gross_pi)
+		np.divide(gross_pi, price_org, out=gross_pi)
+		np.negative(gross_pi, out=gross_pi, where=is_bid)
+
+	n_over_matched = np.count_nonzero(prop_matched > 1)
+	if n_over_matched > 0:
+		raise ValueError(f"prop_matched > 1 for {n_over_matched} rows")
+	n_negative_pi = np.count_nonzero(price_improvement < 0)
+	if n_negative_pi > 0:
+		raise ValueError(f"price_improvement < 0 for {n_negative_pi} rows")
+
+	return dict(
+		prop_matched=prop_matched,
+		price_org=price_org,
+		price_matched=price_matched,
+		price_realized=price_realized,
+		price_improvement=price_improvement,
+		gross_pi=gross_pi,
+	)
+
+def calc_cost_metrics(
+		is_ask: np.ndarray,
+		prop_matched: np.ndarray,
+		price_org: np.ndarray,
+		price_matched: np.ndarray,
+		end_mkt_price: np.ndarray,
+		creation_price: np.ndarray,
+		market_price_rel_offset: np.ndarray,
+		round_dec: int
+	) -> Dict[str, np.ndarray]:
+	n = len(is_ask)
+	is_bid = ~is_ask
+	effective_expiry_market_price, price_realized_with_cost = np.empty(n), np.empty(n)
+	price_improvement_with_cost, effective_price_improvement, wait_cost = np.empty(n), np.empty(n), np.empty(n)
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		np.multiply(end_mkt_price, market_price_rel_offset, out=effective_expiry_market_price)
+
+		# (matched_quote + remaining_quote) / (matched_base + remaining_base), remainder at the market price
+		np.subtract(price_matched, effective_expiry_market_price, out=price_realized_with_cost)
+		np.multiply(price_realized_with_cost, prop_matched, out=price_realized_with_cost)
+		np.add(price_realized_with_cost, effective_expiry_market_price, out=price_realized_with_cost)
+
+		np.divide(price_realized_with_cost, price_org, out=price_improvement_with_cost)
+		np.subtract(price_improvement_with_cost, 1, out=price_improvement_with_cost)
+		np.negative(price_improvement_with_cost, out=price_improvement_with_cost, where=is_bid)
+		np.round(price_improvement_with_cost, round_dec, out=price_improvement_with_cost)
+
+		np.divide(price_realized_with_cost, effective_expiry_market_price, out=effective_price_improvement)
+		np.subtract(effective_price_improvement, 1, out=effective_price_improvement)
+		np.negative(effective_price_improvement, out=effective_price_improvement, where=is_bid)
+		np.round(effective_price_improvement, round_dec, out=effective_price_improvement)
+
+		np.divide(end_mkt_price, creation_price, out=wait_cost)
+		np.subtract(wait_cost, 1, out=wait_cost)
+		np.negative(wait_cost, out=wait_cost, where=is_ask)
+
+	return dict(
+		effective_expiry_market_price=effective_expiry_market_price,
+		price_realized_with_cost=price_realized_with_cost,
+		price_improvement_with_cost=price_improvement_with_cost,
+		effective_price_improvement=effective_price_improvement,
+		wait_cost=wait_cost,
+	)
+
 # todo: use mask for both prices and trades
-# todo: port everything into Rust/Polars
+# todo: port everything into Rust/Polars (enrichment has a Polars plan in `utils.matchings_polars`)
 # todo: test test test
 
 
 class DynamicJobResults:
 
-	def __init__(self, dyn_res: Dict[int, DynamicMatchesResult]):
+	def __init__(self, dyn_res: Dict[int, DynamicMatchesResult], engine: str = "orderbook", price_epsilon: float = None, price_bucket_sec: int = None):
 		self.dyn_res = dyn_res
+		# How the matches were simulated, stored next to the stats
+		self.engine = engine
+		self.price_epsilon = price_epsilon
+		self.price_bucket_sec = price_bucket_sec
 
 	def get_job_results(self, job_id: int) -> DynamicMatchesResult:
 		return self.dyn_res[job_id]
@@ -497,49 +716,86 @@ class DynamicJobResults:
 			self, 
 			prices_df: pd.DataFrame=None, 
 			trim_outliers=False,
-			n_workers: int = None
+			n_workers: int = None,
+			backend: str = "pandas",
+			flat: bool = True,
+			store: SweepStore = None,
+			dataset_version: str = None
 	) -> pd.DataFrame:
-		results = []
+		# Flat tables have numeric `<metric>_mean/_wmean/_std/_wstd` columns instead of `Stat` cells
+		if store is not None and (not flat or dataset_version is None):
+			raise ValueError("Storing results needs flat=True and a dataset_version")
+		worker_func = partial(DynamicJobResults._one_job, prices_df=prices_df, trim_outliers=trim_outliers, backend=backend, flat=flat)
+		if n_workers is not None and n_workers > 1:
+			rows = worker_pool.get_pool(n_workers).map(worker_func, self.dyn_res.items())
+		else:
+			rows = map(worker_func, self.dyn_res.items())
+		stats_df = pd.DataFrame([row for row in rows if row is not None])
+		if store is not None and len(stats_df) > 0:
+			store.append(stats_df.assign(
+				trim_outliers=bool(trim_outliers),
+				with_prices=prices_df is not None,
+				backend=backend,
+				engine=self.engine,
+				price_epsilon=self.price_epsilon,
+				price_bucket_sec=self.price_bucket_sec,
+			), dataset_version)
+		return stats_df
+
+	def get_bootstrap_cis(
+			self,
+			prices_df: pd.DataFrame = None,
+			trim_outliers=False,
+			replicates: int = bootstrap.REPLICATES,
+			seed: int = bootstrap.SEED,
+			method: str = "poisson",
+			alpha: float = bootstrap.ALPHA,
+			backend: str = "pandas"
+	) -> pd.DataFrame:
+		# Percentile CIs of the (weighted) means of every Stat metric, one row per job
+		frames, meta = {}, {}
 		for id, dyn_res in self.dyn_res.items():
+			if dyn_res.matches_df.empty:
+				continue
 			try:
-				s = dyn_res.calc_stats(prices_df=prices_df, trim_outliers=trim_outliers)
+				df = dyn_res.make_enrich_matches(prices_df, backend)
 			except Exception as e:
 				print(f"Error for {dyn_res.pair}: {e}")
 				continue
-			if s is None:
-				print(f"No results for {dyn_res.pair}")
-				continue
-			results.append(dict(
+			frames[id] = MatchesStats.trim_outliers(df) if trim_outliers else df
+			meta[id] = dict(pair=dyn_res.pair, time_limit=dyn_res.options.time_limit, batch_dur=dyn_res.options.batch_duration)
+		cis = bootstrap.bootstrap_cis(frames, replicates, seed, method, alpha)
+		return pd.DataFrame.from_dict(meta, orient="index").join(cis).rename_axis("job_id").reset_index()
+
+	@staticmethod
+	def _one_job(args, prices_df, trim_outliers, backend="pandas", flat=False):
+		job_id, dyn_res = args
+		try:
+			s = dyn_res.calc_stats(prices_df, trim_outliers, backend)
+		except Exception as e:
+			print(f"Error for {dyn_res.pair}: {e}")
+			return None
+		if s is None:
+			print(f"No results for {dyn_res.pair}")
+			return None
+		print(f"Job {job_id} done!")
+		if flat:
+			row = dict(
 				pair=dyn_res.pair,
 				time_limit=dyn_res.options.time_limit,
 				batch_dur=dyn_res.options.batch_duration,
-				pi_matched_only=s.pi_matched_only,
-				pi_no_fail_cost=s.pi_no_fail_cost,
-				pi_with_mkt_fallback=s.pi_with_mkt_fallback,
-				eff_pi_with_mkt_fallback=s.eff_pi_with_mkt_fallback,
-				wait_cost=s.wait_cost,
-				wait_cost_unmatched=s.wait_cost_unmatched,
+				min_delta=dyn_res.options.min_delta,
+			)
+			for name in STAT_FIELDS:
+				row.update(getattr(s, name).to_dict(name))
+			return dict(
+				**row,
 				rel_matched_vol=s.rel_matched_vol,
 				rel_matches=s.rel_matches,
 				total_volume_traded=s.total_volume_traded,
 				total_trade_count=s.total_trades,
-				job_id=id,
-			))
-			print(f"Job {id} done!")
-		return pd.DataFrame(results)
-
-		# worker_func = partial(DynamicJobResults._one_job, prices_df=prices_df, trim_outliers=trim_outliers)
-
-		# with Pool(processes=n_workers) as pool:
-		# 	rows = pool.map(worker_func, self.dyn_res.items())
-
-		# return pd.DataFrame(rows)
-
-	@staticmethod
-	def _one_job(args, prices_df, trim_outliers):
-		job_id, dyn_res = args
-		s = dyn_res.calc_stats(prices_df, trim_outliers)
-		print(f"Job {job_id} done")
+				job_id=job_id,
+			)
 		return dict(
 			pair=dyn_res.pair,
 			time_limit=dyn_res.options.time_limit,
@@ -589,20 +845,109 @@ class PriceProvider:
 		mask = (self.str_pairs.isin(pairs_str0)) | (self.str_pairs.isin(pairs_str1))
 		return mask
 
+	# Prices of the masked rows with updates dropped while the price stays within `epsilon` (relative)
+	# of the last kept price of the pair and/or coalesced to the last price per `bucket_sec` seconds.
+	def compressed(self, mask, epsilon: float = None, bucket_sec: int = None):
+		df = self.df[mask].sort_values(["base_token", "quote_token", "block_time"], kind="stable")
+		pair = (df["base_token"] + "_" + df["quote_token"]).to_numpy()
+		price = df["price"].to_numpy(dtype=float)
+		block_time = df["block_time"].to_numpy(dtype=np.int64)
+		new_pair = np.concatenate([[True], pair[1:] != pair[:-1]]) if len(df) else np.zeros(0, dtype=bool)
+		keep = np.ones(len(df), dtype=bool)
+
+		if bucket_sec:
+			bucket = block_time // bucket_sec
+			last_in_bucket = np.concatenate([(bucket[1:] != bucket[:-1]) | new_pair[1:], [True]]) if len(df) else keep
+			keep &= last_in_bucket
+		if epsilon:
+			kept = np.flatnonzero(keep)
+			first = np.concatenate([[True], pair[kept][1:] != pair[kept][:-1]]) if len(kept) else np.zeros(0, dtype=bool)
+			keep[kept] = _deadband(price[kept], first, epsilon)
+
+		# Error of the price the engine sees (last kept one of the pair) against every original row
+		last_kept = np.maximum.accumulate(np.where(keep | new_pair, np.arange(len(df)), 0)) if len(df) else np.zeros(0, dtype=int)
+		seen = np.where(keep[last_kept], price[last_kept], np.nan)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			error = np.abs(seen / price - 1)
+		report = PriceCompression(
+			rows_in=len(df),
+			rows_out=int(keep.sum()),
+			max_rel_error=float(np.nanmax(error)) if np.isfinite(error).any() else 0.0,
+		)
+		return df[keep], report
+
 	@staticmethod
 	def pair_to_str(t0, t1):
 		return t0 + "_" + t1
 
 
+def _deadband(price: np.ndarray, first: np.ndarray, epsilon: float) -> np.ndarray:
+	# Sequential, the reference is the last kept price; `first` starts a new pair
+	keep = np.zeros(len(price), dtype=bool)
+	last = np.nan
+	for i, (p, is_first) in enumerate(zip(price.tolist(), first.tolist())):
+		if is_first or abs(p / last - 1) > epsilon:
+			keep[i] = True
+			last = p
+	return keep
+
+
+@dataclass
+class PriceCompression:
+	rows_in: int
+	rows_out: int
+	# Largest relative difference between a price row and the price the engine had at that time
+	max_rel_error: float
+
+	@property
+	def ratio(self) -> float:
+		return self.rows_in / self.rows_out if self.rows_out > 0 else np.nan
+
+	def __str__(self):
+		return f"Price updates: {self.rows_out}/{self.rows_in} kept ({self.ratio:.1f}x), max rel. error {self.max_rel_error:.2e}"
+
+
 class MatchAnalysis:
 	price_provider: PriceProvider
 	trades_df: pd.DataFrame
 	jobs: List[Job]
 
-	def __init__(self, trades_df: pd.DataFrame, prices_df: pd.DataFrame = None):
-		self.trades_df = trades_df.sort_values("block_time")
+	def __init__(
+		self,
+		trades_df: pd.DataFrame,
+		prices_df: pd.DataFrame = None,
+		pair_slices: Dict[tuple, slice] = None,
+		presorted: bool = False
+	):
+		# Trades only need to be time-sorted within each pair; pair partitions are already stored that way
+		self.trades_df = trades_df if pair_slices is not None or presorted else trades_df.sort_values("block_time")
+		self.pair_slices = pair_slices
 		self.jobs = []
 		self.price_provider = PriceProvider(prices_df) if prices_df is not None else None
+		self.price_compression = None
+
+	@classmethod
+	def from_pair_partitions(
+		cls,
+		dataset_dirs: List[str],
+		pairs: List[tuple],
+		prices_df: pd.DataFrame = None
+	) -> "MatchAnalysis":
+		trades_df, pair_slices = trade_partitions.read_pairs(dataset_dirs, pairs)
+		return cls(trades_df, prices_df, pair_slices=pair_slices)
+
+	@classmethod
+	def from_sources(
+		cls,
+		sources: Dict[str, List[str]],
+		prices_df: pd.DataFrame = None,
+		chain: str = "ethereum",
+		tokens: List[str] = None,
+		daily_prices_df: pd.DataFrame = None
+	) -> "MatchAnalysis":
+		# Time-sorted files per venue (eg. {"dex": [...], "cowswap": [...]}) merged in order, no global sort
+		trades_df = order_stream.load_merged(sources, chain, tokens, daily_prices_df)
+		return cls(trades_df, prices_df, presorted=True)
 
 	def add_job(
 		self,
@@ -626,16 +971,156 @@ class MatchAnalysis:
 		self.add_job(base_asset, quote_asset, options)
 		return self
 	
-	def execute(self, token_to_symbol=None) -> DynamicJobResults:
-		trades = into_trades(self.trades_df)
-		price_updates = self._price_updates()
-		pool = MatchAnalysisPool(trades, price_updates)
-		meta = self._add_jobs(pool)
-		results = pool.execute()
-		dyn_res = self._parse_exe_results(results, meta, token_to_symbol)
+	def execute(
+		self,
+		token_to_symbol=None,
+		engine: str = "orderbook",
+		price_epsilon: float = None,
+		price_bucket_sec: int = None,
+		checkpoint_dir: str = None,
+		checkpoint_wave: int = None
+	) -> DynamicJobResults:
+		if engine == "batch":
+			results, meta = self._execute_batch_auctions(price_epsilon, price_bucket_sec)
+		elif engine == "orderbook" and checkpoint_dir is not None:
+			results, meta = self._execute_checkpointed(checkpoint_dir, price_epsilon, price_bucket_sec, checkpoint_wave)
+		elif engine == "orderbook":
+			trades = into_trades(self.trades_df)
+			price_updates = self._price_updates(price_epsilon, price_bucket_sec)
+			pool = MatchAnalysisPool(trades, price_updates)
+			meta = self._add_jobs(pool)
+			results = pool.execute()
+		else:
+			raise ValueError(f"Unknown engine: {engine!r}")
+		dyn_res = self._parse_exe_results(results, meta, token_to_symbol, engine=engine, price_epsilon=price_epsilon, price_bucket_sec=price_bucket_sec)
 		return dyn_res
 
-	def _parse_exe_results(self, results, meta, token_to_symbol=None) -> DynamicJobResults:
+	def find_rings(
+		self,
+		time_limit_sec: int,
+		window_sec: int = ring_matching.WINDOW_SEC,
+		max_length: int = ring_matching.MAX_RING_LENGTH,
+		tokens: List[str] = None
+	) -> ring_matching.RingMatchResult:
+		# Multi-asset CoWs over all loaded trades, pairwise ones are rings of length 2
+		return ring_matching.find_rings(self.trades_df, time_limit_sec, window_sec, max_length, tokens)
+
+	def _execute_batch_auctions(self, price_epsilon: float = None, price_bucket_sec: int = None):
+		# Uniform-price auctions in NumPy instead of the continuous orderbook, only for batched options.
+		# Reference prices are compressed like the engine's price updates.
+		if self.price_provider is not None and (price_epsilon or price_bucket_sec):
+			self.price_compression = self.price_provider.compressed(self._price_mask(), price_epsilon, price_bucket_sec)[1]
+			print(self.price_compression)
+		results, meta = {}, {}
+		for job in self.jobs:
+			trades_df = self.trades_df[job.trades_mask]
+			ref_prices_df = self._ref_prices(job.base_asset, job.quote_asset, price_epsilon, price_bucket_sec)
+			for option in job.options:
+				if not option.batch_dur_sec:
+					raise ValueError("The batch engine needs options with batch_dur_sec > 0")
+				if option.min_delta is not None:
+					raise ValueError("The batch engine doesn't support min_delta")
+				matches_df, expired_df = batch_auction.run_batch_auction(
+					trades_df,
+					job.base_asset,
+					job.quote_asset,
+					option.batch_dur_sec,
+					option.time_limit_sec,
+					ref_prices_df
+				)
+				print(f"Batch auction {job.base_asset}/{job.quote_asset} every {option.batch_dur_sec}s: {len(matches_df)} matches, {len(expired_df)} expired")
+				id = len(results)
+				results[id] = batch_auction.BatchAuctionResult(matches_df, expired_df)
+				meta[id] = ((job.base_asset, job.quote_asset), option, job.trades_mask)
+		return results, meta
+
+	def _execute_checkpointed(self, checkpoint_dir: str, price_epsilon: float = None, price_bucket_sec: int = None, wave_size: int = None):
+		# Every (job, option) is split into time segments whose orders can't meet (`sim_checkpoint.segments`). Segments
+		# whose results are stored for the same trades, prices up to their end, option and engine are loaded, the others
+		# run in waves of `wave_size` (default: one per CPU) in a shared pool and are stored after every wave.
+		# Segments only add up to a single run if the engine expires orders at their deadline and starts batches at
+		# multiples of batch_dur_sec, so the first split option of every engine version is also run whole and compared.
+		checkpoint = sim_checkpoint.SimCheckpoint(checkpoint_dir)
+		engine_version = getattr(orderbook_rs, "__version__", None)
+		verified_key = sim_checkpoint.unit_key("segments verified", engine_version)
+		outcomes, todo = [], {}
+		for job in self.jobs:
+			pair = (job.base_asset, job.quote_asset)
+			positions = np.flatnonzero(np.asarray(job.trades_mask, dtype=bool))
+			job_trades_df = self.trades_df.iloc[positions]
+			engine_df = job_trades_df[[c for c in ENGINE_TRADE_COLUMNS if c in job_trades_df.columns]]
+			block_time = job_trades_df["block_time"].to_numpy(dtype=np.int64)
+			prices_df = self._pair_price_updates(pair, price_epsilon, price_bucket_sec)
+			for option in job.options:
+				expiry = batch_auction.expiry_times(job_trades_df, block_time, option.time_limit_sec)
+				bounds = sim_checkpoint.segments(block_time, expiry, option.batch_dur_sec)
+				if len(bounds) == 1 and block_time[-1] - block_time[0] > sim_checkpoint.SEGMENT_SEC:
+					print(f"Warning: {job.base_asset}/{job.quote_asset} (time_limit_sec={option.time_limit_sec}, batch_dur_sec={option.batch_dur_sec}) has no point where all earlier orders have expired, it is stored only once finished")
+				trades_fps = sim_checkpoint.fingerprints(engine_df, [slice(start, end) for start, end in bounds])
+				# Everything in a segment is over by the last expiry in it, the engine can't have used later prices
+				ends = np.maximum.accumulate(expiry)[[end - 1 for _, end in bounds]]
+				prices_fps = sim_checkpoint.fingerprints(
+					prices_df, [slice(0, n) for n in np.searchsorted(prices_df["block_time"].to_numpy(dtype=float), ends, side="right")]
+				) if prices_df is not None else [None] * len(bounds)
+				keys = []
+				for (start, end), trades_fp, prices_fp in zip(bounds, trades_fps, prices_fps):
+					key = sim_checkpoint.unit_key(*pair, option.time_limit_sec, option.min_delta, option.batch_dur_sec, trades_fp, prices_fp, price_epsilon, price_bucket_sec, engine_version)
+					keys.append(key)
+					if key not in checkpoint:
+						info = {"pair": list(pair), "time_limit_sec": option.time_limit_sec, "min_delta": option.min_delta, "batch_dur_sec": option.batch_dur_sec,
+							"block_time_from": int(block_time[start]), "block_time_to": int(block_time[end - 1])}
+						todo[key] = (pair, option, positions[start:end], info)
+				outcomes.append((pair, option, job.trades_mask, keys))
+		print(f"{sum(len(keys) for *_, keys in outcomes) - len(todo)}/{sum(len(keys) for *_, keys in outcomes)} segments restored from {checkpoint_dir}")
+
+		units = list(todo.items())
+		split = [outcome for outcome in outcomes if len(outcome[3]) > 1]
+		verify = split[0] if verified_key not in checkpoint and len(split) > 0 else None
+		if verify is not None:
+			pair, option, trades_mask, _ = verify
+			units.insert(0, (verified_key, (pair, option, np.flatnonzero(np.asarray(trades_mask, dtype=bool)), {"verified_segments": str(engine_version)})))
+		whole = None
+
+		if len(units) > 0:
+			trades = into_trades(self.trades_df)
+			price_updates = self._price_updates(price_epsilon, price_bucket_sec)
+			wave_size = wave_size or os.cpu_count() or 1
+			for wave_start in range(0, len(units), wave_size):
+				wave = units[wave_start:wave_start + wave_size]
+				pool = MatchAnalysisPool(trades, price_updates)
+				ids = []
+				for _, (pair, option, positions, _) in wave:
+					mask = np.zeros(len(self.trades_df), dtype=bool)
+					mask[positions] = True
+					ids += pool.add_job(*pair, mask.tolist(), [option])
+				pool_results = pool.execute()
+				for (key, (*_, info)), pool_id in zip(wave, ids):
+					frames = (_records_df(pool_results[pool_id].matches), _records_df(pool_results[pool_id].expired_orders))
+					if key == verified_key:
+						whole = frames
+					else:
+						checkpoint.save(key, *frames, info)
+				print(f"Wave {wave_start // wave_size + 1}/{-(-len(units) // wave_size)}: {len(wave)} segments stored")
+
+		if verify is not None:
+			stitched = [_concat_segments([checkpoint.load(key)[i] for key in verify[3]]) for i in range(2)]
+			if not all(sim_checkpoint.same_results(a, b) for a, b in zip(stitched, whole)):
+				checkpoint.discard([key for *_, keys in split for key in keys])
+				raise RuntimeError(
+					f"Segments of {verify[0][0]}/{verify[0][1]} differ from a single run: engine {engine_version} doesn't expire orders "
+					"at their deadline or start batches at multiples of batch_dur_sec, run without checkpoint_dir"
+				)
+			checkpoint.save(verified_key, pd.DataFrame(), pd.DataFrame(), {"verified_segments": str(engine_version)})
+
+		results, meta = {}, {}
+		for pair, option, trades_mask, keys in outcomes:
+			segments = [checkpoint.load(key) for key in keys]
+			id = len(results)
+			results[id] = batch_auction.BatchAuctionResult(*(_concat_segments([segment[i] for segment in segments]) for i in range(2)))
+			meta[id] = (pair, option, trades_mask)
+		return results, meta
+
+	def _parse_exe_results(self, results, meta, token_to_symbol=None, **run_info) -> DynamicJobResults:
 		dyn_results = defaultdict(list)
 		for id, match_sim_result in results.items():
 			matches = match_sim_result.matches
@@ -647,8 +1132,10 @@ class MatchAnalysis:
 				print(f"No results for {pair}")
 				continue
 
-			matches_df = pd.DataFrame(list(map(lambda x: x.to_dict(), matches)))
-			expired_orders_df = pd.DataFrame(list(map(lambda x: x.to_dict(), expired_orders)))
+			matches_df = _records_df(matches)
+			expired_orders_df = _records_df(expired_orders)
+			if order_stream.SOURCE_COLUMN in self.trades_df.columns:
+				matches_df = order_stream.tag_matches(matches_df, self.trades_df[trades_mask])
 			matching_opt = MatchingOptions(
 				base_asset, 
 				quote_asset,
@@ -668,7 +1155,7 @@ class MatchAnalysis:
 			 )
 			dyn_results[id] = dyn_res
 
-		return DynamicJobResults(dyn_results)
+		return DynamicJobResults(dyn_results, **run_info)
 	
 	def _add_jobs(self, pool):
 		meta = defaultdict(dict)
@@ -684,27 +1171,61 @@ class MatchAnalysis:
 		return meta
 	
 	def trades_mask(self, base_asset: str, quote_asset: str) -> np.ndarray:
+		if self.pair_slices is not None:
+			mask = np.zeros(len(self.trades_df), dtype=bool)
+			mask[self.pair_slices.get(trade_partitions.canonical_pair(base_asset, quote_asset), slice(0, 0))] = True
+			return pd.Series(mask, index=self.trades_df.index)
 		traded_tokens = [base_asset, quote_asset]
 		return self.trades_df["token_bought_address"].isin(traded_tokens) & self.trades_df["token_sold_address"].isin(traded_tokens)
 
-	def _price_updates(self):
+	def _price_updates(self, epsilon: float = None, bucket_sec: int = None):
 		if self.price_provider is None:
 			return None
 		price_updates = defaultdict(lambda: defaultdict(list))
 		price_mask = self._price_mask()
-		for row in self.price_provider.df[price_mask].itertuples():
+		prices_df = self.price_provider.df[price_mask]
+		if epsilon or bucket_sec:
+			prices_df, self.price_compression = self.price_provider.compressed(price_mask, epsilon, bucket_sec)
+			print(self.price_compression)
+		for row in prices_df.itertuples():
 			price_updates[row.base_token][row.quote_token].append(ExtRefPriceUpdate(
 				price=row.price,
 				timestamp=row.block_time
 			))
 		return price_updates
 	
+	def _pair_price_updates(self, pair: tuple, epsilon: float = None, bucket_sec: int = None) -> pd.DataFrame:
+		# The pair's rows of `_price_updates` in time order
+		if self.price_provider is None:
+			return None
+		mask = self.price_provider.mask_for_pairs([pair])
+		prices_df = self.price_provider.compressed(mask, epsilon, bucket_sec)[0] if epsilon or bucket_sec else self.price_provider.df[mask]
+		return prices_df[["base_token", "quote_token", "block_time", "price"]].sort_values("block_time", kind="stable")
+
+	def _ref_prices(self, base_asset: str, quote_asset: str, epsilon: float = None, bucket_sec: int = None) -> pd.DataFrame:
+		# Reference prices in the base-quote direction, as the orderbook reports them
+		if self.price_provider is None:
+			return None
+		prices_df = self._pair_price_updates((base_asset, quote_asset), epsilon, bucket_sec)[["block_time", "price"]]
+		if self.price_provider.is_inversed(base_asset, quote_asset):
+			prices_df = prices_df.assign(price=1 / prices_df["price"])
+		return prices_df
+
 	def _price_mask(self):
 		pairs = {(job.base_asset, job.quote_asset) for job in self.jobs}
 		mask = self.price_provider.mask_for_pairs(pairs)
 		return mask
 
 
+def _records_df(records) -> pd.DataFrame:
+	# Engine results are lists of records, the batch engine and checkpoints give data frames
+	return records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(map(lambda x: x.to_dict(), records)))
+
+def _concat_segments(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+	# Segments without results are stored without columns
+	non_empty = [df for df in dfs if len(df) > 0]
+	return pd.concat(non_empty, ignore_index=True) if len(non_empty) > 0 else (dfs[0] if len(dfs) > 0 else pd.DataFrame())
+
 def into_trades(df: pd.DataFrame) -> List[Trade]:
 	return list(map(
         lambda x: Trade(*x),
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+
+import utils.price_path as price_path
+import utils.realized_vol as realized_vol
+
+
+ROUND_DEC = np.finfo(float).precision-1
+PRICE_TOLERANCE_SEC = 7200
+
+
+# Same output as `utils.matchings.enrich_matches`, built as a single lazy Polars plan collected once at the end
+def enrich_matches(
+		trades_df: pd.DataFrame,
+		matches_df: pd.DataFrame,
+		expired_df: pd.DataFrame,
+		options,
+		prices_df: pd.DataFrame = None,
+		inversed_prices: bool = None,
+		vol_df: pd.DataFrame = None
+	) -> pd.DataFrame:
+	base_asset = options.base_asset
+	quote_asset = options.quote_asset
+	time_limit = options.time_limit
+
+	trades = pl.from_pandas(trades_df).lazy()
+	matches = pl.from_pandas(matches_df[["bid_id", "ask_id", "amount", "price", "timestamp", "ext_ref_price"]]).lazy()
+
+	# Aggregate fills per trade id (each match contributes to its bid and its ask)
+	matches_grouped = matches \
+		.unpivot(index=["amount", "price", "timestamp", "ext_ref_price"], on=["bid_id", "ask_id"], variable_name="side", value_name="id") \
+		.sort("timestamp", maintain_order=True) \
+		.group_by("id") \
+		.agg(
+			matched_amount_base=pl.col("amount").sum(),
+			matched_amount_quote=(pl.col("amount") * pl.col("price")).sum(),
+			match_time_max=pl.col("timestamp").max(),
+			price_x_amount=(pl.col("ext_ref_price") * pl.col("amount")).sum(),
+			timestamp_x_amount=(pl.col("timestamp") * pl.col("amount")).sum(),
+			match_ex_ref_price_last=pl.col("ext_ref_price").drop_nulls().last(),
+			match_fills=pl.len(),
+		) \
+		.with_columns(
+			match_ext_ref_price_wmean=pl.col("price_x_amount") / pl.col("matched_amount_base"),
+			match_time_wmean=pl.col("timestamp_x_amount") / pl.col("matched_amount_base"),
+			is_matched=pl.lit(True),
+		)
+	# Cost metrics need market prices or reference prices recorded by the engine, as in the pandas version
+	with_costs = prices_df is not None or _has_ref_prices(matches_df)
+
+	expired = pl.from_pandas(expired_df).lazy() \
+		.rename({"ext_ref_price": "expiry_ext_ref_price"}) \
+		.with_columns(is_expired=pl.lit(True))
+
+	df = trades \
+		.join(matches_grouped, on="id", how="left", coalesce=True) \
+		.join(expired, on="id", how="left", coalesce=True) \
+		.with_columns(
+			pl.col("is_matched").fill_null(False),
+			pl.col("is_expired").fill_null(False),
+		)
+
+	is_ask = pl.col("is_ask")
+	sold, bought = pl.col("token_sold_amount"), pl.col("token_bought_amount")
+	price_org, price_matched = pl.col("price_org"), pl.col("price_matched")
+	price_realized, prop_matched = pl.col("price_realized"), pl.col("prop_matched")
+
+	df = df \
+		.with_columns(
+			wait_time_wmean=pl.col("match_time_wmean") - pl.col("block_time"),
+			wait_time_max=pl.col("match_time_max") - pl.col("block_time"),
+			is_ask=pl.col("token_sold_address") == base_asset,
+		) \
+		.with_columns(
+			prop_matched=_fill_nan(
+				pl.when(is_ask).then(pl.col("matched_amount_base") / sold).otherwise(pl.col("matched_amount_quote") / sold).round(ROUND_DEC),
+				0
+			),
+			price_org=pl.when(is_ask).then(bought / sold).otherwise(sold / bought),
+			price_matched=_fill_nan(pl.col("matched_amount_quote") / pl.col("matched_amount_base"), 0),
+		) \
+		.with_columns(
+			price_realized=prop_matched * (price_matched - price_org) + price_org,
+		) \
+		.with_columns(
+			price_improvement=pl.when(is_ask).then((price_realized - price_org) / price_org).otherwise((price_org - price_realized) / price_org).round(ROUND_DEC),
+			gross_pi=pl.when(is_ask).then((price_matched - price_org) / price_org).otherwise((price_org - price_matched) / price_org),
+		)
+
+	if prices_df is not None:
+		if time_limit is not None:
+			df = df.with_columns(pl.col("match_time_max").fill_null(pl.col("block_time") + time_limit))
+		df = df.with_columns(pl.col("match_time_max").cast(pl.Int64)).sort("match_time_max")
+
+		prices = pl.from_pandas(prices_df).lazy() \
+			.rename({"price": "end_mkt_price", "block_time": "block_time_y"}) \
+			.with_columns(pl.col("block_time_y").cast(pl.Int64)) \
+			.sort("block_time_y")
+		df = df.join_asof(
+			prices,
+			left_on="match_time_max",
+			right_on="block_time_y",
+			by="pair",
+			strategy="forward",
+			tolerance=PRICE_TOLERANCE_SEC,
+			coalesce=False,
+			suffix="_y",
+			check_sortedness=False,
+		)
+
+		# Turn all market prices in the direction of the base-quote pair
+		if _rev_market_direction(prices_df["base_token"], prices_df["quote_token"], base_asset, quote_asset):
+			df = _inverse_prices(df, ["end_mkt_price", "creation_price", "market_price_rel_offset"])
+	elif with_costs:
+		# match_ext_ref_price_wmean (and end_mkt_price) is already in the direction of the base-quote pair
+		df = df.with_columns(
+			end_mkt_price=(
+				prop_matched * pl.col("match_ext_ref_price_wmean").fill_null(0)
+				+ (1 - prop_matched) * pl.col("expiry_ext_ref_price").fill_null(pl.col("match_ex_ref_price_last"))
+			)
+		)
+		# "creation_price", "market_price_rel_offset" might be in different direction
+		assert inversed_prices is not None
+		if inversed_prices:
+			df = _inverse_prices(df, ["creation_price", "market_price_rel_offset"])
+
+	if with_costs:
+		end_mkt_price = pl.col("end_mkt_price")
+		effective_expiry_market_price = pl.col("effective_expiry_market_price")
+		price_realized_with_cost = pl.col("price_realized_with_cost")
+		df = df \
+			.with_columns(effective_expiry_market_price=end_mkt_price * pl.col("market_price_rel_offset")) \
+			.with_columns(price_realized_with_cost=(price_matched - effective_expiry_market_price) * prop_matched + effective_expiry_market_price) \
+			.with_columns(
+				price_improvement_with_cost=pl.when(is_ask).then(price_realized_with_cost / price_org - 1).otherwise(1 - price_realized_with_cost / price_org).round(ROUND_DEC),
+				effective_price_improvement=pl.when(is_ask).then(price_realized_with_cost / effective_expiry_market_price - 1).otherwise(1 - price_realized_with_cost / effective_expiry_market_price).round(ROUND_DEC),
+				wait_cost=pl.when(is_ask).then(1 - end_mkt_price / pl.col("creation_price")).otherwise(end_mkt_price / pl.col("creation_price") - 1),
+			)
+	else:
+		df = df.with_columns(
+			pl.lit(np.nan).alias(c) for c in ["price_improvement_with_cost", "effective_price_improvement", "wait_cost"]
+		)
+
+	if prices_df is not None:
+		# Market path over each trade's waiting window
+		path_index = price_path.PricePathIndex(prices_df, inverse=_rev_market_direction(prices_df["base_token"], prices_df["quote_token"], base_asset, quote_asset))
+		df = df.with_columns(
+			pl.struct("pair", "is_ask", "block_time", "match_time_max")
+				.map_batches(lambda s: _wait_metrics(path_index, s, time_limit), return_dtype=pl.Struct({c: pl.Float64 for c in price_path.WAIT_COLUMNS}), is_elementwise=True)
+				.alias("wait_metrics")
+		).unnest("wait_metrics")
+
+	if vol_df is not None:
+		# Volatility known when each trade was created, as in `realized_vol.join_volatility`
+		vol_index = realized_vol.VolatilityIndex(vol_df)
+		df = df.with_columns(
+			pl.struct("pair", "block_time")
+				.map_batches(lambda s: _volatility(vol_index, s, base_asset), return_dtype=pl.Struct({c: pl.Float64 for c in vol_index.columns}), is_elementwise=True)
+				.alias("volatility")
+		).unnest("volatility")
+
+	out = df.collect().to_pandas()
+
+	if prices_df is not None:
+		na_market_price = out["end_mkt_price"].isna()
+		assert not na_market_price.any(), f"end_mkt_price is null for {sum(na_market_price)/len(out):.2%} rows"
+
+	if out["prop_matched"].max() > 1:
+		misfits = out[out["prop_matched"] > 1]
+		raise ValueError(f"prop_matched > 1 for {len(misfits)} rows")
+	if out["price_improvement"].min() < 0:
+		misfits = out[out["price_improvement"] < 0]
+		raise ValueError(f"price_improvement < 0 for {len(misfits)} rows")
+
+	return out
+
+def _has_ref_prices(matches_df: pd.DataFrame) -> bool:
+	# Reference prices are positive, so the summed `match_ext_ref_price_wmean` is non-zero as soon as one fill has both
+	ext_ref_price = np.nan_to_num(matches_df["ext_ref_price"].to_numpy(dtype=float))
+	return bool((ext_ref_price * matches_df["amount"].to_numpy(dtype=float) != 0).any())
+
+def _wait_metrics(path_index: price_path.PricePathIndex, s: pl.Series, time_limit) -> pl.Series:
+	match_time_max = s.struct.field("match_time_max")
+	if time_limit is None:
+		assert match_time_max.null_count() == 0, "match_time_max is null"
+	metrics = price_path.wait_window_metrics(
+		path_index,
+		s.struct.field("pair").to_numpy(),
+		s.struct.field("is_ask").to_numpy().astype(bool),
+		s.struct.field("block_time").to_numpy().astype(np.int64),
+		match_time_max.to_numpy().astype(np.int64)
+	)
+	return pl.DataFrame(metrics).to_struct(s.name)
+
+def _volatility(vol_index: realized_vol.VolatilityIndex, s: pl.Series, base_asset) -> pl.Series:
+	key = s.struct.field("pair").to_numpy() if vol_index.by == "pair" else np.full(len(s), base_asset, dtype=object)
+	columns = vol_index.asof(key, s.struct.field("block_time").to_numpy().astype(np.int64))
+	return pl.DataFrame(columns, schema={c: pl.Float64 for c in vol_index.columns}).to_struct(s.name)
+
+def _fill_nan(expr: pl.Expr, value) -> pl.Expr:
+	# pandas `fillna` covers both missing rows and 0/0
+	return expr.fill_nan(value).fill_null(value)
+
+def _inverse_prices(df: pl.LazyFrame, columns) -> pl.LazyFrame:
+	return df.with_columns((1 / pl.col(c)).alias(c) for c in columns)
+
+def _rev_market_direction(base_s, quote_s, base_asset, quote_asset):
+	if ((base_s == base_asset) & (quote_s == quote_asset)).all():
+		return False
+	elif ((base_s == quote_asset) & (quote_s == base_asset)).all():
+		return True
+	else:
+		raise Exception(f"Invalid pair")
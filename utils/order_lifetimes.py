@@ -0,0 +1,135 @@
+from typing import Optional
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pj
+
+
+FUSION_BLOCK_SIZE = 16 << 20
+
+# Fields of the Fusion websocket `order_created` event; everything else in the line is skipped by the parser
+FUSION_ORDER_SCHEMA = pa.schema([
+    ("event", pa.string()),
+    ("result", pa.struct([
+        ("orderHash", pa.string()),
+        ("auctionStartDate", pa.string()),
+        ("deadline", pa.string()),
+    ])),
+])
+FUSION_CREATED_EVENT = "order_created"
+
+LIFETIME_COLUMNS = ["order_id", "created_at", "valid_to", "exact_out"]
+
+
+def cowswap_order_lifetimes(orders_df: pd.DataFrame) -> pd.DataFrame:
+    # Orders are re-seen in every batch until settled or expired, keep the widest lifetime per uid
+    lifetimes = orders_df.groupby("uid", sort=False).agg(
+        created_at=("created_at", "min"),
+        valid_to=("valid_to", "max"),
+        kind=("kind", "first"),
+    ).reset_index()
+    return pd.DataFrame({
+        "order_id": lifetimes["uid"].str.lower().to_numpy(),
+        "created_at": lifetimes["created_at"].to_numpy(dtype=np.int64),
+        "valid_to": lifetimes["valid_to"].to_numpy(dtype=np.int64),
+        "exact_out": (lifetimes["kind"] == "buy").to_numpy(),
+    })
+
+def fusion_order_lifetimes(path: str, block_size: int = FUSION_BLOCK_SIZE) -> pd.DataFrame:
+    # Streams the jsonl in blocks; each block is parsed by Arrow's multithreaded JSON reader
+    reader = pj.open_json(
+        path,
+        read_options=pj.ReadOptions(use_threads=True, block_size=block_size),
+        parse_options=pj.ParseOptions(
+            explicit_schema=FUSION_ORDER_SCHEMA,
+            unexpected_field_behavior="ignore",
+            newlines_in_values=False,
+        ),
+    )
+    chunks = []
+    for batch in reader:
+        batch = pa.Table.from_batches([batch])
+        batch = batch.filter(pc.equal(batch["event"], FUSION_CREATED_EVENT)).flatten()
+        if batch.num_rows == 0:
+            continue
+        chunks.append(pd.DataFrame({
+            "order_id": pc.utf8_lower(batch["result.orderHash"]).to_numpy(zero_copy_only=False),
+            "created_at": parse_timestamps(batch["result.auctionStartDate"]),
+            "valid_to": parse_timestamps(batch["result.deadline"]),
+        }))
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=LIFETIME_COLUMNS)
+
+    lifetimes = pd.concat(chunks, ignore_index=True)
+    lifetimes = lifetimes.groupby("order_id", sort=False).agg(
+        created_at=("created_at", "min"),
+        valid_to=("valid_to", "max"),
+    ).reset_index()
+    # Fusion orders are always exact-in
+    lifetimes["exact_out"] = False
+    return lifetimes
+
+def attach_max_match_time(
+        trades_df: pd.DataFrame,
+        lifetimes_df: pd.DataFrame,
+        relative_to_fill: bool = True,
+        max_lifetime: Optional[int] = None,
+        id_col: str = "order_id"
+    ) -> pd.DataFrame:
+    # Hash join of fills on order id
+    index = pd.Index(lifetimes_df["order_id"].to_numpy())
+    if not index.is_unique:
+        raise ValueError("Order lifetimes must be unique per order id")
+    pos = index.get_indexer(trades_df[id_col].str.lower().to_numpy())
+    found = pos >= 0
+    pos = np.where(found, pos, 0)
+
+    created_at = lifetimes_df["created_at"].to_numpy(dtype=float)[pos]
+    valid_to = lifetimes_df["valid_to"].to_numpy(dtype=float)[pos]
+    block_time = trades_df["block_time"].to_numpy(dtype=float)
+
+    if relative_to_fill:
+        # Fills become intents at their block time, so give them the lifetime the original order had
+        lifetime = valid_to - created_at
+        if max_lifetime is not None:
+            lifetime = np.minimum(lifetime, max_lifetime)
+        max_match_time = block_time + np.maximum(lifetime, 0)
+    else:
+        max_match_time = np.maximum(valid_to, block_time)
+        if max_lifetime is not None:
+            max_match_time = np.minimum(max_match_time, block_time + max_lifetime)
+
+    valid = found & np.isfinite(max_match_time)
+    out = trades_df.copy()
+    out["max_match_time"] = pd.arrays.IntegerArray(np.where(valid, max_match_time, 0).astype(np.int64), ~valid)
+    if "exact_out" in lifetimes_df.columns:
+        exact_out = lifetimes_df["exact_out"].to_numpy(dtype=bool)[pos]
+        prev = out["exact_out"].to_numpy(dtype=bool) if "exact_out" in out.columns else np.zeros(len(out), dtype=bool)
+        out["exact_out"] = np.where(found, exact_out, prev)
+
+    print(f"Matched lifetimes for {found.sum()}/{len(found)} fills")
+    return out
+
+def parse_timestamps(values: pa.Array) -> np.ndarray:
+    # Timestamps come either as unix seconds/milliseconds or as ISO-8601 strings
+    values = values.to_pandas()
+    numeric = pd.to_numeric(values, errors="coerce")
+    out = numeric.to_numpy(dtype=float)
+    out = np.where(out > 1e11, out / 1000, out)
+
+    is_text = numeric.isna() & values.notna()
+    if is_text.any():
+        ts = pd.to_datetime(values[is_text], utc=True, errors="coerce")
+        out[is_text.to_numpy()] = ((ts - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+    return out
+
+def load_lifetimes(cowswap_orders_paths=(), fusion_orders_paths=()) -> pd.DataFrame:
+    frames = [cowswap_order_lifetimes(pd.read_parquet(p)) for p in cowswap_orders_paths if os.path.exists(p)]
+    frames += [fusion_order_lifetimes(p) for p in fusion_orders_paths if os.path.exists(p)]
+    if len(frames) == 0:
+        return pd.DataFrame(columns=LIFETIME_COLUMNS)
+    lifetimes = pd.concat(frames, ignore_index=True)
+    return lifetimes.drop_duplicates("order_id", keep="first")
@@ -0,0 +1,122 @@
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import utils.intent_trades as intent_trades
+
+
+SOURCE_COLUMN = "source"
+DEX_SOURCE = "dex"
+CHUNK_SIZE = intent_trades.CHUNK_SIZE
+
+
+# DEX trades (`data/trades`) in file order, tagged with their venue
+def iter_trades(
+        paths: List[str],
+        source: str = DEX_SOURCE,
+        tokens: Optional[List[str]] = None,
+        chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+    token_set = [t.lower() for t in tokens] if tokens is not None else None
+    for path in paths:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            if token_set is not None:
+                df = df[df["token_sold_address"].str.lower().isin(token_set) & df["token_bought_address"].str.lower().isin(token_set)]
+            if len(df) == 0:
+                continue
+            if SOURCE_COLUMN not in df.columns:
+                df[SOURCE_COLUMN] = source
+            yield df.reset_index(drop=True)
+
+# One chunked reader per source: fill sources from `intent_trades.FILL_SOURCES`, anything else is read as DEX trades
+def source_readers(
+        sources: Dict[str, List[str]],
+        chain: str = "ethereum",
+        tokens: Optional[List[str]] = None,
+        daily_prices_df: Optional[pd.DataFrame] = None,
+        chunk_size: int = CHUNK_SIZE
+    ) -> Dict[str, Iterator[pd.DataFrame]]:
+    pricer = intent_trades.UsdPricer(daily_prices_df) if daily_prices_df is not None else None
+    readers = {}
+    for name, paths in sources.items():
+        if name in intent_trades.FILL_SOURCES:
+            readers[name] = intent_trades.iter_fill_trades(paths, name, chain, tokens, pricer, chunk_size)
+        else:
+            readers[name] = iter_trades(paths, name, tokens, chunk_size)
+    return readers
+
+# K-way merge of readers that are each sorted by `block_time`, yielding chunks in global time order.
+# Rows up to the smallest last buffered time of the unfinished sources are final (no source can still
+# produce an earlier row), so at most one chunk per source is held at a time. Ties keep the readers' order.
+def merge_sorted(readers: Dict[str, Iterator[pd.DataFrame]], chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    pending = {name: None for name in readers}
+    last_time = {name: None for name in readers}
+    live = list(readers)
+
+    while True:
+        for name in list(live):
+            while pending[name] is None or len(pending[name]) == 0:
+                chunk = next(readers[name], None)
+                if chunk is None:
+                    live.remove(name)
+                    break
+                pending[name] = _checked_chunk(name, chunk, last_time)
+        buffered = [name for name in readers if pending[name] is not None and len(pending[name]) > 0]
+        if len(buffered) == 0:
+            return
+
+        watermark = min((pending[name]["block_time"].iloc[-1] for name in live), default=np.inf)
+        parts = []
+        for name in buffered:
+            df = pending[name]
+            n = np.searchsorted(df["block_time"].to_numpy(), watermark, side="right")
+            parts.append(df.iloc[:n])
+            pending[name] = df.iloc[n:]
+        merged = pd.concat(parts, ignore_index=True).sort_values("block_time", kind="stable", ignore_index=True)
+        for start in range(0, len(merged), chunk_size):
+            yield merged.iloc[start:start + chunk_size].reset_index(drop=True)
+
+def load_merged(
+        sources: Dict[str, List[str]],
+        chain: str = "ethereum",
+        tokens: Optional[List[str]] = None,
+        daily_prices_df: Optional[pd.DataFrame] = None,
+        chunk_size: int = CHUNK_SIZE
+    ) -> pd.DataFrame:
+    chunks = list(merge_sorted(source_readers(sources, chain, tokens, daily_prices_df, chunk_size), chunk_size))
+    if len(chunks) == 0:
+        return pd.DataFrame(columns=intent_trades.TRADE_COLUMNS)
+    df = pd.concat(chunks, ignore_index=True)
+    check_ids(df)
+    return df
+
+# Matches only carry order ids, so an id used by more than one venue can't be attributed (nor told apart by the engine)
+def check_ids(trades_df: pd.DataFrame):
+    sources = trades_df.groupby("id")[SOURCE_COLUMN].nunique()
+    ambiguous = sources.index[sources > 1]
+    if len(ambiguous) > 0:
+        raise ValueError(f"{len(ambiguous)} ids occur in more than one source, eg. {list(ambiguous[:3])}")
+
+# Venue of the bid and the ask of every match
+def tag_matches(matches_df: pd.DataFrame, trades_df: pd.DataFrame) -> pd.DataFrame:
+    check_ids(trades_df)
+    venue = trades_df.drop_duplicates("id").set_index("id")[SOURCE_COLUMN]
+    return matches_df.assign(bid_source=matches_df["bid_id"].map(venue), ask_source=matches_df["ask_id"].map(venue))
+
+def venue_stats(matches_df: pd.DataFrame) -> pd.DataFrame:
+    return matches_df.assign(amount_quote=matches_df["amount"] * matches_df["price"]) \
+        .groupby(["bid_source", "ask_source"], as_index=False, dropna=False) \
+        .agg(matches=("amount", "size"), amount=("amount", "sum"), amount_quote=("amount_quote", "sum"))
+
+
+def _checked_chunk(name: str, chunk: pd.DataFrame, last_time: Dict[str, int]) -> pd.DataFrame:
+    if len(chunk) == 0:
+        return chunk
+    block_time = chunk["block_time"].to_numpy()
+    if (len(block_time) > 1 and (np.diff(block_time) < 0).any()) or (last_time[name] is not None and block_time[0] < last_time[name]):
+        raise ValueError(f"Source {name} is not sorted by block_time")
+    last_time[name] = block_time[-1]
+    return chunk
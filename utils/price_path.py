@@ -0,0 +1,95 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+
+WAIT_COLUMNS = ["wait_start_mkt_price", "wait_twap_mkt_price", "wait_adverse_drift", "wait_max_adverse_excursion"]
+
+
+# Market price path of every pair as a step function (each price holds until the pair's next one),
+# indexed for O(1) window queries: prefix sums of price * duration for time-weighted means
+# and sparse tables for range min / max. Building it is O(n log n) in the number of price rows.
+class PricePathIndex:
+
+    def __init__(self, prices_df: pd.DataFrame, inverse: bool = False):
+        df = prices_df.sort_values(["pair", "block_time"], kind="stable")
+        codes, self.pairs = pd.factorize(df["pair"], sort=True)
+        self.times = df["block_time"].to_numpy(dtype=np.int64)
+        self.prices = df["price"].to_numpy(dtype=float)
+        if inverse:
+            self.prices = 1 / self.prices
+        # Pair code in the high bits, so one search finds a time within its pair
+        self.keys = (codes.astype(np.int64) << 32) | self.times
+        self.pair_first = np.searchsorted(codes, np.arange(len(self.pairs)), side="left")
+
+        # Integral of the price from the pair's first row up to each row; the last row of a pair adds nothing
+        same_pair = np.concatenate([codes[1:] == codes[:-1], [False]])
+        duration = np.where(same_pair, np.diff(self.times, append=0), 0)
+        # Summed per pair so a pair's integrals don't carry the (possibly far larger) areas of the pairs before it
+        cum_area = pd.Series(self.prices * duration).groupby(codes).cumsum().to_numpy()
+        self.area = np.concatenate([[0.0], cum_area[:-1]])
+        self.area[self.pair_first[self.pair_first < len(self.area)]] = 0.0
+
+        self.min_table = _sparse_table(self.prices, np.minimum)
+        self.max_table = _sparse_table(self.prices, np.maximum)
+
+    def window(self, pair, start, end) -> Dict[str, np.ndarray]:
+        # Price at `start`, time-weighted mean, min and max price over [start, end] per query.
+        # Windows starting before a pair's first price start at it; NaN without any price in the window.
+        code = self.pairs.get_indexer(np.asarray(pair, dtype=object))
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        known = code >= 0
+        code = np.where(known, code, 0).astype(np.int64)
+
+        first = self.pair_first[code]
+        i = np.maximum(np.searchsorted(self.keys, (code << 32) | start, side="right") - 1, first)
+        j = np.searchsorted(self.keys, (code << 32) | end, side="right") - 1
+        start = np.maximum(start, self.times[first])
+        valid = known & (j >= first) & (end >= start)
+        i, j = np.where(valid, i, 0), np.where(valid, np.maximum(j, i), 0)
+
+        integral = (self.area[j] + self.prices[j] * (end - self.times[j])) - (self.area[i] + self.prices[i] * (start - self.times[i]))
+        length = end - start
+        with np.errstate(divide="ignore", invalid="ignore"):
+            twap = np.where(length > 0, integral / length, self.prices[i])
+        nan = np.full(len(code), np.nan)
+        return {
+            "start": np.where(valid, self.prices[i], nan),
+            "twap": np.where(valid, twap, nan),
+            "min": np.where(valid, _range_query(self.min_table, np.minimum, i, j), nan),
+            "max": np.where(valid, _range_query(self.max_table, np.maximum, i, j), nan),
+        }
+
+
+# Adverse drift and excursion of the market while each trade waits, relative to the price at creation.
+# Positive is adverse: a falling price for asks (sellers of base), a rising one for bids.
+def wait_window_metrics(index: PricePathIndex, pair, is_ask: np.ndarray, start, end) -> Dict[str, np.ndarray]:
+    w = index.window(pair, start, end)
+    return {
+        "wait_start_mkt_price": w["start"],
+        "wait_twap_mkt_price": w["twap"],
+        "wait_adverse_drift": np.where(is_ask, 1 - w["twap"] / w["start"], w["twap"] / w["start"] - 1),
+        "wait_max_adverse_excursion": np.where(is_ask, 1 - w["min"] / w["start"], w["max"] / w["start"] - 1),
+    }
+
+
+def _sparse_table(values: np.ndarray, op) -> np.ndarray:
+    # Row k holds op over values[i:i + 2**k]; entries too close to the end keep the shorter range, they are never queried
+    levels = max(int(np.log2(len(values))) + 1, 1) if len(values) else 1
+    table = np.empty((levels, len(values)))
+    if len(values) == 0:
+        return table
+    table[0] = values
+    for k in range(1, levels):
+        half = 1 << (k - 1)
+        table[k] = table[k - 1]
+        op(table[k - 1][:-half], table[k - 1][half:], out=table[k][:-half])
+    return table
+
+def _range_query(table: np.ndarray, op, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    if table.shape[1] == 0:
+        return np.full(len(i), np.nan)
+    k = np.floor(np.log2(j - i + 1)).astype(np.int64)
+    return op(table[k, i], table[k, j - (1 << k) + 1])
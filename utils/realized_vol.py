@@ -0,0 +1,139 @@
+from typing import Dict, Sequence
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.amounts import PRICE_PRECISION
+
+
+# Returns are sampled per minute, as in intraday_varience.dune.sql
+SAMPLE_SEC = 60
+WINDOWS_SEC = [300, 3600, 86400]
+KEYS = ["pair", "token"]
+VOLATILITY_DIR = "data/volatility/local"
+
+
+def variance_column(window_sec: int) -> str:
+    return f"realized_variance_{window_sec}s"
+
+
+# Rolling realized variance (sum of squared log returns) from block prices, per pair or per token.
+# Prices are sampled as the last one per `sample_sec`; every sample gets the sum over the
+# trailing `window_sec` of each window, so the series can be joined backwards as of any time.
+def realized_variance(
+        prices_df: pd.DataFrame,
+        windows_sec: Sequence[int] = WINDOWS_SEC,
+        sample_sec: int = SAMPLE_SEC,
+        by: str = "pair"
+    ) -> pd.DataFrame:
+    if by not in KEYS:
+        raise ValueError(f"Unknown volatility key: {by!r}")
+    df = prices_df if by == "pair" else _token_prices(prices_df)
+
+    sampled = df.assign(sample=df["block_time"].to_numpy(dtype=np.int64) // sample_sec) \
+        .sort_values([by, "block_time"], kind="stable") \
+        .groupby([by, "sample"], as_index=False, sort=True) \
+        .agg(block_time=("block_time", "last"), price=("price", "last"))
+    codes, _ = pd.factorize(sampled[by], sort=True)
+    block_time = sampled["block_time"].to_numpy(dtype=np.int64)
+
+    # Squared log return to each sample from the previous one of the same key (the first has none)
+    log_price = np.log(sampled["price"].to_numpy(dtype=float))
+    same_key = np.concatenate([[False], codes[1:] == codes[:-1]])
+    sq_returns = np.where(same_key, np.diff(log_price, prepend=np.nan) ** 2, 0.0)
+    cum = np.concatenate([[0.0], np.cumsum(sq_returns)])
+    cum_n = np.concatenate([[0], np.cumsum(same_key)])
+
+    keys = (codes.astype(np.int64) << 32) | block_time
+    out = sampled[[by, "block_time"]].copy()
+    end = np.arange(len(sampled)) + 1
+    for window_sec in windows_sec:
+        start = np.searchsorted(keys, (codes.astype(np.int64) << 32) | (block_time - window_sec), side="right")
+        # The first return in the window needs its previous sample to be in it as well
+        start = np.minimum(start + 1, end)
+        out[variance_column(window_sec)] = cum[end] - cum[start]
+        out[f"{variance_column(window_sec)}_n"] = cum_n[end] - cum_n[start]
+    return out.reset_index(drop=True)
+
+# Realized variance series indexed by key and time for backward as-of lookups, without reordering the queries
+class VolatilityIndex:
+
+    def __init__(self, vol_df: pd.DataFrame):
+        self.by = "pair" if "pair" in vol_df.columns else "token"
+        df = vol_df.sort_values([self.by, "block_time"], kind="stable")
+        codes, self.values = pd.factorize(df[self.by], sort=True)
+        self.keys = (codes.astype(np.int64) << 32) | df["block_time"].to_numpy(dtype=np.int64)
+        self.codes = codes
+        self.columns = {c: df[c].to_numpy() for c in df.columns if c.startswith("realized_variance_")}
+
+    def asof(self, key, times) -> Dict[str, np.ndarray]:
+        code = self.values.get_indexer(np.asarray(key, dtype=object)).astype(np.int64)
+        times = np.asarray(times, dtype=np.int64)
+        pos = np.searchsorted(self.keys, (np.maximum(code, 0) << 32) | times, side="right") - 1
+        found = (code >= 0) & (pos >= 0) & (self.codes[np.maximum(pos, 0)] == code)
+        pos = np.maximum(pos, 0)
+        return {c: np.where(found, v[pos].astype(float), np.nan) for c, v in self.columns.items()}
+
+# Volatility known when each trade was created, by the trade's pair or the job's base token
+def join_volatility(df: pd.DataFrame, vol_df: pd.DataFrame, base_asset: str) -> pd.DataFrame:
+    index = VolatilityIndex(vol_df)
+    key = df["pair"].to_numpy() if index.by == "pair" else np.full(len(df), base_asset, dtype=object)
+    for col, values in index.asof(key, df["block_time"].to_numpy(dtype=np.int64)).items():
+        df[col] = values
+    return df
+
+
+def _token_prices(prices_df: pd.DataFrame) -> pd.DataFrame:
+    # Squared log returns are the same for a price and its inverse, so a pair's series serves both of its tokens.
+    # Every token uses its pair with the most price rows.
+    counts = pd.concat([
+        prices_df.groupby(["base_token", "quote_token"]).size().rename_axis(["token", "other"]).reset_index(name="n"),
+        prices_df.groupby(["quote_token", "base_token"]).size().rename_axis(["token", "other"]).reset_index(name="n"),
+    ])
+    best = counts.sort_values(["token", "n"], ascending=[True, False], kind="stable").drop_duplicates("token")
+    as_base = prices_df.merge(best.rename(columns={"token": "base_token", "other": "quote_token"}), on=["base_token", "quote_token"])
+    as_quote = prices_df.merge(best.rename(columns={"token": "quote_token", "other": "base_token"}), on=["base_token", "quote_token"])
+    return pd.concat([
+        as_base.assign(token=as_base["base_token"]),
+        as_quote.assign(token=as_quote["quote_token"]),
+    ], ignore_index=True)[["token", "block_time", "price"]]
+
+def _read_block_prices(path: str) -> pd.DataFrame:
+    # Raw block pool prices: `block_timestamp` and fixed-point string prices scaled by `precision` in metadata.json
+    df = pd.read_parquet(path)
+    if "block_timestamp" in df.columns:
+        df = df.rename(columns={"block_timestamp": "block_time"})
+    if not pd.api.types.is_float_dtype(df["price"]):
+        metadata_path = os.path.join(os.path.dirname(path), "metadata.json")
+        precision = PRICE_PRECISION
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                precision = json.load(f).get("precision", PRICE_PRECISION)
+        df["price"] = df["price"].astype(float) / 10 ** precision
+    if "pair" not in df.columns:
+        df["pair"] = df["base_token"] + "_" + df["quote_token"]
+    return df
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compute rolling realized variance from block prices")
+    parser.add_argument("--prices", required=True, help="Block prices parquet file")
+    parser.add_argument("--windows", type=int, nargs="+", default=WINDOWS_SEC, help="Rolling windows in seconds")
+    parser.add_argument("--sample-sec", type=int, default=SAMPLE_SEC, help="Return sampling interval in seconds")
+    parser.add_argument("--by", choices=KEYS, default="pair", help="Series per pair or per token")
+    parser.add_argument("--out-dir", default=VOLATILITY_DIR, help="Output directory")
+    parser.add_argument("--label", required=True, help="Label for the output directory")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    vol_df = realized_variance(_read_block_prices(args.prices), args.windows, args.sample_sec, args.by)
+    out_dir = os.path.join(args.out_dir, args.label)
+    os.makedirs(out_dir, exist_ok=True)
+    vol_df.to_parquet(os.path.join(out_dir, "data.parquet"), index=False)
+    with open(os.path.join(out_dir, "metadata.json"), "w") as f:
+        json.dump({"prices": args.prices, "windows_sec": args.windows, "sample_sec": args.sample_sec, "by": args.by}, f, indent=2)
+    print(f"Wrote {len(vol_df)} samples for {vol_df[args.by].nunique()} {args.by}s to {out_dir}")
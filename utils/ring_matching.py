@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Dict, List
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+MAX_RING_LENGTH = 4
+WINDOW_SEC = 12
+RING_COLUMNS = ["ring_id", "timestamp", "length", "tokens", "surplus", "volume"]
+LEG_COLUMNS = ["ring_id", "id", "token_sold_address", "token_bought_address", "amount_sold", "amount_bought"]
+
+
+@dataclass
+class RingMatchResult:
+    # One row per ring: `length` 2 are pairwise CoWs, `surplus` is relative (product of limit rates - 1),
+    # `volume` is sold by the first leg, in the first token of `tokens`
+    rings: pd.DataFrame
+    # One row per order and ring, amounts at the order's limit price
+    legs: pd.DataFrame
+
+
+# Directed token cycles of every length up to `max_length`, each listed once (starting at its smallest token).
+# An order selling token i for token j is the edge i -> j.
+def token_cycles(n_tokens: int, max_length: int = MAX_RING_LENGTH) -> Dict[int, np.ndarray]:
+    cycles = {}
+    for length in range(2, max_length + 1):
+        rows = [
+            (first,) + rest
+            for first in range(n_tokens)
+            for rest in itertools.permutations(range(first + 1, n_tokens), length - 1)
+        ]
+        cycles[length] = np.array(rows, dtype=np.int64).reshape(-1, length)
+    return cycles
+
+
+# Coincidences of wants closing through up to `max_length` tokens, eg. WETH -> USDC -> WBTC -> WETH.
+# Orders are open from their `block_time` for `time_limit` seconds and rings are cleared at the end of every
+# `window_sec` window. A ring is feasible when the product of its orders' limit rates (sold / bought) is >= 1.
+# Only the best rate per directed token edge matters, so the graph is a dense n x n matrix of log rates and every
+# cycle's score is a gather + sum. Between windows scores only rise on edges that got new orders, so each
+# window only scores the cycles through those edges. Rings are taken greedily by surplus until none is left.
+def find_rings(
+        trades_df: pd.DataFrame,
+        time_limit: int,
+        window_sec: int = WINDOW_SEC,
+        max_length: int = MAX_RING_LENGTH,
+        tokens: List[str] = None,
+        min_surplus: float = 0.0
+    ) -> RingMatchResult:
+    if max_length < 2:
+        raise ValueError("Rings need max_length >= 2")
+    df = trades_df.sort_values("block_time", kind="stable")
+    token_index = pd.Index(sorted(set(tokens) if tokens is not None else set(df["token_sold_address"]) | set(df["token_bought_address"])))
+    n = len(token_index)
+    token_names = token_index.to_numpy(dtype=object)
+    sold_token = token_index.get_indexer(df["token_sold_address"])
+    bought_token = token_index.get_indexer(df["token_bought_address"])
+    sold = df["token_sold_amount"].to_numpy(dtype=float)
+    bought = df["token_bought_amount"].to_numpy(dtype=float)
+    valid = (sold_token >= 0) & (bought_token >= 0) & (sold_token != bought_token) & (sold > 0) & (bought > 0)
+
+    ids = df["id"].to_numpy(dtype=object)[valid]
+    start = df["block_time"].to_numpy(dtype=np.int64)[valid]
+    sold, bought = sold[valid], bought[valid]
+    edge = sold_token[valid] * n + bought_token[valid]
+    log_rate = np.log(sold / bought)
+    remaining = sold.copy()
+
+    cycles = token_cycles(n, max_length)
+    cycle_edges = {length: c * n + np.roll(c, -1, axis=1) for length, c in cycles.items()}
+    edge_cycles = {length: _cycles_by_edge(e, n * n) for length, e in cycle_edges.items()}
+    threshold = np.log1p(min_surplus)
+
+    rings, legs = [], []
+    for window in np.unique(start // window_sec):
+        window_start, window_end = window * window_sec, (window + 1) * window_sec
+        lo = np.searchsorted(start, window_end - time_limit, side="left")
+        first_new = np.searchsorted(start, window_start, side="left")
+        hi = np.searchsorted(start, window_end, side="left")
+        new_edges = np.unique(edge[first_new:hi])
+        # A cycle through several new edges is listed more than once, harmless for the argmax
+        candidates = {
+            length: np.concatenate([by_edge[e] for e in new_edges])
+            for length, by_edge in edge_cycles.items()
+        }
+
+        while True:
+            active = lo + np.flatnonzero(remaining[lo:hi] > 1e-12 * sold[lo:hi])
+            if len(active) < 2:
+                break
+            best = np.full(n * n, -np.inf)
+            np.maximum.at(best, edge[active], log_rate[active])
+
+            # Best scoring candidate cycle of any length
+            found = None
+            for length, cand in candidates.items():
+                if len(cand) == 0:
+                    continue
+                score = best[cycle_edges[length][cand]].sum(axis=1)
+                i = np.argmax(score)
+                if score[i] >= threshold and (found is None or score[i] > found[1]):
+                    found = (cycle_edges[length][cand[i]], score[i])
+            if found is None:
+                break
+
+            ring_edges, score = found
+            # Earliest order with the best rate on every edge
+            orders = np.array([active[np.flatnonzero((edge[active] == e) & (log_rate[active] == best[e]))[0]] for e in ring_edges])
+            # Leg i sells what leg i - 1 buys at its limit; the smallest order (scaled along the ring) sets the volume
+            scale = np.concatenate([[1.0], np.cumprod(bought[orders] / sold[orders])[:-1]])
+            volume = np.min(remaining[orders] / scale)
+            fills = volume * scale
+            remaining[orders] -= fills
+            remaining[orders[remaining[orders] < 1e-12 * sold[orders]]] = 0
+
+            ring_id = len(rings)
+            rings.append((ring_id, int(window_end), len(orders), tuple(token_names[ring_edges // n]), float(np.expm1(score)), float(volume)))
+            for order, fill in zip(orders, fills):
+                legs.append((ring_id, ids[order], token_names[edge[order] // n], token_names[edge[order] % n], fill, fill * bought[order] / sold[order]))
+
+    rings_df = pd.DataFrame(rings, columns=RING_COLUMNS)
+    legs_df = pd.DataFrame(legs, columns=LEG_COLUMNS)
+    print(f"Found {len(rings_df)} rings ({rings_df['length'].value_counts().sort_index().to_dict()} by length) over {len(ids)} orders")
+    return RingMatchResult(rings_df, legs_df)
+
+
+def _cycles_by_edge(cycle_edges: np.ndarray, n_edges: int) -> List[np.ndarray]:
+    # Cycle indices through every edge
+    cycle = np.repeat(np.arange(len(cycle_edges)), cycle_edges.shape[1])
+    flat = cycle_edges.ravel()
+    order = np.argsort(flat, kind="stable")
+    bounds = np.searchsorted(flat[order], np.arange(n_edges + 1))
+    return [cycle[order[bounds[e]:bounds[e + 1]]] for e in range(n_edges)]
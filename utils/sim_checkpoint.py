@@ -0,0 +1,113 @@
+from typing import List, Tuple
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+CHECKPOINT_DIR = "data/checkpoints"
+COMPRESSION = "zstd"
+MANIFEST = "manifest.json"
+SEGMENT_SEC = 86_400
+
+
+# Results of finished simulation units (time segments of a pair and option, see `segments`), keyed by everything
+# that determines them: the segment's trades, the pair's prices up to its end, the option and the engine version.
+# A crashed or extended run only simulates the units whose key is not stored yet.
+class SimCheckpoint:
+
+    def __init__(self, root: str = CHECKPOINT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.manifest
+
+    def save(self, key: str, matches_df: pd.DataFrame, expired_df: pd.DataFrame, info: dict = None):
+        # Compressed Arrow IPC files, the manifest is replaced atomically after both are written
+        for kind, df in (("matches", matches_df), ("expired", expired_df)):
+            path = self._path(key, kind)
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), f"{path}.tmp", compression=COMPRESSION)
+            os.replace(f"{path}.tmp", path)
+        self.manifest[key] = {**(info or {}), "matches": len(matches_df), "expired": len(expired_df)}
+        self._write_manifest()
+
+    def discard(self, keys: List[str]):
+        for key in keys:
+            self.manifest.pop(key, None)
+        self._write_manifest()
+
+    def load(self, key: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        return feather.read_feather(self._path(key, "matches")), feather.read_feather(self._path(key, "expired"))
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.root, f"{key}.{kind}.arrow")
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.root, f".{MANIFEST}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST))
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            manifest = json.load(f)
+        # Units whose files went missing are simulated again
+        return {
+            key: unit for key, unit in manifest.items()
+            if os.path.exists(self._path(key, "matches")) and os.path.exists(self._path(key, "expired"))
+        }
+
+
+# Bounds of time-sorted trades cut where every earlier order has expired before the next one can trade (before its
+# first auction for batched options), so the segments can be simulated on their own. Only the first cut after each
+# `segment_sec` boundary is kept; cuts depend on the trades before them only, so appending data keeps the earlier
+# segments. Orders without expiry prevent any later cut.
+def segments(block_time: np.ndarray, expiry: np.ndarray, batch_dur_sec: int = None, segment_sec: int = SEGMENT_SEC) -> List[Tuple[int, int]]:
+    if len(block_time) == 0:
+        return []
+    closed_before = np.concatenate([[-np.inf], np.maximum.accumulate(expiry)[:-1]])
+    first_trade = (block_time // batch_dur_sec + 1) * batch_dur_sec if batch_dur_sec else block_time
+    safe = np.flatnonzero(closed_before < first_trade)
+    period = block_time[safe] // segment_sec
+    cuts = safe[np.concatenate([[True], period[1:] != period[:-1]]) & (period > block_time[0] // segment_sec)]
+    starts = np.concatenate([[0], cuts])
+    return list(zip(starts.tolist(), np.append(cuts, len(block_time)).tolist()))
+
+def fingerprint(df: pd.DataFrame) -> str:
+    if df is None:
+        return ""
+    return fingerprints(df, [slice(None)])[0]
+
+# Fingerprints of row slices of one frame, the rows are hashed once
+def fingerprints(df: pd.DataFrame, slices: List[slice]) -> List[str]:
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    columns = ",".join(map(str, df.columns)).encode()
+    return [hashlib.sha1(hashes[s].tobytes() + columns).hexdigest() for s in slices]
+
+def unit_key(*parts) -> str:
+    return hashlib.sha1(json.dumps([str(p) for p in parts]).encode()).hexdigest()[:20]
+
+# Same rows in any order, floats within `rtol`
+def same_results(left: pd.DataFrame, right: pd.DataFrame, rtol: float = 1e-9) -> bool:
+    if len(left) != len(right) or (len(left) > 0 and set(left.columns) != set(right.columns)):
+        return False
+    if len(left) == 0:
+        return True
+    floats = [c for c in sorted(left.columns) if pd.api.types.is_float_dtype(left[c])]
+    columns = [c for c in sorted(left.columns) if c not in floats] + floats
+    left = left[columns].sort_values(columns, ignore_index=True)
+    right = right[columns].sort_values(columns, ignore_index=True)
+    return all(
+        np.allclose(left[c].to_numpy(dtype=float), right[c].to_numpy(dtype=float), rtol=rtol, equal_nan=True) if c in floats
+        else (left[c].to_numpy() == right[c].to_numpy()).all()
+        for c in columns
+    )
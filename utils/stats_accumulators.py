@@ -0,0 +1,238 @@
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+import math
+
+import numpy as np
+import pandas as pd
+
+
+RELATIVE_ACCURACY = 0.001
+MAX_BUCKETS = 4096
+MIN_SKETCH_VALUE = 1e-15
+
+# `MatchesStats` fields that are `Stat`s: (value column, weight column, row filter)
+STAT_FIELDS = {
+    "pi_no_fail_cost": ("price_improvement", "amount_usd", None),
+    "pi_with_mkt_fallback": ("price_improvement_with_cost", "amount_usd", None),
+    "eff_pi_with_mkt_fallback": ("effective_price_improvement", "amount_usd", None),
+    "pi_matched_only": ("price_improvement", "matched_amount_usd", "matched"),
+    "wait_cost": ("wait_cost", "amount_usd", None),
+    "wait_cost_unmatched": ("wait_cost", "unmatched_amount_usd", "unmatched"),
+}
+
+
+# Count, mean and sum of squared deviations of (weighted) values, merged with Chan's parallel formulas
+@dataclass
+class Moments:
+    weight: float = 0.0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    @staticmethod
+    def of(values: np.ndarray, weights: np.ndarray = None) -> "Moments":
+        weights = np.ones(len(values)) if weights is None else weights
+        total = weights.sum()
+        if total == 0:
+            return Moments()
+        mean = (weights * values).sum() / total
+        return Moments(total, mean, (weights * (values - mean) ** 2).sum())
+
+    def merge(self, other: "Moments") -> "Moments":
+        if other.weight == 0:
+            return self
+        if self.weight == 0:
+            self.weight, self.mean, self.m2 = other.weight, other.mean, other.m2
+            return self
+        total = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean += delta * other.weight / total
+        self.m2 += other.m2 + delta ** 2 * self.weight * other.weight / total
+        self.weight = total
+        return self
+
+
+# Everything `Stat` reports, with the same NaN semantics as the pandas version:
+# values are skipped when missing, the weighted denominator still counts their weights
+@dataclass
+class StatAccumulator:
+    moments: Moments = field(default_factory=Moments)
+    weighted_moments: Moments = field(default_factory=Moments)
+    weight_total: float = 0.0
+
+    def update(self, values: np.ndarray, weights: np.ndarray) -> "StatAccumulator":
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        has_value, has_weight = ~np.isnan(values), ~np.isnan(weights)
+        both = has_value & has_weight
+        self.moments.merge(Moments.of(values[has_value]))
+        self.weighted_moments.merge(Moments.of(values[both], weights[both]))
+        self.weight_total += weights[has_weight].sum()
+        return self
+
+    def merge(self, other: "StatAccumulator") -> "StatAccumulator":
+        self.moments.merge(other.moments)
+        self.weighted_moments.merge(other.weighted_moments)
+        self.weight_total += other.weight_total
+        return self
+
+    @property
+    def count(self) -> int:
+        return int(self.moments.weight)
+
+    @property
+    def mean(self) -> float:
+        return self.moments.mean if self.moments.weight > 0 else np.nan
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.moments.m2 / (self.moments.weight - 1)) if self.moments.weight > 1 else np.nan
+
+    @property
+    def weighted_mean(self) -> float:
+        if self.weight_total == 0:
+            return np.nan
+        return self.weighted_moments.weight * self.weighted_moments.mean / self.weight_total
+
+    @property
+    def weighted_stddev(self) -> float:
+        # Spread around the unweighted mean, as in `Stat.calc_stddev_w`
+        if self.weight_total == 0:
+            return np.nan
+        if self.weighted_moments.weight == 0:
+            return 0.0
+        w = self.weighted_moments
+        return math.sqrt((w.m2 + w.weight * (w.mean - self.moments.mean) ** 2) / self.weight_total)
+
+
+# DDSketch: log-spaced buckets, quantiles within `relative_accuracy` of the true value.
+# Merging adds bucket counts, so it is exact; past `max_buckets` the smallest magnitudes are collapsed.
+class QuantileSketch:
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY, max_buckets: int = MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        magnitude = np.abs(values)
+        is_zero = magnitude < MIN_SKETCH_VALUE
+        self.zero += int(is_zero.sum())
+        self._add(self.positive, magnitude[(values > 0) & ~is_zero])
+        self._add(self.negative, magnitude[(values < 0) & ~is_zero])
+        self.count += len(values)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, n in other_store.items():
+                store[key] = store.get(key, 0) + n
+            self._collapse(store)
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def _add(self, store: Dict[int, int], magnitude: np.ndarray):
+        if len(magnitude) == 0:
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitude) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, n in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + n
+        self._collapse(store)
+
+    def _collapse(self, store: Dict[int, int]):
+        if len(store) <= self.max_buckets:
+            return
+        keys = sorted(store)
+        target = keys[len(keys) - self.max_buckets]
+        store[target] += sum(store.pop(k) for k in keys[:len(keys) - self.max_buckets])
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+
+# Mergeable state for `MatchesStats`: update it per chunk (or per worker) and merge the partials.
+# Memory only depends on the sketch size, not on the number of trades.
+class MatchesStatsAccumulator:
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.stats = {name: StatAccumulator() for name in STAT_FIELDS}
+        self.price_improvement = QuantileSketch(relative_accuracy)
+        self.total_trades = 0
+        self.matched_trades = 0
+        self.total_volume_traded = 0.0
+        self.matched_volume = 0.0
+
+    def update(self, df: pd.DataFrame, bounds: Tuple[float, float] = None) -> "MatchesStatsAccumulator":
+        # With `bounds` (from a first pass' `iqr_bounds`) rows are trimmed like `MatchesStats.trim_outliers`
+        if bounds is not None:
+            pi = df["price_improvement"]
+            df = df[(pi >= bounds[0]) & (pi <= bounds[1])]
+
+        amount_usd = df["amount_usd"].to_numpy(dtype=float)
+        prop_matched = df["prop_matched"].to_numpy(dtype=float)
+        columns = {
+            "amount_usd": amount_usd,
+            "matched_amount_usd": amount_usd * prop_matched,
+            "unmatched_amount_usd": amount_usd * (1 - prop_matched),
+        }
+        masks = {None: slice(None), "matched": prop_matched > 0, "unmatched": prop_matched < 1}
+        for name, (col, weight_col, mask) in STAT_FIELDS.items():
+            rows = masks[mask]
+            self.stats[name].update(df[col].to_numpy(dtype=float)[rows], columns[weight_col][rows])
+
+        self.price_improvement.update(df["price_improvement"].to_numpy(dtype=float))
+        self.total_trades += len(df)
+        self.matched_trades += int((df["match_fills"] > 0).sum())
+        self.total_volume_traded += np.nansum(amount_usd)
+        self.matched_volume += np.nansum(amount_usd * prop_matched)
+        return self
+
+    def merge(self, other: "MatchesStatsAccumulator") -> "MatchesStatsAccumulator":
+        for name, stat in self.stats.items():
+            stat.merge(other.stats[name])
+        self.price_improvement.merge(other.price_improvement)
+        self.total_trades += other.total_trades
+        self.matched_trades += other.matched_trades
+        self.total_volume_traded += other.total_volume_traded
+        self.matched_volume += other.matched_volume
+        return self
+
+    def iqr_bounds(self, multiplier: float = 1.5) -> Tuple[float, float]:
+        q1, q3 = self.price_improvement.quantile(0.25), self.price_improvement.quantile(0.75)
+        iqr = q3 - q1
+        return q1 - multiplier * iqr, q3 + multiplier * iqr
+
+    @property
+    def rel_matched_vol(self) -> float:
+        return self.matched_volume / self.total_volume_traded if self.total_volume_traded != 0 else 0
+
+    @property
+    def rel_matches(self) -> float:
+        return self.matched_trades / self.total_trades if self.total_trades > 0 else np.nan
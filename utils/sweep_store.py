@@ -0,0 +1,109 @@
+from typing import List
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+SWEEP_STORE_DIR = "data/sweeps"
+# A result is identified by the data, the job and everything that changes its stats: trimming, enrichment prices,
+# enrichment backend, matching engine and price compression
+KEY_COLUMNS = ["dataset_version", "pair", "time_limit", "batch_dur", "min_delta", "trim_outliers", "with_prices", "backend", "engine", "price_epsilon", "price_bucket_sec"]
+# Options may be None, stored as float so all runs share one schema
+OPTION_COLUMNS = ["time_limit", "batch_dur", "min_delta", "price_epsilon", "price_bucket_sec"]
+PARTITIONING = ds.partitioning(pa.schema([("dataset_version", pa.string())]), flavor="hive")
+
+
+# Append-only parquet store of flat `get_aggregated_stats` tables.
+# Every run is a new file under `<root>/dataset_version=<v>/`, so past runs are never rewritten
+# and can be queried together without recomputing the sweep.
+class SweepStore:
+
+    def __init__(self, root: str = SWEEP_STORE_DIR):
+        self.root = root
+
+    def append(self, stats_df: pd.DataFrame, dataset_version: str, run_id: str = None) -> str:
+        run_id = run_id or uuid.uuid4().hex
+        created_at = datetime.datetime.now(datetime.timezone.utc)
+        df = stats_df.assign(run_id=run_id, created_at=created_at)
+        for col in OPTION_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col]).astype(float)
+        part_dir = os.path.join(self.root, f"dataset_version={dataset_version}")
+        os.makedirs(part_dir, exist_ok=True)
+
+        path = os.path.join(part_dir, f"run-{created_at:%Y%m%dT%H%M%S}-{run_id}.parquet")
+        # Write to a hidden file next to the target and rename, readers never see a partial file
+        tmp_path = os.path.join(part_dir, f".{os.path.basename(path)}.tmp")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+        print(f"Stored {len(df)} results of run {run_id} in {path}")
+        return path
+
+    def read(self, filter=None, latest: bool = True) -> pd.DataFrame:
+        # `filter` is a pyarrow dataset expression, eg. `ds.field("batch_dur") == 12`
+        if len(self.files()) == 0:
+            return pd.DataFrame()
+        dataset = ds.dataset(self.root, format="parquet", partitioning=PARTITIONING)
+        df = dataset.to_table(filter=filter).to_pandas()
+        if latest and len(df) > 0:
+            # Only the most recent run per key
+            keys = [c for c in KEY_COLUMNS if c in df.columns]
+            df = df.sort_values("created_at", kind="stable").drop_duplicates(keys, keep="last").reset_index(drop=True)
+        return df
+
+    def runs(self) -> pd.DataFrame:
+        df = self.read(latest=False)
+        if len(df) == 0:
+            return df
+        return df.groupby(["dataset_version", "run_id"], as_index=False).agg(created_at=("created_at", "first"), jobs=("pair", "size"))
+
+    def files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.root, "dataset_version=*", "*.parquet")))
+
+
+def dataset_version(dataset_dirs: List[str]) -> str:
+    # Fingerprint of the input datasets: their metadata and the names and sizes of their data files
+    h = hashlib.sha1()
+    for d in sorted(dataset_dirs):
+        metadata_path = os.path.join(d, "metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                h.update(json.dumps(json.load(f), sort_keys=True).encode())
+        for path in sorted(glob.glob(os.path.join(d, "**", "*.parquet"), recursive=True)):
+            h.update(f"{os.path.relpath(path, d)}:{os.path.getsize(path)}".encode())
+    return h.hexdigest()[:12]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query stored sweep results")
+    parser.add_argument("--root", default=SWEEP_STORE_DIR, help="Sweep store directory")
+    parser.add_argument("--dataset-version", default=None, help="Only results for this dataset version")
+    parser.add_argument("--pair", default=None, help="Only results for this pair")
+    parser.add_argument("--all-runs", action="store_true", help="Keep every run instead of the latest per pair, options and settings")
+    parser.add_argument("--out", default=None, help="Write the result to this parquet/csv file instead of printing it")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    filter = None
+    if args.dataset_version is not None:
+        filter = ds.field("dataset_version") == args.dataset_version
+    if args.pair is not None:
+        pair_filter = ds.field("pair") == args.pair
+        filter = pair_filter if filter is None else filter & pair_filter
+    df = SweepStore(args.root).read(filter, latest=not args.all_runs)
+    if args.out is None:
+        print(df.to_string())
+    elif args.out.endswith(".csv"):
+        df.to_csv(args.out, index=False)
+    else:
+        df.to_parquet(args.out, index=False)
@@ -0,0 +1,62 @@
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from utils.batch_auction import run_batch_auction
+
+
+def order(id, is_ask, qty, price, block_time, max_match_time=np.nan):
+    return {
+        "id": id,
+        "token_sold_address": "BASE" if is_ask else "QUOTE",
+        "token_bought_address": "QUOTE" if is_ask else "BASE",
+        "token_sold_amount": qty if is_ask else qty * price,
+        "token_bought_amount": qty * price if is_ask else qty,
+        "block_time": block_time,
+        "max_match_time": max_match_time,
+    }
+
+# 10 second batches: "a" is half filled by "b" at 10, its rest carries over and is filled by "c" at 30.
+# "d" and "f" are priced out and expire 30 seconds after arrival, "g" runs out before its first auction.
+TRADES = pd.DataFrame([
+    order("a", True, 1.0, 2000, 1),
+    order("b", False, 0.5, 2010, 2),
+    order("c", False, 0.5, 2001, 25),
+    order("d", True, 1.0, 2500, 26),
+    order("g", False, 1.0, 1000, 41, max_match_time=42),
+    order("f", True, 1.0, 2000, 45),
+])
+
+
+class TestBatchAuction(unittest.TestCase):
+
+    def test_rests_carry_over_until_expiry(self):
+        matches_df, expired_df = run_batch_auction(TRADES, "BASE", "QUOTE", 10, time_limit=30)
+
+        self.assertEqual(list(zip(matches_df["bid_id"], matches_df["ask_id"])), [("b", "a"), ("c", "a")])
+        self.assertEqual(list(matches_df["amount"]), [0.5, 0.5])
+        self.assertEqual(list(matches_df["price"]), [2005.0, 2000.5])
+        self.assertEqual(list(matches_df["timestamp"]), [10, 30])
+        self.assertEqual(dict(zip(expired_df["id"], expired_df["timestamp"])), {"d": 56, "g": 42, "f": 75})
+
+    def test_orders_without_expiry_stay_open(self):
+        matches_df, expired_df = run_batch_auction(TRADES.drop(columns=["max_match_time"]), "BASE", "QUOTE", 10)
+
+        self.assertEqual(list(zip(matches_df["bid_id"], matches_df["ask_id"])), [("b", "a"), ("c", "a")])
+        # "d", "f" and "g" are still on the book
+        self.assertEqual(len(expired_df), 0)
+
+    def test_zero_amounts_are_unfillable(self):
+        trades_df = pd.DataFrame([order("a", True, 1.0, 2000, 1), order("z", False, 0.0, 2000, 2), order("b", False, 1.0, 2000, 3)])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            matches_df, expired_df = run_batch_auction(trades_df, "BASE", "QUOTE", 10, time_limit=30)
+
+        self.assertEqual(list(zip(matches_df["bid_id"], matches_df["ask_id"])), [("b", "a")])
+        self.assertEqual(len(expired_df), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import glob
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from utils.dune.engine import LocalDuneClient, QUERIES_DIR
+
+
+WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+ROUTER = "0x1111111254eeb25477b68fb85ed929f73a960582"
+SWAPPER = "0x00000000000000000000000000000000000000aa"
+TIME = pd.Timestamp("2025-01-02 10:15:00")
+
+PARAMS = {
+    "date_from": "2025-01-01 00:00:00",
+    "date_to": "2025-01-03 00:00:00",
+    "chain": "ethereum",
+    "pair_whitelist": f"{USDC}_{WETH}",
+    "token_whitelist": f"{WETH},{USDC}",
+    "allowed_rel_diff": "0.03",
+    "rel_diff_limit": "0.3",
+}
+
+
+def _hourly_prices():
+    return pd.DataFrame({
+        "price": [3000.0, 1.0],
+        "contract_address": [WETH, USDC],
+        "timestamp": [TIME.floor("h")] * 2,
+        "blockchain": ["ethereum"] * 2,
+    })
+
+# Smallest stand-in tables that produce rows in `trades.dune.sql` (a direct and an aggregator trade) and `unix_fills.dune.sql`
+TABLES = {
+    "prices/hour": _hourly_prices(),
+    "dex/prices": _hourly_prices().rename(columns={"price": "median_price", "timestamp": "hour"}),
+    "tokens/erc20": pd.DataFrame({"contract_address": [WETH, USDC], "decimals": [18, 6], "symbol": ["WETH", "USDC"], "blockchain": ["ethereum"] * 2}),
+    "erc20_ethereum/evt_Transfer": pd.DataFrame({
+        "evt_block_time": [TIME] * 2,
+        "evt_tx_hash": ["0x02"] * 2,
+        "from": [SWAPPER, ROUTER],
+        "to": [ROUTER, SWAPPER],
+        "contract_address": [USDC, WETH],
+        "value": [3000 * 10**6, 10**18],
+    }),
+    "ethereum/traces": pd.DataFrame({"block_time": [TIME], "tx_hash": ["0x03"], "from": [ROUTER], "to": [SWAPPER], "value": [0]}),
+    "dex_aggregator/trades": pd.DataFrame({
+        "tx_hash": ["0x04"], "evt_index": [0], "block_time": [TIME], "amount_usd": [100.0],
+        "token_bought_amount": [100.0], "token_sold_amount": [0.0333], "tx_to": [ROUTER], "blockchain": ["ethereum"],
+        "project": ["1inch"], "version": ["6"], "token_bought_address": [USDC], "token_sold_address": [WETH],
+    }),
+    "dex/trades": pd.DataFrame({
+        "tx_hash": ["0x01"], "evt_index": [0], "token_bought_address": [WETH], "token_sold_address": [USDC],
+        "token_bought_amount": [1.0], "token_sold_amount": [3000.0], "amount_usd": [3000.0], "block_time": [TIME],
+        "project": ["uniswap"], "version": ["3"], "project_contract_address": [ROUTER], "tx_to": [ROUTER], "blockchain": ["ethereum"],
+    }),
+    "query_3004150": pd.DataFrame({"address": [ROUTER], "router": ["Uniswap Router"]}),
+    "uniswap_ethereum/V2DutchOrderReactor_evt_Fill": pd.DataFrame({
+        "evt_tx_hash": ["0x02"], "evt_index": [1], "evt_block_time": [TIME], "evt_block_number": [21500000], "swapper": [SWAPPER],
+    }),
+    "uniswap_ethereum/ExclusiveDutchOrderReactor_evt_Fill": pd.DataFrame(
+        columns=["evt_tx_hash", "evt_index", "evt_block_time", "evt_block_number", "swapper"]
+    ).astype({"evt_tx_hash": str, "evt_index": "int64", "evt_block_time": "datetime64[us]", "evt_block_number": "int64", "swapper": str}),
+}
+
+
+class TestLocalDuneClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tables_dir = tempfile.mkdtemp()
+        for name, df in TABLES.items():
+            path = os.path.join(cls.tables_dir, f"{name}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.to_parquet(path, index=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tables_dir)
+
+    def run_query(self, name):
+        query_file = os.path.join(QUERIES_DIR, name)
+        client = LocalDuneClient(query_file, self.tables_dir)
+        with open(query_file) as f:
+            return client.run_sql(f.read(), PARAMS).result.rows
+
+    def test_every_query_parses(self):
+        client = LocalDuneClient(None, self.tables_dir)
+        files = sorted(glob.glob(os.path.join(QUERIES_DIR, "*.sql")))
+        self.assertGreater(len(files), 0)
+        for query_file in files:
+            with self.subTest(query=os.path.basename(query_file)):
+                with open(query_file) as f:
+                    sql = f.read()
+                params = {name: PARAMS.get(name, "0") for name in re.findall(r"\{\{\s*([A-Za-z0-9_]+)\s*\}\}", sql)}
+                self.assertEqual(len(client.con.extract_statements(client.prepare(sql, params))), 1)
+
+    def test_trades_query(self):
+        rows = {row["kind"]: row for row in self.run_query("trades.dune.sql")}
+        self.assertEqual(set(rows), {"trades_monohop_without_fee", "agg_trades"})
+        direct = rows["trades_monohop_without_fee"]
+        self.assertEqual((direct["tx_hash"], direct["token_sold_address"], direct["token_bought_address"]), ("0x01", USDC, WETH))
+        self.assertEqual(direct["router"], "Uniswap Router")
+        self.assertEqual(direct["block_time"], TIME.timestamp())
+        self.assertEqual(rows["agg_trades"]["tx_hash"], "0x04")
+
+    def test_unix_fills_query(self):
+        rows = self.run_query("unix_fills.dune.sql")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["token_sold_address"], USDC)
+        self.assertEqual(rows[0]["token_bought_address"], WETH)
+        self.assertAlmostEqual(rows[0]["token_sold_amount"], 3000.0)
+        self.assertAlmostEqual(rows[0]["token_bought_amount"], 1.0)
+        self.assertAlmostEqual(rows[0]["amount_usd"], 3000.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import importlib.util
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.matchings import MatchingOptions, enrich_matches
+from utils.realized_vol import realized_variance
+
+
+BASE = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+QUOTE = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+PAIR = "WETH_USDC"
+OPTIONS = MatchingOptions(BASE, QUOTE, 300, None, None)
+
+
+def trade(id, is_ask, base_amount, quote_amount, block_time):
+    return {
+        "id": id,
+        "token_sold_address": BASE if is_ask else QUOTE,
+        "token_bought_address": QUOTE if is_ask else BASE,
+        "token_sold_amount": base_amount if is_ask else quote_amount,
+        "token_bought_amount": quote_amount if is_ask else base_amount,
+        "block_time": block_time,
+        "amount_usd": quote_amount,
+        "creation_price": 2000.0 + block_time / 100,
+        "market_price_rel_offset": 1.001,
+        "pair": PAIR,
+    }
+
+# "a" is filled by "b" and "d", the rests of "b" and "d" expire, "c" is priced out and expires
+TRADES = pd.DataFrame([
+    trade("a", True, 1.0, 2000, 100),
+    trade("b", False, 1.0, 2010, 110),
+    trade("c", True, 2.0, 4100, 120),
+    trade("d", False, 0.5, 1005, 130),
+])
+MATCHES = pd.DataFrame({
+    "bid_id": ["b", "d"],
+    "ask_id": ["a", "a"],
+    "amount": [0.6, 0.4],
+    "price": [2005.0, 2004.0],
+    "timestamp": [112, 135],
+    "ext_ref_price": [2003.0, 2004.5],
+})
+EXPIRED = pd.DataFrame({"id": ["b", "c", "d"], "timestamp": [410, 420, 430], "ext_ref_price": [2002.0, 2001.0, 2000.0]})
+PRICES = pd.DataFrame({"block_time": np.arange(0, 1000, 50)})
+PRICES = PRICES.assign(price=2000 + PRICES["block_time"] / 100, base_token=BASE, quote_token=QUOTE, pair=PAIR)
+
+
+# `enrich_matches` as of the baseline commit, the reference both backends have to reproduce
+def baseline_enrich_matches(trades_df, matches_df, expired_df, options, prices_df=None, inversed_prices=None):
+    ROUND_DEC = np.finfo(float).precision-1
+    base_asset, quote_asset, time_limit = options.base_asset, options.quote_asset, options.time_limit
+
+    matches_melted_df = matches_df.melt(
+        id_vars=["amount", "price", "timestamp", "ext_ref_price"], value_vars=["bid_id", "ask_id"], var_name="side", value_name="id"
+    ).replace({"bid_id": "bid", "ask_id": "ask"}, inplace=False)
+    matches_melted_df["matched_amount_base"] = matches_melted_df["amount"]
+    matches_melted_df["matched_amount_quote"] = matches_melted_df["amount"] * matches_melted_df["price"]
+    matches_melted_df["price_x_amount"] = matches_melted_df["ext_ref_price"] * matches_melted_df["amount"]
+    matches_melted_df["timestamp_x_amount"] = matches_melted_df["timestamp"] * matches_melted_df["amount"]
+    matches_grouped_df = matches_melted_df.sort_values("timestamp").groupby("id").agg(
+        matched_amount_base=("matched_amount_base", "sum"),
+        matched_amount_quote=("matched_amount_quote", "sum"),
+        match_time_max=("timestamp", "max"),
+        price_x_amount=("price_x_amount", "sum"),
+        timestamp_x_amount=("timestamp_x_amount", "sum"),
+        match_ex_ref_price_last=("ext_ref_price", "last"),
+        match_fills=("side", "count"),
+    ).reset_index()
+    matches_grouped_df["match_ext_ref_price_wmean"] = matches_grouped_df["price_x_amount"] / matches_grouped_df["matched_amount_base"]
+    matches_grouped_df["match_time_wmean"] = matches_grouped_df["timestamp_x_amount"] / matches_grouped_df["matched_amount_base"]
+
+    df = trades_df.merge(matches_grouped_df.assign(is_matched=True), on="id", how="left")
+    df = df.merge(expired_df.assign(is_expired=True).rename(columns={"ext_ref_price": "expiry_ext_ref_price"}), on="id", how="left")
+    df.loc[:, "is_matched"] = df["is_matched"].fillna(False)
+    df.loc[:, "is_expired"] = df["is_expired"].fillna(False)
+    df["wait_time_wmean"] = df["match_time_wmean"] - df["block_time"]
+    df["wait_time_max"] = df["match_time_max"] - df["block_time"]
+    ask_mask = df["token_sold_address"] == base_asset
+    df["is_ask"] = ask_mask
+
+    df.loc[ask_mask, "prop_matched"] = df["matched_amount_base"] / df["token_sold_amount"]
+    df.loc[~ask_mask, "prop_matched"] = df["matched_amount_quote"] / df["token_sold_amount"]
+    df["prop_matched"] = df["prop_matched"].round(ROUND_DEC).fillna(0)
+    df.loc[ask_mask, "price_org"] = df["token_bought_amount"] / df["token_sold_amount"]
+    df.loc[~ask_mask, "price_org"] = df["token_sold_amount"] / df["token_bought_amount"]
+    df["price_matched"] = (df["matched_amount_quote"] / df["matched_amount_base"]).fillna(0)
+    df["price_realized"] = df["prop_matched"] * (df["price_matched"] - df["price_org"]) + df["price_org"]
+    df.loc[ask_mask, "price_improvement"] = (df["price_realized"] - df["price_org"]) / df["price_org"]
+    df.loc[~ask_mask, "price_improvement"] = (df["price_org"] - df["price_realized"]) / df["price_org"]
+    df["price_improvement"] = df["price_improvement"].round(ROUND_DEC)
+    df.loc[ask_mask, "gross_pi"] = (df["price_matched"] - df["price_org"]) / df["price_org"]
+    df.loc[~ask_mask, "gross_pi"] = (df["price_org"] - df["price_matched"]) / df["price_org"]
+
+    if prices_df is not None or df["match_ext_ref_price_wmean"].sum() != 0:
+        if prices_df is not None:
+            df.fillna({"match_time_max": df["block_time"] + time_limit}, inplace=True)
+            df["match_time_max"] = df["match_time_max"].astype("int64")
+            df.sort_values("match_time_max", inplace=True)
+            prices_df.sort_values("block_time", inplace=True)
+            df = pd.merge_asof(
+                df, prices_df.rename(columns={"price": "end_mkt_price"}), by="pair", left_on=["match_time_max"], right_on=["block_time"],
+                direction="forward", tolerance=7200, suffixes=("", "_y"),
+            )
+        else:
+            df["end_mkt_price"] = (
+                df["prop_matched"] * df["match_ext_ref_price_wmean"].fillna(0)
+                + (1 - df["prop_matched"]) * df["expiry_ext_ref_price"].fillna(df["match_ex_ref_price_last"])
+            )
+            if inversed_prices:
+                for col in ["creation_price", "market_price_rel_offset"]:
+                    df[col] = 1 / df[col]
+        df["effective_expiry_market_price"] = df["end_mkt_price"] * df["market_price_rel_offset"]
+        df["price_realized_with_cost"] = (df["price_matched"] - df["effective_expiry_market_price"]) * df["prop_matched"] + df["effective_expiry_market_price"]
+        df.loc[:, "price_improvement_with_cost"] = np.where(
+            df["is_ask"], df["price_realized_with_cost"] / df["price_org"] - 1, 1 - df["price_realized_with_cost"] / df["price_org"]
+        ).round(ROUND_DEC)
+        df.loc[:, "effective_price_improvement"] = np.where(
+            df["is_ask"], df["price_realized_with_cost"] / df["effective_expiry_market_price"] - 1, 1 - df["price_realized_with_cost"] / df["effective_expiry_market_price"]
+        ).round(ROUND_DEC)
+        df["wait_cost"] = np.where(df["is_ask"], 1 - df["end_mkt_price"] / df["creation_price"], df["end_mkt_price"] / df["creation_price"] - 1)
+    else:
+        df["price_improvement_with_cost"] = np.nan
+        df["effective_price_improvement"] = np.nan
+        df["wait_cost"] = np.nan
+    return df
+
+
+class TestEnrichMatches(unittest.TestCase):
+
+    def run_backends(self, matches_df, expired_df, prices_df, inversed_prices=False, vol_df=None):
+        def run(enrich, **kwargs):
+            prices = prices_df.copy() if prices_df is not None else None
+            df = enrich(TRADES.copy(), matches_df.copy(), expired_df.copy(), OPTIONS, prices, inversed_prices, **kwargs)
+            return df.sort_values("id").reset_index(drop=True)
+        outputs = {"pandas": run(enrich_matches, backend="pandas", vol_df=vol_df)}
+        if importlib.util.find_spec("polars") is not None:
+            outputs["polars"] = run(enrich_matches, backend="polars", vol_df=vol_df)
+        return run(baseline_enrich_matches), outputs
+
+    def assert_same(self, baseline, outputs):
+        pandas_df = outputs["pandas"]
+        for name, df in outputs.items():
+            with self.subTest(backend=name):
+                self.assertEqual(set(df.columns), set(pandas_df.columns))
+                self.assertLessEqual(set(baseline.columns), set(df.columns))
+                pd.testing.assert_frame_equal(df[baseline.columns], baseline, check_dtype=False)
+                pd.testing.assert_frame_equal(df[pandas_df.columns], pandas_df, check_dtype=False)
+
+    def test_with_prices(self):
+        baseline, outputs = self.run_backends(MATCHES, EXPIRED, PRICES)
+        self.assertTrue(baseline["wait_cost"].notna().all())
+        self.assert_same(baseline, outputs)
+
+    def test_with_reference_prices(self):
+        baseline, outputs = self.run_backends(MATCHES, EXPIRED, None, inversed_prices=True)
+        self.assertIn("end_mkt_price", baseline.columns)
+        self.assert_same(baseline, outputs)
+
+    def test_with_volatility(self):
+        baseline, outputs = self.run_backends(MATCHES, EXPIRED, PRICES, vol_df=realized_variance(PRICES, windows_sec=[300], sample_sec=10))
+        self.assertTrue(outputs["pandas"]["realized_variance_300s"].notna().all())
+        self.assert_same(baseline, outputs)
+
+    def test_without_prices(self):
+        baseline, outputs = self.run_backends(MATCHES.assign(ext_ref_price=np.nan), EXPIRED.assign(ext_ref_price=np.nan), None)
+        self.assertNotIn("end_mkt_price", baseline.columns)
+        self.assertTrue(baseline["wait_cost"].isna().all())
+        self.assert_same(baseline, outputs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from utils.cowswap_intent_loader import CowSwapIntentsLoader
+from utils.live_matching import LiveMatcher, attach, serve_batches
+
+
+WETH = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+T0 = 1_741_000_000
+
+
+def order(uid, is_ask, eth, usdc, created, valid_to):
+    return {
+        "uid": uid,
+        "sellToken": WETH if is_ask else USDC,
+        "buyToken": USDC if is_ask else WETH,
+        "sellAmount": str(int(eth * 10**18)) if is_ask else str(int(usdc * 10**6)),
+        "buyAmount": str(int(usdc * 10**6)) if is_ask else str(int(eth * 10**18)),
+        "created": pd.Timestamp(created, unit="s", tz="UTC").isoformat(),
+        "validTo": valid_to,
+        "kind": "sell",
+        "partiallyFillable": True,
+        "class": "limit",
+    }
+
+# Recorded solver batches: "a" is half filled by "b", rests on the book and is filled by "d" two batches later,
+# "c" is priced out and expires before batch 12
+ASK = order("a", True, 1.0, 2000, T0, T0 + 600)
+BATCHES = {
+    10: [ASK, order("b", False, 0.5, 1010, T0, T0 + 600)],
+    11: [ASK, order("c", True, 1.0, 2500, T0 + 12, T0 + 20)],
+    12: [order("d", False, 0.5, 1005, T0 + 24, T0 + 600)],
+}
+
+
+class TestLiveMatching(unittest.TestCase):
+
+    def setUp(self):
+        self.batch_dir = tempfile.mkdtemp()
+        for batch_id, orders in BATCHES.items():
+            self.write_batch(batch_id, orders)
+        self.server = serve_batches(self.batch_dir)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.batch_dir)
+
+    def write_batch(self, batch_id, orders):
+        with open(os.path.join(self.batch_dir, f"{batch_id}.json"), "w") as f:
+            json.dump({"orders": orders}, f)
+
+    def run_loader(self, matcher, max_batches):
+        loader = attach(CowSwapIntentsLoader(self.endpoint, None, _pause_ms=0, _live=True), matcher)
+        loader.fetch(10, max_batches=max_batches)
+
+    def test_matches_and_expiries(self):
+        results = []
+        matcher = LiveMatcher(WETH, USDC, on_batch=results.append)
+        self.run_loader(matcher, 3)
+
+        self.assertEqual([r.batch_id for r in results], [10, 11, 12])
+        self.assertEqual([(m.bid_id, m.ask_id) for r in results for m in r.matches.itertuples()], [("b", "a"), ("d", "a")])
+        self.assertTrue(all(m.amount == 0.5 for r in results for m in r.matches.itertuples()))
+        self.assertEqual([list(r.expired_orders["id"]) for r in results], [[], [], ["c"]])
+        self.assertEqual(len(matcher.open_df), 0)
+
+        stats = matcher.stats()
+        self.assertEqual(stats.total_trades, 4)
+        self.assertAlmostEqual(stats.rel_matches, 0.75)
+        self.assertEqual(len(matcher.latency_stats()), 3)
+
+    def test_order_trades_in_its_last_valid_batch(self):
+        # "x" is valid until batch 11, where "y" arrives and crosses it
+        self.write_batch(10, [order("x", False, 1.0, 2000, T0, T0 + 12)])
+        self.write_batch(11, [order("y", True, 1.0, 2000, T0 + 12, T0 + 600)])
+        results = []
+        self.run_loader(LiveMatcher(WETH, USDC, on_batch=results.append), 2)
+
+        self.assertEqual([(m.bid_id, m.ask_id) for r in results for m in r.matches.itertuples()], [("x", "y")])
+        self.assertEqual([list(r.expired_orders["id"]) for r in results], [[], []])
+
+    def test_unpublished_batch_is_polled(self):
+        results = []
+        matcher = LiveMatcher(WETH, USDC, on_batch=results.append)
+        thread = threading.Thread(target=self.run_loader, args=(matcher, 4))
+        thread.start()
+        # Batch 13 is published while the loader is waiting for it
+        time.sleep(0.5)
+        self.write_batch(13, [order("e", False, 0.1, 200, T0 + 36, T0 + 600)])
+        thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([r.batch_id for r in results], [10, 11, 12, 13])
+        self.assertEqual(list(matcher.open_df["id"]), ["e"])
+
+    def test_matcher_errors_propagate(self):
+        def fail(result):
+            raise RuntimeError("matcher failed")
+
+        with self.assertRaises(RuntimeError):
+            self.run_loader(LiveMatcher(WETH, USDC, on_batch=fail), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
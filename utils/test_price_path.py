@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.price_path import PricePathIndex
+
+
+# Pairs of very different scale, as raw-unit price ratios are
+SCALES = {"A": 3.3e8, "B": 3e-9, "C": 1.0}
+
+
+def prices(seed=0, n=200):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for k, (pair, scale) in enumerate(SCALES.items()):
+        times = np.sort(rng.choice(np.arange(1_000 + 100 * k, 20_000), n, replace=False))
+        frames.append(pd.DataFrame({"pair": pair, "block_time": times, "price": scale * rng.uniform(0.5, 1.5, n)}))
+    # Unsorted input
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+def brute_force(df, pair, start, end):
+    rows = df[df["pair"] == pair].sort_values("block_time")
+    times, values = rows["block_time"].to_numpy(), rows["price"].to_numpy()
+    start = max(start, times[0])
+    if end < start or times[0] > end:
+        return dict(start=np.nan, twap=np.nan, min=np.nan, max=np.nan)
+    i = np.flatnonzero(times <= start)[-1]
+    j = np.flatnonzero(times <= end)[-1]
+    integral = 0.0
+    for k in range(i, j + 1):
+        lo = max(times[k], start)
+        hi = min(times[k + 1], end) if k + 1 < len(times) else end
+        integral += values[k] * max(hi - lo, 0)
+    return dict(
+        start=values[i],
+        twap=integral / (end - start) if end > start else values[i],
+        min=values[i:j + 1].min(),
+        max=values[i:j + 1].max(),
+    )
+
+
+class TestPricePathIndex(unittest.TestCase):
+
+    def test_window_matches_brute_force(self):
+        df = prices()
+        index = PricePathIndex(df)
+        rng = np.random.default_rng(1)
+        n = 2000
+        pair = rng.choice(list(SCALES), n)
+        # Starts before the pairs' first prices, empty and reversed windows included
+        start = rng.integers(0, 21_000, n)
+        end = start + rng.integers(-500, 5_000, n)
+        result = index.window(pair, start, end)
+        expected = [brute_force(df, pair[q], start[q], end[q]) for q in range(n)]
+        for name in ["start", "twap", "min", "max"]:
+            with self.subTest(metric=name):
+                np.testing.assert_allclose(result[name], [e[name] for e in expected], rtol=1e-9)
+
+    def test_small_pair_next_to_large_one(self):
+        n = 200_000
+        df = pd.concat([
+            pd.DataFrame({"pair": "A", "block_time": np.arange(n) * 12, "price": 3.3e8}),
+            pd.DataFrame({"pair": "B", "block_time": np.arange(n) * 12, "price": 3e-9}),
+        ], ignore_index=True)
+        result = PricePathIndex(df).window(["B"], [n * 6], [n * 6 + 600])
+        self.assertAlmostEqual(result["twap"][0] / 3e-9, 1.0, places=9)
+
+    def test_unknown_pair(self):
+        result = PricePathIndex(prices()).window(["D"], [5_000], [6_000])
+        self.assertTrue(all(np.isnan(values[0]) for values in result.values()))
+
+    def test_inverse(self):
+        df = prices()
+        result = PricePathIndex(df, inverse=True).window(["A", "B"], [5_000, 5_000], [8_000, 8_000])
+        plain = PricePathIndex(df.assign(price=1 / df["price"])).window(["A", "B"], [5_000, 5_000], [8_000, 8_000])
+        for name in result:
+            np.testing.assert_allclose(result[name], plain[name], rtol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import pandas as pd
+
+from utils.ring_matching import find_rings
+
+
+def order(id, sold_token, bought_token, sold, bought, block_time=0):
+    return {
+        "id": id,
+        "token_sold_address": sold_token,
+        "token_bought_address": bought_token,
+        "token_sold_amount": sold,
+        "token_bought_amount": bought,
+        "block_time": block_time,
+    }
+
+# A -> B -> C -> A: the product of limit rates is 0.5 * 2 * 100 / 90, so the ring has 1/9 surplus
+RING_3 = [
+    order("a", "A", "B", 100, 200),
+    order("b", "B", "C", 200, 100),
+    order("c", "C", "A", 100, 90),
+]
+
+
+class TestFindRings(unittest.TestCase):
+
+    def run_rings(self, orders, time_limit=60, **kwargs):
+        return find_rings(pd.DataFrame(orders), time_limit, **kwargs)
+
+    def legs(self, result):
+        return [(leg.ring_id, leg.id, leg.amount_sold, leg.amount_bought) for leg in result.legs.itertuples()]
+
+    def test_three_token_ring(self):
+        result = self.run_rings(RING_3)
+
+        self.assertEqual(len(result.rings), 1)
+        ring = result.rings.iloc[0]
+        self.assertEqual((ring["length"], ring["tokens"], ring["timestamp"]), (3, ("A", "B", "C"), 12))
+        self.assertAlmostEqual(ring["surplus"], 1 / 9)
+        self.assertAlmostEqual(ring["volume"], 100)
+        self.assertEqual(self.legs(result), [(0, "a", 100, 200), (0, "b", 200, 100), (0, "c", 100, 90)])
+
+    def test_four_token_ring(self):
+        result = self.run_rings([
+            order("a", "A", "B", 100, 200),
+            order("b", "B", "C", 200, 100),
+            order("c", "C", "D", 100, 50),
+            order("d", "D", "A", 50, 95),
+        ])
+
+        self.assertEqual(list(result.rings["length"]), [4])
+        self.assertEqual(result.rings["tokens"].iloc[0], ("A", "B", "C", "D"))
+        self.assertAlmostEqual(result.rings["surplus"].iloc[0], 100 / 95 - 1)
+        self.assertEqual(list(result.legs["id"]), ["a", "b", "c", "d"])
+        self.assertEqual(list(result.legs["amount_sold"]), [100, 200, 100, 50])
+
+    def test_no_ring_below_unit_rate(self):
+        result = self.run_rings(RING_3[:2] + [order("c", "C", "A", 100, 110)])
+
+        self.assertEqual(len(result.rings), 0)
+        self.assertEqual(len(result.legs), 0)
+
+    def test_orders_leave_after_time_limit(self):
+        # "c" arrives in the window ending at 108, when "a" and "b" are only still open with the longer time limit
+        orders = RING_3[:2] + [order("c", "C", "A", 100, 90, block_time=100)]
+
+        self.assertEqual(len(self.run_rings(orders, time_limit=30).rings), 0)
+        self.assertEqual(list(self.run_rings(orders, time_limit=200).rings["timestamp"]), [108])
+
+    def test_remaining_amount_is_reused(self):
+        # Half of "a" fills the first ring, its rest fills the second one with the orders of the next window
+        result = self.run_rings([
+            order("a", "A", "B", 100, 200),
+            order("b", "B", "C", 100, 50),
+            order("c", "C", "A", 50, 45),
+            order("e", "B", "C", 100, 50, block_time=20),
+            order("f", "C", "A", 50, 45, block_time=20),
+        ])
+
+        self.assertEqual(list(result.rings["timestamp"]), [12, 24])
+        self.assertEqual(self.legs(result), [
+            (0, "a", 50, 100), (0, "b", 100, 50), (0, "c", 50, 45),
+            (1, "a", 50, 100), (1, "e", 100, 50), (1, "f", 50, 45),
+        ])
+
+    def test_min_surplus(self):
+        self.assertEqual(len(self.run_rings(RING_3, min_surplus=0.1).rings), 1)
+        self.assertEqual(len(self.run_rings(RING_3, min_surplus=0.2).rings), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
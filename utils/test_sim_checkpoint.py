@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import utils.matchings as matchings
+import utils.sim_checkpoint as sim_checkpoint
+from utils.batch_auction import run_batch_auction
+
+
+DAY = sim_checkpoint.SEGMENT_SEC
+BASE = "0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2"
+QUOTE = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+
+
+def random_trades(n=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    is_ask = rng.random(n) < 0.5
+    qty = rng.uniform(0.1, 2, n)
+    price = 2000 * (1 + rng.normal(0, 0.002, n))
+    return pd.DataFrame({
+        "id": [f"t{i}" for i in range(n)],
+        "token_sold_address": np.where(is_ask, BASE, QUOTE),
+        "token_bought_address": np.where(is_ask, QUOTE, BASE),
+        "token_sold_amount": np.where(is_ask, qty, qty * price),
+        "token_bought_amount": np.where(is_ask, qty * price, qty),
+        "block_time": 10 * DAY + np.cumsum(rng.exponential(200, n)).astype(np.int64),
+        "amount_usd": qty * price,
+    })
+
+
+class TestSegments(unittest.TestCase):
+
+    def test_first_cut_per_day(self):
+        block_time = np.array([0, 10, DAY + 10, DAY + 500, 2 * DAY + 5, 2 * DAY + 10])
+        self.assertEqual(sim_checkpoint.segments(block_time, block_time + 50), [(0, 2), (2, 4), (4, 6)])
+
+    def test_open_orders_prevent_cuts(self):
+        block_time = np.array([0, 10, DAY + 10, 2 * DAY + 10])
+        expiry = np.array([np.inf, 60, DAY + 60, 2 * DAY + 60])
+        self.assertEqual(sim_checkpoint.segments(block_time, expiry), [(0, 4)])
+        self.assertEqual(sim_checkpoint.segments(block_time[:0], expiry[:0]), [])
+
+    def test_batch_alignment(self):
+        # The second order arrives before the first one expires, but its first auction (DAY + 60) is after that
+        block_time = np.array([DAY - 100, DAY + 15])
+        expiry = np.array([DAY + 40, DAY + 100])
+        self.assertEqual(sim_checkpoint.segments(block_time, expiry), [(0, 2)])
+        self.assertEqual(sim_checkpoint.segments(block_time, expiry, batch_dur_sec=60), [(0, 1), (1, 2)])
+        # With 30 second batches it is still in the auction at DAY + 30
+        self.assertEqual(sim_checkpoint.segments(block_time, expiry, batch_dur_sec=30), [(0, 2)])
+
+    def test_appending_days_keeps_earlier_segments(self):
+        df = random_trades()
+        block_time = df["block_time"].to_numpy()
+        head = df[block_time < (block_time[0] // DAY + 3) * DAY]
+        bounds = {}
+        fps = {}
+        for name, frame in (("head", head), ("full", df)):
+            times = frame["block_time"].to_numpy()
+            bounds[name] = sim_checkpoint.segments(times, times + 300.0, 12)
+            fps[name] = sim_checkpoint.fingerprints(frame, [slice(a, b) for a, b in bounds[name]])
+        self.assertGreater(len(bounds["head"]), 1)
+        self.assertEqual(bounds["head"][:-1], bounds["full"][:len(bounds["head"]) - 1])
+        self.assertEqual(fps["head"][:-1], fps["full"][:len(bounds["head"]) - 1])
+
+
+class TestSimCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_save_load_and_recovery(self):
+        matches_df = pd.DataFrame({"bid_id": ["a"], "ask_id": ["b"], "amount": [0.5], "price": [2000.0], "timestamp": [12], "ext_ref_price": [np.nan]})
+        expired_df = pd.DataFrame({"id": ["c"], "timestamp": [300], "ext_ref_price": [1999.0]})
+        checkpoint = sim_checkpoint.SimCheckpoint(self.root)
+        checkpoint.save("k1", matches_df, expired_df, {"pair": ["a", "b"]})
+        checkpoint.save("k2", matches_df.iloc[:0], expired_df)
+
+        reopened = sim_checkpoint.SimCheckpoint(self.root)
+        self.assertIn("k1", reopened)
+        self.assertEqual(reopened.manifest["k1"], {"pair": ["a", "b"], "matches": 1, "expired": 1})
+        loaded = reopened.load("k1")
+        pd.testing.assert_frame_equal(loaded[0], matches_df)
+        pd.testing.assert_frame_equal(loaded[1], expired_df)
+
+        # Units whose files went missing are dropped, discarded ones as well
+        os.remove(os.path.join(self.root, "k2.expired.arrow"))
+        reopened = sim_checkpoint.SimCheckpoint(self.root)
+        self.assertNotIn("k2", reopened)
+        reopened.discard(["k1"])
+        self.assertEqual(len(sim_checkpoint.SimCheckpoint(self.root).manifest), 0)
+
+    def test_same_results(self):
+        df = pd.DataFrame({"id": ["a", "b"], "timestamp": [1, 2], "price": [1.0, np.nan]})
+        self.assertTrue(sim_checkpoint.same_results(df, df.iloc[::-1].assign(price=[np.nan, 1.0 + 1e-12])))
+        self.assertFalse(sim_checkpoint.same_results(df, df.assign(price=[1.1, np.nan])))
+        self.assertFalse(sim_checkpoint.same_results(df, df.iloc[:1]))
+
+
+class _Record(dict):
+
+    def to_dict(self):
+        return dict(self)
+
+# Pool stand-in built on the batch auction; `offset` moves batch starts to the first trade of every job
+class _AuctionPool:
+    trades_df = None
+    offset = False
+
+    def __init__(self, trades, price_updates):
+        self.jobs = []
+
+    def add_job(self, base_asset, quote_asset, mask, options):
+        self.jobs += [(base_asset, quote_asset, np.asarray(mask), option) for option in options]
+        return list(range(len(self.jobs) - len(options), len(self.jobs)))
+
+    def execute(self):
+        results = {}
+        for id, (base_asset, quote_asset, mask, option) in enumerate(self.jobs):
+            df = self.trades_df[mask]
+            shift = int(df["block_time"].iloc[0]) if self.offset else 0
+            matches_df, expired_df = run_batch_auction(df.assign(block_time=df["block_time"] - shift), base_asset, quote_asset, option.batch_dur_sec, option.time_limit_sec)
+            matches_df["timestamp"] += shift
+            expired_df["timestamp"] += shift
+            results[id] = SimpleNamespace(
+                matches=[_Record(r) for r in matches_df.to_dict("records")],
+                expired_orders=[_Record(r) for r in expired_df.to_dict("records")],
+            )
+        return results
+
+
+class TestCheckpointedExecution(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.trades_df = random_trades()
+        _AuctionPool.trades_df = self.trades_df
+        patches = [mock.patch.object(matchings, "MatchAnalysisPool", _AuctionPool), mock.patch.object(matchings, "into_trades", lambda df: [])]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        _AuctionPool.offset = False
+        shutil.rmtree(self.root)
+
+    def execute(self, trades_df, batch_dur_sec=30):
+        analysis = matchings.MatchAnalysis(trades_df)
+        analysis.add_job(BASE, QUOTE, [SimpleNamespace(time_limit_sec=300, min_delta=None, batch_dur_sec=batch_dur_sec)])
+        results, _ = analysis._execute_checkpointed(self.root, wave_size=2)
+        return results[0]
+
+    def test_segments_add_up_to_a_single_run(self):
+        result = self.execute(self.trades_df)
+        matches_df, expired_df = run_batch_auction(self.trades_df, BASE, QUOTE, 30, 300)
+        self.assertTrue(sim_checkpoint.same_results(result.matches, matches_df))
+        self.assertTrue(sim_checkpoint.same_results(result.expired_orders, expired_df))
+        self.assertGreater(len(sim_checkpoint.SimCheckpoint(self.root).manifest), 3)
+
+    def test_misaligned_batches_are_detected(self):
+        _AuctionPool.offset = True
+        with self.assertRaises(RuntimeError):
+            self.execute(self.trades_df)
+        self.assertEqual(len(sim_checkpoint.SimCheckpoint(self.root).manifest), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from utils.trade_partitions import PARTITION_DIR, read_pairs, write_pair_partitions
+
+
+def trades(*pairs):
+    return pd.DataFrame({
+        "id": [f"t{i}" for i in range(len(pairs))],
+        "token_sold_address": [sold for sold, _ in pairs],
+        "token_bought_address": [bought for _, bought in pairs],
+        "block_time": range(len(pairs)),
+    })
+
+
+class TestWritePairPartitions(unittest.TestCase):
+
+    def setUp(self):
+        self.dataset_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dataset_dir)
+
+    def test_rewrite_drops_pairs_that_are_gone(self):
+        write_pair_partitions(trades(("a", "b"), ("c", "b"), ("b", "a")), self.dataset_dir)
+        sizes = write_pair_partitions(trades(("b", "a")), self.dataset_dir)
+
+        self.assertEqual(sizes, {"a_b": 1})
+        self.assertEqual(os.listdir(self.dataset_dir), [PARTITION_DIR])
+        self.assertEqual(os.listdir(f"{self.dataset_dir}/{PARTITION_DIR}"), ["pair=a_b"])
+        trades_df, pair_slices = read_pairs([self.dataset_dir], [("a", "b"), ("b", "c")])
+        self.assertEqual(list(trades_df["id"]), ["t0"])
+        self.assertEqual(pair_slices, {("a", "b"): slice(0, 1)})
+
+
+if __name__ == "__main__":
+    unittest.main()
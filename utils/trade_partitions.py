@@ -0,0 +1,104 @@
+from typing import Iterable, List, Tuple, Dict
+import argparse
+import glob
+import os
+import shutil
+
+import pandas as pd
+import numpy as np
+
+
+PARTITION_DIR = "by_pair"
+PARTITION_KEY = "pair"
+
+
+def canonical_pair(token0: str, token1: str) -> Tuple[str, str]:
+    return (token0, token1) if token0 <= token1 else (token1, token0)
+
+def pair_label(token0: str, token1: str) -> str:
+    return "_".join(canonical_pair(token0, token1))
+
+def canonical_pair_labels(df: pd.DataFrame) -> pd.Series:
+    sold = df["token_sold_address"].to_numpy(dtype=str)
+    bought = df["token_bought_address"].to_numpy(dtype=str)
+    swap = sold > bought
+    token0 = np.where(swap, bought, sold)
+    token1 = np.where(swap, sold, bought)
+    return pd.Series(np.char.add(np.char.add(token0, "_"), token1), index=df.index)
+
+def partition_path(dataset_dir: str, token0: str, token1: str) -> str:
+    return f"{dataset_dir}/{PARTITION_DIR}/{PARTITION_KEY}={pair_label(token0, token1)}/data.parquet"
+
+def write_pair_partitions(trades_df: pd.DataFrame, dataset_dir: str) -> Dict[str, int]:
+    labels = canonical_pair_labels(trades_df)
+    order = np.lexsort((trades_df["block_time"].to_numpy(), labels.to_numpy()))
+    sorted_df = trades_df.iloc[order].reset_index(drop=True)
+    sorted_labels = labels.to_numpy()[order]
+
+    # Rows are grouped by pair and time-sorted within, so every partition is a contiguous slice
+    bounds = np.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+    starts = np.concatenate([[0], bounds]) if len(sorted_labels) > 0 else np.array([], dtype=int)
+    ends = np.concatenate([bounds, [len(sorted_labels)]]) if len(sorted_labels) > 0 else np.array([], dtype=int)
+
+    # Written next to the old partitions and swapped in, so pairs that are gone don't leave stale partitions behind
+    partitions_dir = f"{dataset_dir}/{PARTITION_DIR}"
+    tmp_dir = f"{partitions_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    sizes = {}
+    for start, end in zip(starts, ends):
+        label = sorted_labels[start]
+        out_dir = f"{tmp_dir}/{PARTITION_KEY}={label}"
+        os.makedirs(out_dir)
+        sorted_df.iloc[start:end].to_parquet(f"{out_dir}/data.parquet", index=False)
+        sizes[label] = int(end - start)
+    shutil.rmtree(partitions_dir, ignore_errors=True)
+    os.replace(tmp_dir, partitions_dir)
+    print(f"Wrote {len(sizes)} pair partitions to {dataset_dir}/{PARTITION_DIR}")
+    return sizes
+
+def read_pair_partition(dataset_dirs: Iterable[str], token0: str, token1: str) -> pd.DataFrame:
+    pieces = [
+        pd.read_parquet(path)
+        for path in (partition_path(d, token0, token1) for d in dataset_dirs)
+        if os.path.exists(path)
+    ]
+    pieces = [p for p in pieces if len(p) > 0]
+    if len(pieces) == 0:
+        return pd.DataFrame()
+    # Each piece is already sorted, order the pieces by their first timestamp
+    pieces.sort(key=lambda p: p["block_time"].iloc[0])
+    df = pd.concat(pieces, ignore_index=True)
+    if not df["block_time"].is_monotonic_increasing:
+        # Overlapping datasets, fall back to a (stable) sort of this pair only
+        df = df.sort_values("block_time", kind="stable", ignore_index=True)
+    return df
+
+# Reads only the requested pair partitions. Returns trades (time-sorted within each pair)
+# and the row slice each canonical pair occupies in the returned frame.
+def read_pairs(dataset_dirs: Iterable[str], pairs: Iterable[Tuple[str, str]]) -> Tuple[pd.DataFrame, Dict[Tuple[str, str], slice]]:
+    dataset_dirs = list(dataset_dirs)
+    frames: List[pd.DataFrame] = []
+    pair_slices = {}
+    offset = 0
+    for pair in dict.fromkeys(canonical_pair(*p) for p in pairs):
+        df = read_pair_partition(dataset_dirs, *pair)
+        if len(df) == 0:
+            print(f"No partition found for {pair[0]}/{pair[1]}")
+            continue
+        frames.append(df)
+        pair_slices[pair] = slice(offset, offset + len(df))
+        offset += len(df)
+    trades_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return trades_df, pair_slices
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Partition trades datasets by canonical token pair")
+    parser.add_argument("--dataset-dirs", nargs="+", default=sorted(glob.glob("data/trades/v2_eth_*")), help="Trade dataset directories containing data.parquet")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    for dataset_dir in args.dataset_dirs:
+        write_pair_partitions(pd.read_parquet(f"{dataset_dir}/data.parquet"), dataset_dir)
@@ -0,0 +1,117 @@
+from typing import Sequence
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.trade_partitions import canonical_pair_labels
+
+
+# One Ethereum block
+VWAP_INTERVAL = 12
+# Same as the as-of tolerance `enrich_matches` looks forward for a market price
+MAX_PRICE_GAP = 7200
+PRICE_COLUMNS = ["block_time", "price", "base_token", "quote_token", "pair", "price_source"]
+
+
+# VWAP per pair and `interval` seconds straight from the trades, in the same shape as the block pool prices.
+# Prices are quote per base with base the lower token address; a bucket's price is stamped
+# with the time of its last trade, so it is never used before it could have been observed.
+def trade_vwap_prices(trades_df: pd.DataFrame, interval: int = VWAP_INTERVAL) -> pd.DataFrame:
+    if interval <= 0:
+        raise ValueError("VWAP interval must be > 0")
+    sold = trades_df["token_sold_address"].to_numpy(dtype=str)
+    bought = trades_df["token_bought_address"].to_numpy(dtype=str)
+    sold_amount = trades_df["token_sold_amount"].to_numpy(dtype=float)
+    bought_amount = trades_df["token_bought_amount"].to_numpy(dtype=float)
+    block_time = trades_df["block_time"].to_numpy(dtype=np.int64)
+    pair = trades_df["pair"] if "pair" in trades_df.columns else canonical_pair_labels(trades_df)
+
+    sold_is_base = sold <= bought
+    df = pd.DataFrame({
+        "pair": pair.to_numpy(),
+        "bucket": block_time // interval,
+        "block_time": block_time,
+        "base_token": np.where(sold_is_base, sold, bought),
+        "quote_token": np.where(sold_is_base, bought, sold),
+        "base_amount": np.where(sold_is_base, sold_amount, bought_amount),
+        "quote_amount": np.where(sold_is_base, bought_amount, sold_amount),
+    })
+    valid = (df["base_amount"] > 0) & (df["quote_amount"] > 0) & np.isfinite(df["base_amount"]) & np.isfinite(df["quote_amount"])
+    vwap_df = df[valid].groupby(["pair", "base_token", "quote_token", "bucket"], as_index=False, sort=True).agg(
+        block_time=("block_time", "max"),
+        base_amount=("base_amount", "sum"),
+        quote_amount=("quote_amount", "sum"),
+    )
+    vwap_df["price"] = vwap_df["quote_amount"] / vwap_df["base_amount"]
+    vwap_df["price_source"] = "trades"
+    return vwap_df[PRICE_COLUMNS]
+
+# Merges price series by priority (first one wins). A lower priority price is only kept where every
+# higher priority series of its pair is more than `max_gap` seconds ahead, so a forward as-of lookup
+# never prefers it over a price the better source has. Fallback prices are turned in the direction
+# the highest priority series uses for the pair.
+def merge_price_sources(sources: Sequence[pd.DataFrame], max_gap: int = MAX_PRICE_GAP) -> pd.DataFrame:
+    merged = None
+    for i, df in enumerate(sources):
+        if df is None or len(df) == 0:
+            continue
+        df = df.assign(price_source=df["price_source"] if "price_source" in df.columns else f"source_{i}")
+        df = df[PRICE_COLUMNS].sort_values(["pair", "block_time"], kind="stable")
+        if merged is None:
+            merged = df
+            continue
+
+        # Direction of the pair in the series merged so far
+        direction = merged.drop_duplicates("pair")[["pair", "base_token"]].rename(columns={"base_token": "merged_base"})
+        df = df.merge(direction, on="pair", how="left")
+        flip = (df["merged_base"].notna() & (df["base_token"] != df["merged_base"])).to_numpy()
+        df.loc[flip, ["base_token", "quote_token"]] = df.loc[flip, ["quote_token", "base_token"]].to_numpy()
+        df.loc[flip, "price"] = 1 / df.loc[flip, "price"]
+
+        # Time to the next higher priority price of the same pair
+        next_time = pd.merge_asof(
+            df[["pair", "block_time"]].reset_index(),
+            merged[["pair", "block_time"]].rename(columns={"block_time": "next_time"}).sort_values("next_time", kind="stable"),
+            by="pair",
+            left_on="block_time",
+            right_on="next_time",
+            direction="forward",
+        ).set_index("index").sort_index()["next_time"]
+        keep = (next_time.isna() | (next_time - df["block_time"] > max_gap)).to_numpy()
+        print(f"Price source {df['price_source'].iloc[0]}: {keep.sum()}/{len(df)} prices fill gaps")
+        merged = pd.concat([merged, df.loc[keep, PRICE_COLUMNS]], ignore_index=True)
+        merged = merged.sort_values(["pair", "block_time"], kind="stable")
+
+    if merged is None:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    return merged.reset_index(drop=True)
+
+# Pool prices (if any) completed with trade VWAPs, for every pair in `trades_df`
+def complete_prices(
+        trades_df: pd.DataFrame,
+        prices_df: pd.DataFrame = None,
+        interval: int = VWAP_INTERVAL,
+        max_gap: int = MAX_PRICE_GAP
+    ) -> pd.DataFrame:
+    if prices_df is not None and "price_source" not in prices_df.columns:
+        prices_df = prices_df.assign(price_source="pool")
+    return merge_price_sources([prices_df, trade_vwap_prices(trades_df, interval)], max_gap)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build trade VWAP prices and merge them with pool prices")
+    parser.add_argument("--trades", required=True, help="Trades parquet file")
+    parser.add_argument("--prices", default=None, help="Pool prices parquet file, takes priority over trade prices")
+    parser.add_argument("--interval", type=int, default=VWAP_INTERVAL, help="VWAP bucket in seconds")
+    parser.add_argument("--max-gap", type=int, default=MAX_PRICE_GAP, help="Fill pool price gaps longer than this (seconds)")
+    parser.add_argument("--out", required=True, help="Output parquet file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    trades_df = pd.read_parquet(args.trades)
+    prices_df = pd.read_parquet(args.prices) if args.prices is not None else None
+    df = complete_prices(trades_df, prices_df, args.interval, args.max_gap)
+    df.to_parquet(args.out, index=False)
+    print(f"Wrote {len(df)} prices for {df['pair'].nunique()} pairs to {args.out}")
@@ -0,0 +1,40 @@
+from typing import Dict, Sequence
+import atexit
+import importlib
+import multiprocessing as mp
+import os
+
+
+# Imported once in the forkserver, every worker forks from it with these already loaded
+PRELOAD_MODULES = ["numpy", "pandas", "utils.matchings"]
+START_METHOD = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+
+_pools: Dict[int, "mp.pool.Pool"] = {}
+
+
+# Pools are kept warm and reused across sweeps, so short jobs don't pay interpreter and import startup each time
+def get_pool(n_workers: int = None, preload: Sequence[str] = PRELOAD_MODULES):
+    n_workers = n_workers or os.cpu_count()
+    pool = _pools.get(n_workers)
+    if pool is None:
+        ctx = mp.get_context(START_METHOD)
+        if START_METHOD == "forkserver":
+            ctx.set_forkserver_preload(list(preload))
+        # Spawned workers (no forkserver) still import everything once per worker, not once per task
+        pool = ctx.Pool(processes=n_workers, initializer=_import_modules, initargs=(tuple(preload),))
+        _pools[n_workers] = pool
+        print(f"Started {n_workers} {START_METHOD} workers")
+    return pool
+
+def shutdown():
+    for pool in _pools.values():
+        pool.close()
+        pool.join()
+    _pools.clear()
+
+def _import_modules(modules: Sequence[str]):
+    for module in modules:
+        importlib.import_module(module)
+
+
+atexit.register(shutdown)